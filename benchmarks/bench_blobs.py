@@ -0,0 +1,80 @@
+"""Compares inline dill+base85 encoding with protocol 5 blobs for large buffers.
+
+Usage::
+
+    python benchmarks/bench_blobs.py
+"""
+
+import itertools
+import pickle
+import tempfile
+import time
+from typing import Any, Callable, List, Tuple
+
+from i8t.blobs import DirectoryBlobStore, dump_blob, load_blob
+from i8t.encoders import DILL
+from i8t.pickling import register_reducer
+
+try:
+    import numpy  # type: ignore
+except ImportError:  # pragma: no cover
+    numpy = None  # type: ignore[assignment]
+
+SIZE = 16 * 1024 * 1024
+REPEAT = 5
+
+
+class Frame:
+    """Stand-in for user types wrapping a large buffer."""
+
+    def __init__(self, data: Any) -> None:
+        self.data = data
+
+
+def reduce_frame(frame: Frame) -> Tuple[Any, ...]:
+    return Frame, (pickle.PickleBuffer(frame.data),)
+
+
+def timed(func: Callable[[], Any]) -> Tuple[float, Any]:
+    best, result = float("inf"), None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench(name: str, obj: Any, store: DirectoryBlobStore) -> List[str]:
+    inline_dump, encoded = timed(lambda: DILL.encode(obj))
+    inline_load, _ = timed(lambda: DILL.decode(encoded))
+
+    digests = (f"{name}{i}" for i in itertools.count())
+
+    def write() -> int:
+        chunks = dump_blob(obj)
+        store.put_chunks(next(digests), chunks)
+        return sum(map(len, chunks))
+
+    blob_dump, blob_size = timed(write)
+    blob_load, _ = timed(lambda: load_blob(store.get(f"{name}0")))
+    return [
+        f"{name:<10} inline {len(encoded) / 2**20:7.1f} MiB"
+        f" dump {inline_dump * 1000:8.1f} ms load {inline_load * 1000:8.1f} ms",
+        f"{'':<10} blob   {blob_size / 2**20:7.1f} MiB"
+        f" dump {blob_dump * 1000:8.1f} ms load {blob_load * 1000:8.1f} ms",
+    ]
+
+
+def main() -> None:
+    register_reducer(Frame, reduce_frame)
+    cases = [("bytearray", Frame(bytearray(SIZE)))]
+    if numpy is not None:
+        cases.append(("ndarray", numpy.arange(SIZE // 8, dtype=numpy.float64)))
+    with tempfile.TemporaryDirectory() as directory:
+        store = DirectoryBlobStore(directory)
+        for name, obj in cases:
+            print("\n".join(bench(name, obj, store)))
+
+
+if __name__ == "__main__":
+    main()
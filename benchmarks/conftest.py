@@ -0,0 +1,64 @@
+import json
+from typing import Any, Callable, List
+
+import pytest
+
+from i8t.adapters.decorator_adapter.serde import DecoratorSerde
+
+LOCATIONS = ("app.math.add", "app.math.mul", "app.io.read")
+
+
+def pytest_addoption(parser) -> None:
+    parser.addoption(
+        "--session-records",
+        default="1000",
+        help="Comma-separated sizes of synthetic sessions, e.g. 1000,100000,1000000",
+    )
+
+
+def pytest_generate_tests(metafunc) -> None:
+    if "records" in metafunc.fixturenames:
+        sizes = [int(size) for size in metafunc.config.getoption("session_records").split(",")]
+        metafunc.parametrize("records", sizes, scope="session")
+
+
+@pytest.fixture(scope="session")
+def session_path(tmp_path_factory, records: int) -> str:
+    """Writes session of decorator checkpoints spread over a few locations."""
+    path = tmp_path_factory.mktemp("sessions") / f"session-{records}.jsonl"
+    with open(path, "wt", encoding="utf-8") as fobj:
+        for line in synthetic_session(records):
+            fobj.write(line)
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def dill_session_path(tmp_path_factory, records: int) -> str:
+    """Writes session of decorator checkpoints with sets in arguments, that only dill encodes."""
+    path = tmp_path_factory.mktemp("sessions") / f"dill-session-{records}.jsonl"
+    with open(path, "wt", encoding="utf-8") as fobj:
+        for line in synthetic_session(records, arg=lambda i: set(range(i, i + 5))):
+            fobj.write(line)
+    return str(path)
+
+
+def synthetic_session(records: int, arg: Callable[[int], Any] = lambda i: [i] * 5) -> List[str]:
+    serde = DecoratorSerde()
+    lines = []
+    for i in range(records):
+        location = LOCATIONS[i % len(LOCATIONS)]
+        serialized = serde.serialize(location, {"args": (i, arg(i)), "kwargs": {}}, i * 5, i)
+        record = {
+            "input": serialized["input_data"],
+            "output": serialized["output_data"],
+            "metadata": {
+                "name": "bench",
+                "location": location,
+                "start_ts": i,
+                "finish_ts": i + 1,
+                "input_hint": serialized["input_hint"],
+                "output_hint": serialized["output_hint"],
+            },
+        }
+        lines.append(json.dumps(record) + "\n")
+    return lines
@@ -0,0 +1,60 @@
+from typing import Iterator, Optional
+
+import flask
+import pytest
+import requests
+import requests_mock
+
+from i8t.client import IntrospectClient
+from i8t.inmemory_storage import IntrospectInMemoryStorage
+from i8t.instrument.flask_introspect import FlaskIntrospect
+from i8t.instrument.requests_introspect import RequestsIntrospect
+
+URL = "http://backend/items"
+
+
+def make_app(client: Optional[IntrospectClient]) -> flask.Flask:
+    app = flask.Flask(__name__)
+
+    @app.route("/items", methods=["POST"])
+    def items():
+        return {"count": len(flask.request.get_json()["items"])}
+
+    if client:
+        FlaskIntrospect(client).register(app)
+    return app
+
+
+@pytest.fixture(name="client")
+def fixture_client() -> IntrospectClient:
+    return IntrospectClient("", "bench", storage=IntrospectInMemoryStorage())
+
+
+@pytest.fixture(name="transport")
+def fixture_transport() -> Iterator[requests_mock.Mocker]:
+    with requests_mock.Mocker() as mocker:
+        mocker.post(URL, json={"count": 3})
+        yield mocker
+
+
+@pytest.mark.benchmark(group="flask")
+@pytest.mark.parametrize("instrumented", [False, True])
+def test_flask_request(benchmark, client, instrumented):
+    test_client = make_app(client if instrumented else None).test_client()
+    response = benchmark(test_client.post, "/items", json={"items": [1, 2, 3]})
+    assert response.json == {"count": 3}
+
+
+@pytest.mark.benchmark(group="requests")
+@pytest.mark.parametrize("instrumented", [False, True])
+@pytest.mark.usefixtures("transport")
+def test_requests_call(benchmark, client, instrumented):
+    requests_introspect = RequestsIntrospect(client)
+    if instrumented:
+        requests_introspect.register()
+    try:
+        response = benchmark(requests.post, URL, json={"items": [1, 2, 3]}, timeout=1)
+    finally:
+        if instrumented:
+            requests_introspect.unregister()
+    assert response.json() == {"count": 3}
@@ -0,0 +1,52 @@
+from typing import Iterator
+
+import pytest
+
+from i8t.client import IntrospectClient
+from i8t.inmemory_storage import IntrospectInMemoryStorage
+from i8t.instrument.decorator_introspect import DecoratorIntrospect, introspect
+from i8t.location_filter import LocationFilter
+
+pytestmark = pytest.mark.benchmark(group="introspect")
+
+
+def add(first, second):
+    return first + second
+
+
+decorated_add = introspect(add)
+
+
+@pytest.fixture(name="client")
+def fixture_client() -> IntrospectClient:
+    return IntrospectClient("", "bench", storage=IntrospectInMemoryStorage())
+
+
+@pytest.fixture(name="registered")
+def fixture_registered(client: IntrospectClient) -> Iterator[DecoratorIntrospect]:
+    decorator_introspect = DecoratorIntrospect(client)
+    decorator_introspect.register()
+    yield decorator_introspect
+    decorator_introspect.unregister()
+
+
+def test_undecorated(benchmark):
+    benchmark(add, 1, 2)
+
+
+def test_disabled(benchmark):
+    benchmark(decorated_add, 1, 2)
+
+
+def test_filtered(benchmark, client):
+    decorator_introspect = DecoratorIntrospect(client, locations=LocationFilter(deny=["*.add"]))
+    decorator_introspect.register()
+    try:
+        benchmark(decorated_add, 1, 2)
+    finally:
+        decorator_introspect.unregister()
+
+
+@pytest.mark.usefixtures("registered")
+def test_enabled(benchmark):
+    benchmark(decorated_add, 1, 2)
@@ -0,0 +1,61 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional
+
+import pytest
+import requests
+
+from i8t.compression import Codec, GzipCodec
+from i8t.relay_server import RelayApp, RelayServer, RelayStore, TenantLog
+from i8t.relay_storage import RelayConverter, RelayStorage
+from i8t.testing.stand_in_relay import make_checkpoint
+
+pytestmark = pytest.mark.benchmark(group="relay server ingestion")
+
+BATCH = [make_checkpoint(i) for i in range(100)]
+CLIENTS = 4
+
+
+@pytest.fixture(name="store")
+def fixture_store(tmp_path) -> Iterator[RelayStore]:
+    store = RelayStore(str(tmp_path))
+    yield store
+    store.close()
+
+
+@pytest.fixture(name="url")
+def fixture_url(store) -> Iterator[str]:
+    server = RelayServer(("127.0.0.1", 0), RelayApp(store))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}/bench"
+    server.shutdown()
+    server.server_close()
+
+
+def test_append_batch_of_100(benchmark, store):
+    log: TenantLog = store.tenant("bench")
+    records = [RelayConverter.to_relay(checkpoint) for checkpoint in BATCH]
+    benchmark(log.append, records)
+    benchmark.extra_info["records"] = log.total
+
+
+@pytest.mark.parametrize("codec", [None, GzipCodec()], ids=["plain", "gzip"])
+def test_post_batch_of_100(benchmark, store, url, codec: Optional[Codec]):
+    with requests.Session() as session:
+        benchmark(RelayStorage(session, url, codec=codec).save_batch, BATCH)
+    assert store.tenant("bench").total >= len(BATCH)
+
+
+def test_concurrent_posts(benchmark, store, url):
+    sessions = [requests.Session() for _ in range(CLIENTS)]
+    storages = [RelayStorage(session, url) for session in sessions]
+
+    def post_from_all_clients() -> None:
+        with ThreadPoolExecutor(CLIENTS) as executor:
+            for _ in executor.map(lambda storage: storage.save_batch(BATCH), storages * 5):
+                pass
+
+    benchmark.pedantic(post_from_all_clients, rounds=5)
+    for session in sessions:
+        session.close()
+    assert store.tenant("bench").total >= CLIENTS * 5 * len(BATCH)
@@ -0,0 +1,33 @@
+from typing import Iterator, Optional
+
+import pytest
+import requests
+
+from i8t.compression import Codec, GzipCodec
+from i8t.relay_storage import RelayStorage
+from i8t.testing.stand_in_relay import StandInRelay, make_checkpoint
+
+pytestmark = pytest.mark.benchmark(group="relay storage")
+
+
+@pytest.fixture(name="session")
+def fixture_session() -> Iterator[requests.Session]:
+    with requests.Session() as session:
+        yield session
+
+
+@pytest.mark.parametrize("codec", [None, GzipCodec()], ids=["plain", "gzip"])
+def test_save(benchmark, session, codec: Optional[Codec]):
+    with StandInRelay(codec) as relay:
+        storage = RelayStorage(session, relay.url, codec=codec)
+        benchmark(storage.save, make_checkpoint(1))
+    assert relay.records
+
+
+@pytest.mark.parametrize("codec", [None, GzipCodec()], ids=["plain", "gzip"])
+def test_save_batch_of_100(benchmark, session, codec: Optional[Codec]):
+    checkpoints = [make_checkpoint(i) for i in range(100)]
+    with StandInRelay(codec) as relay:
+        storage = RelayStorage(session, relay.url, codec=codec)
+        benchmark(storage.save_batch, checkpoints)
+    assert relay.records
@@ -0,0 +1,37 @@
+import pytest
+
+from i8t.adapters.decorator_adapter.serde import DecoratorSerde
+
+SIZES = (10, 1000, 100000)
+
+
+def payload(size: int) -> dict:
+    return {"args": ([{"id": i, "name": f"item{i}"} for i in range(size)],), "kwargs": {}}
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("hint", ["json", "dill"])
+def test_encode(benchmark, hint, size):
+    benchmark.group = f"serde encode {size}"
+    serde = DecoratorSerde(hints=(hint,))
+    input_ = payload(size)
+    checkpoint = benchmark(serde.serialize, "bench.func", input_, None, 0)
+    assert checkpoint["input_hint"] == hint
+
+
+@pytest.mark.parametrize("size", SIZES)
+@pytest.mark.parametrize("hint", ["json", "dill"])
+def test_decode(benchmark, hint, size):
+    benchmark.group = f"serde decode {size}"
+    serde = DecoratorSerde(hints=(hint,))
+    serialized = serde.serialize("bench.func", payload(size), None, 0)
+    checkpoint = {
+        "input": serialized["input_data"],
+        "output": serialized["output_data"],
+        "metadata": {
+            "input_hint": serialized["input_hint"],
+            "output_hint": serialized["output_hint"],
+        },
+    }
+    record = benchmark(serde.deserialize, checkpoint)
+    assert len(record["input"]["args"][0]) == size
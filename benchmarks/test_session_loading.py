@@ -0,0 +1,68 @@
+from typing import Optional
+
+import pytest
+
+from i8t.adapters.decorator_adapter.loader import DecoratedCase
+from i8t.compression import GzipCodec
+from i8t.testing.session import IntrospectSession
+from i8t.testing.session_cache import SessionCache
+from i8t.testing.time_range import TimeRange
+
+
+@pytest.mark.benchmark(group="session from_jsonl")
+def test_from_jsonl(benchmark, session_path, records):
+    session = benchmark(IntrospectSession.from_jsonl, session_path)
+    assert len(session.filter_by(lambda record: True)) == records
+
+
+@pytest.mark.benchmark(group="decorated case load")
+def test_decorated_case_load(benchmark, session_path, records):
+    session = IntrospectSession.from_jsonl(session_path)
+    # Every third record is at this location
+    cases = benchmark(DecoratedCase.load, session, "app.math.add")
+    assert len(cases) == -(-records // 3)
+
+
+@pytest.mark.benchmark(group="decorated case load")
+def test_streamed_decorated_case_load(benchmark, session_path, records):
+    session = IntrospectSession.stream_jsonl(session_path)
+    cases = benchmark(DecoratedCase.load, session, "app.math.add")
+    assert len(cases) == -(-records // 3)
+
+
+@pytest.mark.benchmark(group="decorated case load")
+def test_streamed_gzip_decorated_case_load(benchmark, session_path, records, tmp_path):
+    gzip_path = str(tmp_path / "session.jsonl.gz")
+    with open(session_path, "rb") as fobj, open(gzip_path, "wb") as gzip_fobj:
+        gzip_fobj.write(GzipCodec().compress(fobj.read()))
+    session = IntrospectSession.stream_jsonl(gzip_path)
+    cases = benchmark(DecoratedCase.load, session, "app.math.add")
+    assert len(cases) == -(-records // 3)
+
+
+@pytest.mark.benchmark(group="decorated case load within")
+def test_decorated_case_load_within_100_ranges(benchmark, session_path, records):
+    session = IntrospectSession.from_jsonl(session_path)
+    ranges = [TimeRange(start, start + 10) for start in range(0, records, max(records // 100, 1))]
+
+    def load_all() -> int:
+        return sum(len(DecoratedCase.load(session, "app.math.add", within)) for within in ranges)
+
+    assert benchmark(load_all) > 0
+
+
+def load_all_cases(path: str, cache: Optional[SessionCache] = None) -> int:
+    session = IntrospectSession.from_jsonl(path, cache=cache)
+    return len(DecoratedCase.load(session, ""))
+
+
+@pytest.mark.benchmark(group="dill session load")
+def test_dill_session_load(benchmark, dill_session_path, records):
+    assert benchmark(load_all_cases, dill_session_path) == records
+
+
+@pytest.mark.benchmark(group="dill session load")
+def test_cached_dill_session_load(benchmark, dill_session_path, records, tmp_path):
+    cache = SessionCache(str(tmp_path / "cache"))
+    load_all_cases(dill_session_path, cache)
+    assert benchmark(load_all_cases, dill_session_path, cache) == records
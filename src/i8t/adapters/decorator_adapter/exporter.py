@@ -1,42 +1,134 @@
+import asyncio
 import time
+from typing import Dict, Optional, Sequence, Tuple
 
+from i8t.blobs import BlobWriter
 from i8t.client import IntrospectClient
+from i8t.encoders import DEFAULT_HINTS
+from i8t.metrics import DILL_FALLBACKS, ENCODED, SERIALIZED_BYTES
 
-from .serde import DecoratorSerde
+from .serde import DecoratorSerde, HintStats
 
 
 class DecoratorExporter:
-    def __init__(self, client: IntrospectClient) -> None:
+    def __init__(
+        self,
+        client: IntrospectClient,
+        hints: Sequence[str] = DEFAULT_HINTS,
+        blob_writer: Optional[BlobWriter] = None,
+    ) -> None:
         self._client = client
-        self._serde = DecoratorSerde()
+        self._serde = DecoratorSerde(hints, blob_writer)
+        self._dill_first = hints[0] == "dill"
 
-    def wrapper(self, func, *args, **kwargs):
+    @property
+    def hint_stats(self) -> Dict[Tuple[str, str], HintStats]:
+        return self._serde.stats
+
+    def wrapper(self, site: "CallSite", args, kwargs):
+        rate = self._client.sample(site.location)
+        if not rate:
+            return site.func(*args, **kwargs)
+        start_time = time.time()
+        result = None
+        try:
+            result = site.func(*args, **kwargs)
+        except Exception as exc:  # pylint: disable=broad-except
+            result = {"error": str(exc)}
+            raise
+        finally:
+            self._send_call(site, args, kwargs, result, start_time, rate)
+        return result
+
+    async def async_wrapper(self, site: "CallSite", args, kwargs):
+        rate = self._client.sample(site.location)
+        if not rate:
+            return await site.func(*args, **kwargs)
         start_time = time.time()
         result = None
         try:
-            result = func(*args, **kwargs)
+            result = await site.func(*args, **kwargs)
+        except asyncio.CancelledError:
+            # Not an Exception, yet the call didn't return, e.g. timed out
+            result = {"error": "cancelled"}
+            raise
         except Exception as exc:  # pylint: disable=broad-except
             result = {"error": str(exc)}
             raise
         finally:
-            self._send(
-                f"{func.__module__}.{func.__qualname__}",
-                {"args": args[1:] if self._is_method(func, args) else args, "kwargs": kwargs},
-                result,
-                start_time,
-            )
+            self._send_call(site, args, kwargs, result, start_time, rate)
         return result
 
-    def _is_method(self, func, args) -> bool:
-        if func.__qualname__ != func.__name__:
-            # Could be method or nested function or both
-            # https://peps.python.org/pep-3155/
-            class_name = ""
-            if args:
-                class_name = args[0].__class__.__name__
-            if func.__qualname__ == f"{class_name}.{func.__name__}":
-                return True
-        return False
-
-    def _send(self, *args) -> None:
-        self._client.send(self._client.make_checkpoint(**self._serde.serialize(*args)))
+    def _send_call(self, site: "CallSite", args, kwargs, result, start_time, rate) -> None:
+        # pylint: disable=too-many-arguments
+        capture_start = time.perf_counter()
+        if site.is_method(args):
+            args = args[1:]
+        # Sampled calls keep the rate, so that statistics can be re-weighted
+        metadata = {"sample_rate": rate} if rate < 1.0 else {}
+        if self._client.is_deferred():
+            try:
+                input_ = {
+                    "args": self._client.snapshot(args),
+                    "kwargs": self._client.snapshot(kwargs),
+                }
+                output = self._client.snapshot(result)
+            except Exception:  # pylint: disable=broad-except
+                # Can't copy, encode right away
+                pass
+            else:
+                self._client.defer(
+                    self._send_deferred,
+                    site.location,
+                    input_,
+                    output,
+                    start_time,
+                    dict(self._client.capture_finish(), **metadata),
+                )
+                self._client.record_overhead(site.location, time.perf_counter() - capture_start)
+                return
+        self._send(site.location, {"args": args, "kwargs": kwargs}, result, start_time, metadata)
+        self._client.record_overhead(site.location, time.perf_counter() - capture_start)
+
+    def _send_deferred(self, location, input_, output, start_time, finish: dict) -> None:
+        # pylint: disable=too-many-arguments
+        capture_start = time.perf_counter()
+        self._send(location, input_, output, start_time, finish)
+        self._client.record_overhead(location, time.perf_counter() - capture_start)
+
+    def _send(self, location, input_, output, start_time, metadata: dict) -> None:
+        # pylint: disable=too-many-arguments
+        serialized = self._serde.serialize(location, input_, output, start_time)
+        metrics = self._client.metrics
+        for hint, data in (
+            (serialized["input_hint"], serialized["input_data"]),
+            (serialized["output_hint"], serialized["output_data"]),
+        ):
+            metrics.inc(ENCODED, hint)
+            metrics.inc(SERIALIZED_BYTES, hint, len(data))
+            if hint == "dill" and not self._dill_first:
+                metrics.inc(DILL_FALLBACKS, location)
+        self._client.send(self._client.make_checkpoint(**serialized, **metadata))
+
+
+class CallSite:
+    """Decorated function with everything derived from it computed once.
+
+    ``exporter`` is set while the call site is being introspected.
+    """
+
+    def __init__(self, func) -> None:
+        self.func = func
+        self.location = f"{func.__module__}.{func.__qualname__}"
+        # Qualified name could be of method or nested function or both
+        # https://peps.python.org/pep-3155/
+        owner, _, name = func.__qualname__.rpartition(".")
+        self._class_name = owner if owner and name == func.__name__ else None
+        self.exporter: Optional[DecoratorExporter] = None
+
+    def is_method(self, args) -> bool:
+        return (
+            self._class_name is not None
+            and bool(args)
+            and args[0].__class__.__name__ == self._class_name
+        )
@@ -1,10 +1,10 @@
 import contextlib
-import fnmatch
 from dataclasses import dataclass
 from typing import Any, Dict, Iterator, List, Optional
 from unittest import mock
 
-from i8t.testing.session import IntrospectSession
+from i8t.blobs import BlobStore
+from i8t.testing.session import IntrospectSession, SessionQuery
 from i8t.testing.time_range import TimeRange
 
 from .serde import DecoratorSerde
@@ -19,8 +19,12 @@ class DecoratedCase(TimeRange):
     _serde = DecoratorSerde()
 
     @classmethod
-    def from_record(cls, raw_record: dict) -> "DecoratedCase":
-        record = cls._serde.deserialize(raw_record)
+    def from_record(
+        cls, raw_record: dict, blob_store: Optional[BlobStore] = None
+    ) -> "DecoratedCase":
+        """Decodes record, reading referenced blobs from ``blob_store``."""
+        serde = cls._serde if blob_store is None else DecoratorSerde(blob_store=blob_store)
+        record = serde.deserialize(raw_record)
         return cls(
             start_ts=record["metadata"]["start_ts"],
             finish_ts=record["metadata"]["finish_ts"],
@@ -32,10 +36,15 @@ class DecoratedCase(TimeRange):
 
     @classmethod
     def load(
-        cls, session: IntrospectSession, name: str, within: Optional[TimeRange] = None
+        cls,
+        session: IntrospectSession,
+        name: str,
+        within: Optional[TimeRange] = None,
+        blob_store: Optional[BlobStore] = None,
     ) -> List["DecoratedCase"]:
         return [
-            cls.from_record(record) for record in session.filter_by(DecoratorFilter(name, within))
+            cls.from_record(record, blob_store)
+            for record in session.select(SessionQuery("*" + name, within=within))
         ]
 
 
@@ -59,19 +68,20 @@ class DecoratedPatch:
         session: IntrospectSession,
         name: str = "",
         within: Optional[TimeRange] = None,
+        blob_store: Optional[BlobStore] = None,
     ) -> Iterator:
-        records = session.filter_by(DecoratorFilter(name, within))
+        records = session.select(SessionQuery("*" + name, within=within))
         if not records:
             yield []
         else:
-            with patch_many(cls._group_by_qualname(records)) as expected_calls:
+            with patch_many(cls._group_by_qualname(records, blob_store)) as expected_calls:
                 yield expected_calls
 
     @staticmethod
-    def _group_by_qualname(records: List[dict]) -> List[Patch]:
+    def _group_by_qualname(records: List[dict], blob_store: Optional[BlobStore]) -> List[Patch]:
         by_qualname: Dict[str, List[DecoratedCase]] = {}
         for record in records:
-            case = DecoratedCase.from_record(record)
+            case = DecoratedCase.from_record(record, blob_store)
             by_qualname.setdefault(case.qualname, []).append(case)
         return [Patch(qualname=qualname, cases=cases) for qualname, cases in by_qualname.items()]
 
@@ -92,23 +102,3 @@ def patch_many(patches: List[Patch]) -> Iterator[List[DecoratedPatch]]:
                 yield [case_mock] + expected_calls
         else:
             yield [case_mock]
-
-
-class DecoratorFilter:
-    def __init__(self, name: str, within: Optional[TimeRange]) -> None:
-        self._name = name
-        self._within = within
-
-    def __call__(self, record: dict) -> bool:
-        return self._match_location(record["metadata"]["location"]) and self._match_within(record)
-
-    def _match_location(self, location: str) -> bool:
-        return fnmatch.fnmatch(location, "*" + self._name)
-
-    def _match_within(self, record: dict) -> bool:
-        if not self._within:
-            return True
-        return (
-            record["metadata"]["start_ts"] >= self._within.start_ts
-            and record["metadata"]["finish_ts"] <= self._within.finish_ts
-        )
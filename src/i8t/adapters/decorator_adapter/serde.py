@@ -1,14 +1,68 @@
-import base64
-import json
-from typing import Any, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
 
-import dill  # type: ignore
+from i8t.blobs import BlobStore, BlobWriter, resolve, resolve_input
+from i8t.encoders import DEFAULT_HINTS, ENCODERS, get_encoder
+
+
+@dataclass
+class HintStats:
+    # Hint -> number of objects encoded with it
+    encoded: Dict[str, int] = field(default_factory=dict)
+    # Number of times a preferred encoder rejected the object
+    fallbacks: int = 0
 
 
 class DecoratorSerde:
+    """Encodes checkpoint input and output with the first of ``hints`` accepting it.
+
+    Remembers call sites and argument types for which preferred encoders failed,
+    and goes straight to the encoder that worked for them.
+    Every ``REVALIDATE_EVERY`` calls the preferred encoders are tried again.
+    Lists, tuples and dicts are always tried with preferred encoders first,
+    as their types don't tell if their items can be encoded.
+    Any registered hint can be decoded, regardless of ``hints``.
+
+    With ``blob_writer``, large top-level items of values are replaced by blob references
+    before encoding.
+    Decoding such checkpoints requires ``blob_store``.
+    """
+
+    REVALIDATE_EVERY = 1000
+
+    def __init__(
+        self,
+        hints: Sequence[str] = DEFAULT_HINTS,
+        blob_writer: Optional[BlobWriter] = None,
+        blob_store: Optional[BlobStore] = None,
+    ) -> None:
+        self._encoders = [ENCODERS[hint] for hint in hints]
+        for encoder in self._encoders:
+            if not encoder.available:
+                raise ImportError(
+                    f"{encoder.hint} encoder is not installed, use pip install i8t[{encoder.hint}]"
+                )
+        self._blob_writer = blob_writer
+        self._blob_store = blob_store
+        # Call site and type signature -> (encoder index, calls since fallback)
+        self._fallback_sites: Dict[Any, Tuple[int, int]] = {}
+        # (location, "input" | "output") -> stats
+        self.stats: Dict[Tuple[str, str], HintStats] = {}
+
     def serialize(self, location, input_, output, start_time) -> dict:
-        input_hint, input_str = self._encode(input_)
-        output_hint, output_str = self._encode(output)
+        writer = self._blob_writer
+        input_hint, input_str = self._encode_at(
+            (location, "input"),
+            input_,
+            self._input_signature,
+            writer.extract_input if writer else None,
+        )
+        output_hint, output_str = self._encode_at(
+            (location, "output"),
+            output,
+            _value_signature,
+            writer.extract if writer else None,
+        )
         return dict(
             location=location,
             input_data=input_str,
@@ -21,21 +75,76 @@ class DecoratorSerde:
     def deserialize(self, checkpoint: dict) -> dict:
         return dict(
             checkpoint,
-            input=self._decode(checkpoint["input"], checkpoint["metadata"].get("input_hint", "")),
-            output=self._decode(
-                checkpoint["output"], checkpoint["metadata"].get("output_hint", "")
+            input=resolve_input(
+                self._decode(checkpoint["input"], checkpoint["metadata"].get("input_hint", "")),
+                self._blob_store,
+            ),
+            output=resolve(
+                self._decode(checkpoint["output"], checkpoint["metadata"].get("output_hint", "")),
+                self._blob_store,
             ),
         )
 
-    def _decode(self, obj_str: str, hint: str) -> Any:
-        return (
-            json.loads(obj_str)
-            if hint == "json"
-            else dill.loads(base64.b85decode(obj_str.encode("utf-8")))
+    @staticmethod
+    def _decode(obj_str: str, hint: str) -> Any:
+        return get_encoder(hint).decode(obj_str)
+
+    def _encode_at(
+        self,
+        site: Tuple[str, str],
+        obj: Any,
+        signature: Callable[[Any], Any],
+        extract: Optional[Callable[[Any], Any]],
+    ) -> Tuple[str, str]:
+        stats = self.stats.get(site)
+        if stats is None:
+            stats = self.stats[site] = HintStats()
+        if extract:
+            # Large values are stored as blobs before encoding, to encode them only once
+            obj = extract(obj)
+        hint, encoded = self._encode_chain(stats, _site_key(site, signature(obj)), obj)
+        stats.encoded[hint] = stats.encoded.get(hint, 0) + 1
+        return hint, encoded
+
+    def _encode_chain(self, stats: HintStats, key: Any, obj: Any) -> Tuple[str, str]:
+        start, calls = self._fallback_sites.get(key, (0, 0))
+        if calls >= self.REVALIDATE_EVERY:
+            start, calls = 0, 0
+        index = start
+        while True:
+            encoder = self._encoders[index]
+            try:
+                encoded = encoder.encode(obj)
+                break
+            except encoder.errors:
+                if index == len(self._encoders) - 1:
+                    raise
+                stats.fallbacks += 1
+                index += 1
+        if index == 0:
+            self._fallback_sites.pop(key, None)
+        elif key is not None:
+            # Objects without key can't be matched to earlier fallbacks
+            self._fallback_sites[key] = (index, calls + 1 if index == start else 0)
+        return encoder.hint, encoded
+
+    @staticmethod
+    def _input_signature(input_: Any) -> Any:
+        if not isinstance(input_, dict):
+            return _value_signature(input_)
+        args = tuple(map(_value_signature, input_.get("args", ())))
+        kwargs = tuple(
+            (key, _value_signature(value)) for key, value in input_.get("kwargs", {}).items()
         )
+        if None in args or any(signature is None for _, signature in kwargs):
+            return None
+        return args, kwargs
+
+
+def _value_signature(value: Any) -> Optional[type]:
+    """Returns type, that tells if the value can be encoded, or None if it doesn't."""
+    return None if isinstance(value, (list, tuple, dict)) else type(value)
+
 
-    def _encode(self, obj) -> Tuple[str, str]:
-        try:
-            return "json", json.dumps(obj)
-        except TypeError:
-            return "dill", base64.b85encode(dill.dumps(obj, recurse=True)).decode("utf-8")
+def _site_key(site: Tuple[str, str], signature: Any) -> Any:
+    return None if signature is None else (site, signature)
@@ -0,0 +1,108 @@
+import enum
+import math
+import unittest
+from unittest import mock
+
+from i8t.encoders import ENCODERS, FAST_HINTS
+
+from .serde import DecoratorSerde, HintStats
+
+
+class Color(enum.Enum):
+    RED = 1
+
+
+class Opaque:
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Opaque)
+
+
+class TestDecoratorSerde(unittest.TestCase):
+    def setUp(self) -> None:
+        self.serde = DecoratorSerde()
+
+    def roundtrip(self, input_, output) -> dict:
+        serialized = self.serde.serialize("loc", input_, output, 1)
+        checkpoint = {
+            "metadata": {
+                "input_hint": serialized["input_hint"],
+                "output_hint": serialized["output_hint"],
+            },
+            "input": serialized["input_data"],
+            "output": serialized["output_data"],
+        }
+        return self.serde.deserialize(checkpoint)
+
+    def test_skips_json_for_known_dill_sites(self):
+        for _ in range(3):
+            record = self.roundtrip({"args": (Opaque(), 1), "kwargs": {}}, 2)
+            self.assertEqual(record["input"], {"args": (Opaque(), 1), "kwargs": {}})
+            self.assertEqual(record["output"], 2)
+        self.assertEqual(self.serde.stats[("loc", "input")], HintStats({"dill": 3}, fallbacks=1))
+        self.assertEqual(self.serde.stats[("loc", "output")], HintStats({"json": 3}))
+
+    def test_tracks_type_signatures_separately(self):
+        self.roundtrip({"args": (Opaque(),), "kwargs": {}}, Opaque())
+        record = self.roundtrip({"args": (1,), "kwargs": {}}, 1)
+        self.assertEqual(record["input"], {"args": [1], "kwargs": {}})
+        self.assertEqual(
+            self.serde.stats[("loc", "input")], HintStats({"dill": 1, "json": 1}, fallbacks=1)
+        )
+
+    def test_rejects_encoders_without_packages(self):
+        with mock.patch.object(ENCODERS["orjson"], "available", False):
+            with self.assertRaisesRegex(ImportError, r"pip install i8t\[orjson\]"):
+                DecoratorSerde(hints=("orjson", "dill"))
+
+    def test_tracks_inputs_other_than_call_arguments(self):
+        record = self.roundtrip([1, 2], None)
+        self.assertEqual(record["input"], [1, 2])
+        self.assertEqual(self.serde.stats[("loc", "input")], HintStats({"json": 1}))
+
+    @mock.patch.object(DecoratorSerde, "REVALIDATE_EVERY", 2)
+    def test_revalidates_json(self):
+        for _ in range(4):
+            self.serde.serialize("loc", {"args": (Opaque(),), "kwargs": {}}, None, 1)
+        self.assertEqual(self.serde.stats[("loc", "input")], HintStats({"dill": 4}, fallbacks=2))
+
+    def test_retries_json_for_nested_values(self):
+        calls = [{"args": ([Opaque()],), "kwargs": {}}] + [{"args": ([1],), "kwargs": {}}] * 2
+        hints = [self.serde.serialize("loc", call, [call], 1)["input_hint"] for call in calls]
+        self.assertEqual(hints, ["dill", "json", "json"])
+        self.assertEqual(self.serde.stats[("loc", "output")].encoded, {"dill": 1, "json": 2})
+
+    def test_decodes_hints_of_other_chains(self):
+        fast = DecoratorSerde(FAST_HINTS)
+        serialized = fast.serialize("loc", {"args": (1.5, "a"), "kwargs": {}}, {"x": None}, 1)
+        self.assertEqual(serialized["input_hint"], FAST_HINTS[0])
+        record = self.serde.deserialize(
+            {
+                "metadata": {"input_hint": serialized["input_hint"], "output_hint": "orjson"},
+                "input": serialized["input_data"],
+                "output": serialized["output_data"],
+            }
+        )
+        self.assertEqual(record["input"], {"args": [1.5, "a"], "kwargs": {}})
+        self.assertEqual(record["output"], {"x": None})
+
+    def test_fast_hints_keep_values_json_changes(self):
+        self.serde = DecoratorSerde(FAST_HINTS)
+        record = self.roundtrip({"args": (Color.RED, math.nan), "kwargs": {}}, [math.inf])
+        self.assertEqual(record["input"]["args"][0], Color.RED)
+        self.assertTrue(math.isnan(record["input"]["args"][1]))
+        self.assertEqual(record["output"], [math.inf])
+
+    def test_raises_when_no_encoder_fits(self):
+        serde = DecoratorSerde(("json",))
+        with self.assertRaises(TypeError):
+            serde.serialize("loc", {"args": (Opaque(),), "kwargs": {}}, None, 1)
+
+    def test_chain_falls_through_to_dill(self):
+        self.serde = DecoratorSerde(("orjson", "msgpack", "json", "dill"))
+        record = self.roundtrip({"args": (Opaque(),), "kwargs": {}}, {1: b"raw"})
+        self.assertEqual(record["input"], {"args": (Opaque(),), "kwargs": {}})
+        self.assertEqual(record["output"], {1: b"raw"})
+        self.assertEqual(self.serde.stats[("loc", "input")], HintStats({"dill": 1}, fallbacks=3))
+        self.assertEqual(
+            self.serde.stats[("loc", "output")], HintStats({"msgpack": 1}, fallbacks=1)
+        )
@@ -1,10 +1,28 @@
-from typing import Tuple
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Tuple
 
 import flask
 
 from i8t.client import IntrospectClient
 
 
+@dataclass
+class _Captured:  # pylint: disable=too-many-instance-attributes
+    start_time: float
+    method: str
+    url: str
+    headers: Dict[str, str]
+    args: Any
+    form: Any
+    is_json: bool
+    data: bytes
+    status_code: int
+    response_headers: Dict[str, str]
+    body: bytes
+
+
 class FlaskAdapter:
     LOCATION = "flask"
 
@@ -14,11 +32,24 @@ class FlaskAdapter:
     def record(
         self, start_time: float, request: flask.Request, response: flask.Response
     ) -> flask.Response:
-        self._send(self._for_success(start_time, request, response))
+        rate = self._client.sample(self.LOCATION)
+        if not rate:
+            return response
+        capture_start = time.perf_counter()
+        metadata = {"sample_rate": rate} if rate < 1.0 else {}
+        if self._client.is_deferred():
+            self._client.defer(
+                self._send_captured,
+                self._capture(start_time, request, response),
+                dict(self._client.capture_finish(), **metadata),
+            )
+        else:
+            self._send(self._for_success(start_time, request, response), **metadata)
+        self._client.record_overhead(self.LOCATION, time.perf_counter() - capture_start)
         return response
 
-    def _send(self, checkpoint_params: Tuple) -> None:
-        self._client.send(self._client.make_checkpoint(*checkpoint_params))
+    def _send(self, checkpoint_params: Tuple, **metadata) -> None:
+        self._client.send(self._client.make_checkpoint(*checkpoint_params, **metadata))
 
     def _for_success(
         self, start_time: float, request: flask.Request, response: flask.Response
@@ -41,3 +72,53 @@ class FlaskAdapter:
             },
             start_time,
         )
+
+    def _capture(
+        self, start_time: float, request: flask.Request, response: flask.Response
+    ) -> _Captured:
+        """Takes references to immutable parts of the request, without decoding them."""
+        return _Captured(
+            start_time=start_time,
+            method=request.method,
+            url=request.url,
+            headers=dict(request.headers),
+            args=request.args,
+            form=request.form,
+            is_json=request.is_json,
+            data=request.get_data(),
+            status_code=response.status_code,
+            response_headers=dict(response.headers),
+            body=response.get_data(),
+        )
+
+    def _send_captured(self, captured: _Captured, finish: dict) -> None:
+        capture_start = time.perf_counter()
+        self._send(
+            (
+                "flask",
+                {
+                    "method": captured.method,
+                    "url": captured.url,
+                    "headers": captured.headers,
+                    "args": captured.args,
+                    "form": captured.form,
+                    "json": _parse_json(captured.data) if captured.is_json else None,
+                    "data": captured.data.decode(errors="replace"),
+                },
+                {
+                    "status_code": captured.status_code,
+                    "headers": captured.response_headers,
+                    "body": captured.body.decode(),
+                },
+                captured.start_time,
+            ),
+            **finish,
+        )
+        self._client.record_overhead(self.LOCATION, time.perf_counter() - capture_start)
+
+
+def _parse_json(data: bytes) -> Any:
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
@@ -6,7 +6,7 @@ from urllib.parse import urlparse
 import flask.testing
 import werkzeug.test
 
-from i8t.testing.session import IntrospectSession
+from i8t.testing.session import IntrospectSession, SessionQuery
 from i8t.testing.time_range import TimeRange
 
 from .exporter import FlaskAdapter
@@ -45,7 +45,12 @@ class FlaskCase(TimeRange):  # pylint: disable=too-many-instance-attributes
 
     @classmethod
     def load(cls, session: IntrospectSession, path: str) -> List["FlaskCase"]:
-        return [cls.from_record(record) for record in session.filter_by(FlaskFilter(path))]
+        path_filter = FlaskFilter(path)
+        return [
+            cls.from_record(record)
+            for record in session.select(SessionQuery(FlaskAdapter.LOCATION))
+            if path_filter(record)
+        ]
 
 
 class FlaskFilter:
@@ -14,6 +14,7 @@ class _Params:
     method: str
     url: str
     kwargs: Dict[str, Any]
+    metadata: Dict[str, Any]
 
 
 class RequestsAdapter:
@@ -22,27 +23,39 @@ class RequestsAdapter:
     def __init__(self, client: IntrospectClient) -> None:
         self._client = client
 
-    def should_record(self, url: str) -> bool:
-        return url != self._client.api_url
+    def sample(self, url: str) -> float:
+        """Returns probability with which the request is recorded, or 0 to skip it."""
+        if url == self._client.api_url:
+            return 0.0
+        return self._client.sample(self.LOCATION)
 
     @contextlib.contextmanager
     def record(
-        self, method: str, url: str, kwargs: Dict[str, Any]
+        self, method: str, url: str, kwargs: Dict[str, Any], rate: float = 1.0
     ) -> Iterator[Callable[[requests.Response], requests.Response]]:
-        params = _Params(start_time=time.time(), method=method, url=url, kwargs=kwargs)
+        params = _Params(
+            start_time=time.time(),
+            method=method,
+            url=url,
+            kwargs=kwargs,
+            metadata={"sample_rate": rate} if rate < 1.0 else {},
+        )
 
         def recorder(response: requests.Response) -> requests.Response:
-            self._send(self._for_success(params, response))
+            capture_start = time.perf_counter()
+            self._send(self._for_success(params, response), params.metadata, capture_start)
             return response
 
         try:
             yield recorder
         except Exception as exc:
-            self._send(self._for_exception(params, exc))
+            capture_start = time.perf_counter()
+            self._send(self._for_exception(params, exc), params.metadata, capture_start)
             raise
 
-    def _send(self, checkpoint_params: Tuple) -> None:
-        self._client.send(self._client.make_checkpoint(*checkpoint_params))
+    def _send(self, checkpoint_params: Tuple, metadata: dict, capture_start: float) -> None:
+        self._client.send(self._client.make_checkpoint(*checkpoint_params, **metadata))
+        self._client.record_overhead(self.LOCATION, time.perf_counter() - capture_start)
 
     def _for_success(self, params: _Params, response: requests.Response) -> Tuple:
         return (
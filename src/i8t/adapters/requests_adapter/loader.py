@@ -4,7 +4,7 @@ from typing import Dict, Iterator, List, Optional
 
 import requests_mock
 
-from i8t.testing.session import IntrospectSession
+from i8t.testing.session import IntrospectSession, SessionQuery
 from i8t.testing.time_range import TimeRange
 
 from .exporter import RequestsAdapter
@@ -47,23 +47,7 @@ class RequestsMock:
 
     @classmethod
     def load(cls, session: IntrospectSession, within: Optional[TimeRange]) -> List["RequestsMock"]:
-        return [cls.from_record(record) for record in session.filter_by(RequestsFilter(within))]
-
-
-class RequestsFilter:
-    def __init__(self, within: Optional[TimeRange]) -> None:
-        self._within = within
-
-    def __call__(self, record: dict) -> bool:
-        return self._match_location(record["metadata"]["location"]) and self._match_within(record)
-
-    def _match_location(self, location: str) -> bool:
-        return location == RequestsAdapter.LOCATION
-
-    def _match_within(self, record: dict) -> bool:
-        if not self._within:
-            return True
-        return (
-            record["metadata"]["start_ts"] >= self._within.start_ts
-            and record["metadata"]["finish_ts"] <= self._within.finish_ts
-        )
+        return [
+            cls.from_record(record)
+            for record in session.select(SessionQuery(RequestsAdapter.LOCATION, within=within))
+        ]
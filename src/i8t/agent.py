@@ -0,0 +1,171 @@
+"""Local agent that forwards checkpoints of many worker processes to the relay.
+
+Workers use ``AgentStorage`` to write checkpoints as JSON lines to a Unix socket.
+The agent merges them into a single ``BatchingStorage``.
+
+Usage::
+
+    i8t agent https://api.demin.dev/i8t/toy --socket /tmp/i8t-agent.sock
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Optional, Type
+
+import requests
+
+from .batching_storage import BatchingStorage, BatchPolicy
+from .relay_storage import RelayStorage
+from .storage import IntrospectStorage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = "/tmp/i8t-agent.sock"
+
+
+class AgentStorage(IntrospectStorage):
+    """Sends checkpoints to the local agent.
+
+    Checkpoints are dropped if the agent is not available. Reconnection is retried
+    with exponential backoff, and the warning is logged once per failed attempt.
+    The connection is re-established after fork.
+    """
+
+    MIN_BACKOFF_SEC = 0.1
+    MAX_BACKOFF_SEC = 30.0
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET, timeout_sec: float = 0.1) -> None:
+        self._socket_path = socket_path
+        self._timeout_sec = timeout_sec
+        self._lock = threading.Lock()
+        self._sock: Optional[socket.socket] = None
+        self._pid = 0
+        self._backoff = _Backoff(self.MIN_BACKOFF_SEC, self.MAX_BACKOFF_SEC)
+        self.dropped = 0
+
+    def save(self, checkpoint: dict) -> None:
+        data = (json.dumps(checkpoint) + "\n").encode("utf-8")
+        with self._lock:
+            if self._sock is None and self._backoff.waiting():
+                self.dropped += 1
+                self._backoff.skipped += 1
+                return
+            try:
+                self._connected().sendall(data)
+            except OSError as exc:
+                self._disconnect()
+                self.dropped += 1
+                skipped = self._backoff.skipped
+                logger.warning(
+                    "Failed to send checkpoint to agent, retrying in %.1fs, %d dropped meanwhile: %s",
+                    self._backoff.failed(),
+                    skipped,
+                    exc,
+                )
+            else:
+                self._backoff.delay_sec = 0.0
+
+    def close(self) -> None:
+        with self._lock:
+            self._disconnect()
+
+    def _connected(self) -> socket.socket:
+        if self._sock is None or self._pid != os.getpid():
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self._timeout_sec)
+            try:
+                sock.connect(self._socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._sock, self._pid = sock, os.getpid()
+        return self._sock
+
+    def _disconnect(self) -> None:
+        if self._sock is not None:
+            # Socket inherited from the parent process is left to the parent
+            if self._pid == os.getpid():
+                self._sock.close()
+            self._sock = None
+
+
+class _Backoff:
+    """Exponentially growing delay between reconnection attempts."""
+
+    def __init__(self, min_sec: float, max_sec: float) -> None:
+        self._min_sec = min_sec
+        self._max_sec = max_sec
+        self._retry_at = 0.0
+        self.delay_sec = 0.0
+        self.skipped = 0
+
+    def waiting(self) -> bool:
+        return time.monotonic() < self._retry_at
+
+    def failed(self) -> float:
+        """Starts the next delay and returns its length."""
+        self.delay_sec = min(max(self.delay_sec * 2, self._min_sec), self._max_sec)
+        self._retry_at = time.monotonic() + self.delay_sec
+        self.skipped = 0
+        return self.delay_sec
+
+
+class IntrospectAgent:
+    def __init__(self, socket_path: str, storage: IntrospectStorage) -> None:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        self._socket_path = socket_path
+        self._server = socketserver.ThreadingUnixStreamServer(socket_path, _make_handler(storage))
+        self._server.daemon_threads = True
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def shutdown(self) -> None:
+        """Stops ``serve_forever`` running in another thread."""
+        self._server.shutdown()
+
+    def close(self) -> None:
+        self._server.server_close()
+        os.unlink(self._socket_path)
+
+
+def _make_handler(storage: IntrospectStorage) -> Type[socketserver.StreamRequestHandler]:
+    class AgentHandler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            for line in self.rfile:
+                try:
+                    checkpoint = json.loads(line)
+                except ValueError:
+                    logger.warning("Skipping malformed checkpoint: %r", line[:100])
+                    continue
+                storage.save(checkpoint)
+
+    return AgentHandler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="i8t agent", description=__doc__.splitlines()[0])
+    parser.add_argument("api_url")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--batch-size", type=int, default=BatchPolicy.max_batch_size)
+    parser.add_argument("--max-delay", type=float, default=BatchPolicy.max_delay_sec)
+    args = parser.parse_args()
+    storage = BatchingStorage(
+        RelayStorage(requests.Session(), args.api_url),
+        BatchPolicy(max_batch_size=args.batch_size, max_delay_sec=args.max_delay),
+    )
+    agent = IntrospectAgent(args.socket, storage)
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.close()
+        storage.close()
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, List, Optional
+
+from .batching_storage import BatchPolicy, BatchStats
+from .storage import IntrospectStorage
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncioBatchingStorage(IntrospectStorage):
+    """Queues checkpoints without blocking the event loop and flushes them from a task.
+
+    Batches are saved to the wrapped storage in the loop's default executor,
+    so blocking storages like ``RelayStorage`` don't stall the loop.
+    ``BatchPolicy.BLOCK`` overflow is treated as ``DROP_NEWEST``,
+    as waiting for room would block the loop.
+
+    Usage::
+
+        storage = AsyncioBatchingStorage(RelayStorage(requests.Session(), api_url))
+        storage.start()  # From a coroutine
+        ...
+        await storage.close()
+    """
+
+    def __init__(self, storage: IntrospectStorage, policy: Optional[BatchPolicy] = None) -> None:
+        self._storage = storage
+        self._policy = policy or BatchPolicy()
+        self._queue: Deque[dict] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._closed = False
+        self.stats = BatchStats()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._flush_forever())
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._task:
+            self._notify()
+            await asyncio.wait_for(self._task, self._policy.flush_timeout_sec)
+
+    def save(self, checkpoint: dict) -> None:
+        if self._closed:
+            self.stats.dropped += 1
+            return
+        if len(self._queue) >= self._policy.max_queue_size:
+            self.stats.dropped += 1
+            if self._policy.overflow != BatchPolicy.DROP_OLDEST:
+                return
+            self._queue.popleft()
+        self._queue.append(checkpoint)
+        if len(self._queue) >= self._policy.max_batch_size:
+            self._notify()
+
+    def _notify(self) -> None:
+        # save() may be called from executor threads as well
+        if self._task and self._wakeup:
+            self._task.get_loop().call_soon_threadsafe(self._wakeup.set)
+
+    async def _flush_forever(self) -> None:
+        assert self._wakeup
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self._policy.max_delay_sec)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._flush()
+        await self._flush()
+
+    async def _flush(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._queue:
+            batch = self._pop_batch()
+            try:
+                await loop.run_in_executor(None, self._storage.save_batch, batch)
+                self.stats.sent += len(batch)
+            except Exception:  # pylint: disable=broad-except
+                self.stats.failed += len(batch)
+                logger.exception("Error sending %d checkpoints", len(batch))
+
+    def _pop_batch(self) -> List[dict]:
+        size = min(len(self._queue), self._policy.max_batch_size)
+        return [self._queue.popleft() for _ in range(size)]
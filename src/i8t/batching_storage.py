@@ -0,0 +1,116 @@
+import atexit
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional
+
+from .storage import IntrospectStorage
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchPolicy:
+    DROP_NEWEST = "drop-newest"
+    DROP_OLDEST = "drop-oldest"
+    BLOCK = "block"
+
+    max_batch_size: int = 100
+    max_delay_sec: float = 1.0
+    max_queue_size: int = 10000
+    overflow: str = DROP_NEWEST
+    block_timeout_sec: float = 0.1
+    flush_timeout_sec: float = 5.0
+
+
+@dataclass
+class BatchStats:
+    sent: int = 0
+    dropped: int = 0
+    failed: int = 0
+
+
+class BatchingStorage(IntrospectStorage):
+    """Queues checkpoints in memory and saves them in batches from a background thread.
+
+    A batch is flushed when it reaches ``max_batch_size`` or ``max_delay_sec`` after
+    the previous flush, whichever comes first.
+    Remaining checkpoints are flushed on interpreter exit within ``flush_timeout_sec``.
+    """
+
+    def __init__(self, storage: IntrospectStorage, policy: Optional[BatchPolicy] = None) -> None:
+        self._storage = storage
+        self._policy = policy or BatchPolicy()
+        self._queue: Deque[dict] = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self.stats = BatchStats()
+        self._flusher = threading.Thread(
+            target=self._flush_forever, name="i8t-flusher", daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def save(self, checkpoint: dict) -> None:
+        with self._condition:
+            if self._closed or not self._make_room():
+                self.stats.dropped += 1
+                return
+            self._queue.append(checkpoint)
+            if len(self._queue) >= self._policy.max_batch_size:
+                self._condition.notify_all()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._flusher.join(self._policy.flush_timeout_sec if timeout is None else timeout)
+        atexit.unregister(self.close)
+
+    def _make_room(self) -> bool:
+        if len(self._queue) < self._policy.max_queue_size:
+            return True
+        if self._policy.overflow == BatchPolicy.DROP_OLDEST:
+            self._queue.popleft()
+            self.stats.dropped += 1
+            return True
+        if self._policy.overflow == BatchPolicy.BLOCK:
+            return (
+                self._condition.wait_for(self._is_not_full, self._policy.block_timeout_sec)
+                and not self._closed
+            )
+        return False
+
+    def _is_not_full(self) -> bool:
+        return self._closed or len(self._queue) < self._policy.max_queue_size
+
+    def _is_batch_ready(self) -> bool:
+        return self._closed or len(self._queue) >= self._policy.max_batch_size
+
+    def _flush_forever(self) -> None:
+        while True:
+            with self._condition:
+                self._condition.wait_for(self._is_batch_ready, self._policy.max_delay_sec)
+                batch = self._pop_batch()
+                self._condition.notify_all()
+                if not batch and self._closed:
+                    return
+            if batch:
+                self._send(batch)
+
+    def _pop_batch(self) -> List[dict]:
+        size = min(len(self._queue), self._policy.max_batch_size)
+        return [self._queue.popleft() for _ in range(size)]
+
+    def _send(self, batch: List[dict]) -> None:
+        try:
+            self._storage.save_batch(batch)
+            self.stats.sent += len(batch)
+        except Exception:  # pylint: disable=broad-except
+            self.stats.failed += len(batch)
+            logger.exception("Error sending %d checkpoints", len(batch))
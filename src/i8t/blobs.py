@@ -0,0 +1,243 @@
+"""Content-addressed store for large argument and result payloads.
+
+Large top-level arguments and results of decorated functions are pickled with dill
+and stored once under their SHA-256 digest.
+Checkpoints reference them as ``{"$i8t_blob": "<digest>"}``.
+
+Blob layout, with sections aligned to ``_ALIGN`` bytes::
+
+    MAGIC, uint32 buffer count, uint64 pickle length, uint64 length of each buffer,
+    pickle, out-of-band buffers
+
+Contiguous buffers (e.g. numpy arrays) are written as is, without copying into the pickle,
+and are loaded as views of the memory-mapped blob.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence
+
+import dill  # type: ignore
+
+from . import pickling
+
+logger = logging.getLogger(__name__)
+
+BLOB_KEY = "$i8t_blob"
+MAGIC = b"I8TB\x01"
+_ALIGN = 64
+# Lower bound of pickled size of a number, None, or container overhead
+_ITEM_BYTES = 2
+
+
+@dataclass
+class BlobPolicy:
+    # Encoded size from which a value is stored as a blob
+    min_bytes: int = 64 * 1024
+    # Number of digests remembered as already uploaded
+    cache_size: int = 10000
+
+
+class BlobStore:
+    def put(self, digest: str, data: bytes) -> None:
+        raise NotImplementedError()  # pragma: no cover
+
+    def put_chunks(self, digest: str, chunks: Sequence[Any]) -> None:
+        """Stores concatenation of buffers."""
+        self.put(digest, b"".join(chunks))
+
+    def get(self, digest: str) -> Any:
+        """Returns buffer with blob contents. Raises ``KeyError`` if missing."""
+        raise NotImplementedError()  # pragma: no cover
+
+
+class DirectoryBlobStore(BlobStore):
+    """Keeps blobs as files named by digest, and memory-maps them on read."""
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+
+    def put(self, digest: str, data: bytes) -> None:
+        self.put_chunks(digest, [data])
+
+    def put_chunks(self, digest: str, chunks: Sequence[Any]) -> None:
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent writers of the same blob write identical contents
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as fobj:
+            fobj.writelines(chunks)
+        os.replace(tmp_path, path)
+
+    def get(self, digest: str) -> Any:
+        try:
+            with open(self._path(digest), "rb") as fobj:
+                return mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError as exc:
+            raise KeyError(digest) from exc
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self._directory, digest[:2], digest[2:])
+
+
+class BlobWriter:
+    """Replaces large values with blob references, uploading each blob once."""
+
+    def __init__(self, store: BlobStore, policy: Optional[BlobPolicy] = None) -> None:
+        self._store = store
+        self._policy = policy or BlobPolicy()
+        self._lock = threading.Lock()
+        self._uploaded: "OrderedDict[str, None]" = OrderedDict()
+        self.uploaded = 0
+        self.reused = 0
+        self.failed = 0
+
+    def extract_input(self, input_: Any) -> Any:
+        """Returns ``input_`` itself if none of its arguments are extracted."""
+        if not isinstance(input_, dict):
+            return self.extract(input_)
+        args = input_.get("args", ())
+        kwargs = input_.get("kwargs", {})
+        extracted_args = type(args)(map(self.extract, args))
+        extracted_kwargs = {key: self.extract(value) for key, value in kwargs.items()}
+        if all(new is old for new, old in zip(extracted_args, args)) and all(
+            extracted_kwargs[key] is value for key, value in kwargs.items()
+        ):
+            return input_
+        return dict(input_, args=extracted_args, kwargs=extracted_kwargs)
+
+    def extract(self, obj: Any) -> Any:
+        """Returns blob reference to large ``obj``, or ``obj`` if it's small or can't be stored."""
+        if estimate_size(obj, self._policy.min_bytes) < self._policy.min_bytes:
+            return obj
+        try:
+            chunks = dump_blob(obj)
+            if sum(map(len, chunks)) < self._policy.min_bytes:
+                return obj
+            digest = hashlib.sha256()
+            for chunk in chunks:
+                digest.update(chunk)
+            self._upload_once(digest.hexdigest(), chunks)
+        except Exception:  # pylint: disable=broad-except
+            # Encoded in-band instead, failing the decorated call is worse
+            self.failed += 1
+            logger.exception("Error storing blob")
+            return obj
+        return {BLOB_KEY: digest.hexdigest()}
+
+    def _upload_once(self, digest: str, chunks: List[Any]) -> None:
+        with self._lock:
+            if digest in self._uploaded:
+                self._uploaded.move_to_end(digest)
+                self.reused += 1
+                return
+        self._store.put_chunks(digest, chunks)
+        with self._lock:
+            self._uploaded[digest] = None
+            self.uploaded += 1
+            if len(self._uploaded) > self._policy.cache_size:
+                self._uploaded.popitem(last=False)
+
+
+def estimate_size(obj: Any, limit: int) -> int:
+    """Returns lower bound of pickled size, counting up to ``limit``.
+
+    Objects, which size is not known without pickling, count as ``limit``.
+    """
+    size = 0
+    stack = [obj]
+    while stack and size < limit:
+        item = stack.pop()
+        if item is None or isinstance(item, (bool, int, float)):
+            size += _ITEM_BYTES
+        elif isinstance(item, (str, bytes, bytearray)):
+            size += len(item)
+        elif isinstance(item, dict):
+            size += _ITEM_BYTES
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            size += _ITEM_BYTES
+            stack.extend(item)
+        elif isinstance(getattr(item, "nbytes", None), int):
+            # numpy arrays, memoryviews
+            size += item.nbytes
+        else:
+            return limit
+    return size
+
+
+def resolve_input(input_: Any, store: Optional[BlobStore]) -> Any:
+    if not isinstance(input_, dict) or BLOB_KEY in input_:
+        return resolve(input_, store)
+    args = input_.get("args", ())
+    return dict(
+        input_,
+        args=type(args)(resolve(value, store) for value in args),
+        kwargs={key: resolve(value, store) for key, value in input_.get("kwargs", {}).items()},
+    )
+
+
+def resolve(obj: Any, store: Optional[BlobStore]) -> Any:
+    if not (isinstance(obj, dict) and len(obj) == 1 and BLOB_KEY in obj):
+        return obj
+    if store is None:
+        raise ValueError(f"Checkpoint references blob {obj[BLOB_KEY]}, but no blob store is given")
+    return load_blob(store.get(obj[BLOB_KEY]))
+
+
+def dump_blob(obj: Any) -> List[Any]:
+    """Pickles object into blob chunks, keeping contiguous buffers out-of-band."""
+    buffers: List[memoryview] = []
+
+    def out_of_band(buffer: Any) -> bool:
+        # Pickler rejects non-contiguous buffers before calling back
+        buffers.append(buffer.raw())
+        return False
+
+    data = pickling.dumps(obj, buffer_callback=out_of_band)
+    header = MAGIC + struct.pack(
+        f"<IQ{len(buffers)}Q", len(buffers), len(data), *(buf.nbytes for buf in buffers)
+    )
+    chunks: List[Any] = [header, _padding(len(header)), data]
+    offset = _aligned(len(header)) + len(data)
+    for buf in buffers:
+        chunks += [_padding(offset), buf]
+        offset = _aligned(offset) + buf.nbytes
+    return chunks
+
+
+def load_blob(blob: Any) -> Any:
+    """Unpickles blob, with out-of-band buffers referencing the blob memory."""
+    view = memoryview(blob)
+    if view[: len(MAGIC)] != MAGIC:
+        # Blobs written before the header was introduced
+        return dill.loads(view)
+    count, data_size = struct.unpack_from("<IQ", view, len(MAGIC))
+    sizes = struct.unpack_from(f"<{count}Q", view, len(MAGIC) + 12)
+    offset = _aligned(len(MAGIC) + 12 + 8 * count)
+    data = view[offset : offset + data_size]
+    offset += data_size
+    buffers = []
+    for size in sizes:
+        offset = _aligned(offset)
+        buffers.append(view[offset : offset + size])
+        offset += size
+    return pickling.loads(data, buffers)
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def _padding(offset: int) -> bytes:
+    return b"\0" * (_aligned(offset) - offset)
@@ -1,3 +1,33 @@
-from .relay_consumer import main as cli
+import sys
+
+from .agent import main as agent
+from .relay_consumer import main as collect
+from .relay_server import main as serve
+from .spool_storage import main as spool_upload
+
+
+def session_cache() -> None:
+    # Test tooling is imported only when used
+    # pylint: disable-next=import-outside-toplevel
+    from .testing.session_cache import main
+
+    main()
+
+
+COMMANDS = {
+    "agent": agent,
+    "serve": serve,
+    "session-cache": session_cache,
+    "spool-upload": spool_upload,
+}
+
+
+def cli() -> None:
+    """Runs ``i8t <command> ...``, or collects checkpoints with ``i8t <url>``."""
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv.pop(1)]()
+    else:
+        collect()
+
 
 __all__ = ["cli"]
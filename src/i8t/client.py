@@ -1,52 +1,180 @@
 import contextvars
+import itertools
 import logging
+import os
 import time
 import uuid
-from typing import Optional
+import zlib
+from typing import Any, Callable, Iterator, Optional, Tuple
 
 import requests
 
+from .deferred import DeferredWorker
+from .metrics import (
+    CAPTURE_SECONDS,
+    CHECKPOINTS,
+    DROPPED,
+    QUEUE_DEPTH,
+    REGISTRY,
+    MetricsRegistry,
+)
 from .relay_storage import RelayStorage
+from .sampling import AdaptiveSampler
 from .storage import IntrospectStorage
 
 logger = logging.getLogger(__name__)
 _INTROSPECT_CONTEXT: contextvars.ContextVar[str] = contextvars.ContextVar(
     "_INTROSPECT_CONTEXT", default=""
 )
+_INTROSPECT_SAMPLED: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "_INTROSPECT_SAMPLED", default=True
+)
+
+
+class _ProducerIds:
+    """Identifies checkpoints of this process as ``(producer, seq)``.
+
+    Sequence numbers start from 1 and have no gaps, so that consumers can detect drops.
+    Forked processes become new producers.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.producer = os.urandom(6).hex()
+        # next() on itertools.count is atomic under the GIL
+        self._seq = itertools.count(1)
+
+    def next_seq(self) -> int:
+        return next(self._seq)
+
+
+_PRODUCER_IDS = _ProducerIds()
+# Not available on Windows
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_PRODUCER_IDS.reset)
 
 
 class IntrospectClient:
-    def __init__(
-        self, api_url: str, name: str, storage: Optional[IntrospectStorage] = None
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        api_url: str,
+        name: str,
+        storage: Optional[IntrospectStorage] = None,
+        sample_rate: float = 1.0,
+        deferred_worker: Optional[DeferredWorker] = None,
+        sampler: Optional[AdaptiveSampler] = None,
+        metrics: Optional[MetricsRegistry] = None,
     ) -> None:
         self.api_url = api_url
         self._name = name
-        self._storage = storage or RelayStorage(requests.Session(), api_url)
+        self.metrics = metrics or REGISTRY
+        self._storage = storage or RelayStorage(requests.Session(), api_url, metrics=self.metrics)
+        self._sample_rate = sample_rate
+        self._deferred_worker = deferred_worker
+        self._sampler = sampler
+        self.metrics.add_collector(self._collect_metrics)
 
     def start_context(self, value: str = "") -> None:
-        _INTROSPECT_CONTEXT.set(value or self._gen_random_context_value())
+        value = value or self._gen_random_context_value()
+        _INTROSPECT_CONTEXT.set(value)
+        _INTROSPECT_SAMPLED.set(self._should_sample(value))
 
     def reset_context(self) -> None:
         _INTROSPECT_CONTEXT.set("")
+        _INTROSPECT_SAMPLED.set(True)
+
+    def is_sampled(self) -> bool:
+        """Tells if checkpoints of the current context should be recorded.
+
+        The decision is made once in ``start_context`` by hashing the context value,
+        so all processes sharing the context value make the same decision.
+        Checkpoints outside of any context are always recorded.
+        """
+        return _INTROSPECT_SAMPLED.get()
+
+    def sample(self, location: str) -> float:
+        """Returns probability with which the call at location is recorded, or 0 to skip it.
+
+        Combines the context decision with the per-location rate of the adaptive sampler.
+        Adapters store rates below 1 as ``sample_rate`` in checkpoint metadata.
+        """
+        if not _INTROSPECT_SAMPLED.get():
+            return 0.0
+        rate = self._sample_rate if _INTROSPECT_CONTEXT.get() else 1.0
+        if self._sampler is not None:
+            rate *= self._sampler.sample(location)
+        return rate
+
+    def record_overhead(self, location: str, elapsed_sec: float) -> None:
+        """Accounts time spent capturing a call in metrics and the adaptive sampler."""
+        self.metrics.observe(CAPTURE_SECONDS, location, elapsed_sec)
+        if self._sampler is not None:
+            self._sampler.record(location, elapsed_sec)
 
     def send(self, data: dict) -> None:
+        self.metrics.inc(CHECKPOINTS, data.get("metadata", {}).get("location", ""))
         self._storage.save(data)
 
+    def is_deferred(self) -> bool:
+        """Tells if adapters should encode checkpoints with ``defer``."""
+        return self._deferred_worker is not None
+
+    def snapshot(self, obj: Any) -> Any:
+        assert self._deferred_worker
+        return self._deferred_worker.snapshot(obj)
+
+    def defer(self, func: Callable[..., None], *args: Any) -> None:
+        assert self._deferred_worker
+        self._deferred_worker.submit(func, *args)
+
     def make_checkpoint(
         self, location: str, input_data: dict, output_data: dict, start_ts: float, **metadata
     ) -> dict:
+        if "finish_ts" not in metadata:
+            metadata = dict(self.capture_finish(), **metadata)
         return {
             "metadata": dict(
                 name=self._name,
                 location=location,
                 start_ts=start_ts,
-                finish_ts=time.time(),
-                context=_INTROSPECT_CONTEXT.get(""),
                 **metadata,
             ),
             "input": input_data,
             "output": output_data,
         }
 
+    def capture_finish(self) -> dict:
+        """Captures metadata of a finished call to make its checkpoint later.
+
+        Sequence number is assigned here, so that checkpoints dropped later are seen as gaps.
+        """
+        return {
+            "finish_ts": time.time(),
+            "context": _INTROSPECT_CONTEXT.get(""),
+            "producer": _PRODUCER_IDS.producer,
+            "seq": _PRODUCER_IDS.next_seq(),
+        }
+
+    def _collect_metrics(self) -> Iterator[Tuple[str, str, float]]:
+        if self._deferred_worker is not None:
+            yield QUEUE_DEPTH, "deferred", self._deferred_worker.queue_depth
+            yield DROPPED, "deferred", self._deferred_worker.dropped
+        # Batching, spooling and agent storages keep their own counters
+        component = type(self._storage).__name__
+        queue_depth = getattr(self._storage, "queue_depth", None)
+        if isinstance(queue_depth, int):
+            yield QUEUE_DEPTH, component, queue_depth
+        stats = getattr(self._storage, "stats", self._storage)
+        # Checkpoints of failed batches are lost as well
+        counters = (getattr(stats, "dropped", 0), getattr(stats, "failed", 0))
+        dropped = sum(value for value in counters if isinstance(value, int))
+        if dropped:
+            yield DROPPED, component, dropped
+
+    def _should_sample(self, value: str) -> bool:
+        return zlib.crc32(value.encode("utf-8")) < self._sample_rate * 2**32
+
     def _gen_random_context_value(self) -> str:
         return uuid.uuid4().hex
@@ -0,0 +1,135 @@
+import gzip
+import io
+import json
+import threading
+from typing import Any, BinaryIO, Dict, Iterable, Optional, Type
+
+import requests
+import urllib3
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
+
+class Codec:
+    name = ""
+    # Suffix of compressed files
+    extension = ""
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError()  # pragma: no cover
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError()  # pragma: no cover
+
+    def open_writer(self, fobj: BinaryIO) -> BinaryIO:
+        """Wraps file to compress written data as a stream."""
+        raise NotImplementedError()  # pragma: no cover
+
+    def open_reader(self, fobj: BinaryIO) -> BinaryIO:
+        """Wraps file to decompress data as it is read, line by line."""
+        raise NotImplementedError()  # pragma: no cover
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    extension = ".gz"
+
+    def __init__(self, level: int = 6) -> None:
+        self._level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return gzip.compress(data, self._level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return gzip.decompress(data)
+
+    def open_writer(self, fobj: BinaryIO) -> BinaryIO:
+        return gzip.GzipFile(fileobj=fobj, mode="wb", compresslevel=self._level)  # type: ignore
+
+    def open_reader(self, fobj: BinaryIO) -> BinaryIO:
+        return gzip.GzipFile(fileobj=fobj, mode="rb")  # type: ignore
+
+
+class ZstdCodec(Codec):
+    """Zstandard compression, optionally with a shared dictionary.
+
+    The dictionary must be the same on both sides,
+    see ``train_zstd_dictionary``.
+    Requires ``pip install i8t[zstd]``.
+    """
+
+    name = "zstd"
+    extension = ".zst"
+
+    def __init__(self, level: int = 3, dictionary: Optional[bytes] = None) -> None:
+        if zstandard is None:  # pragma: no cover
+            raise ImportError("zstd compression requires 'pip install i8t[zstd]'")
+        self._level = level
+        self._dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        # Compression contexts are not thread-safe
+        self._local = threading.local()
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._local.compressor = zstandard.ZstdCompressor(
+                level=self._level, dict_data=self._dict_data
+            )
+        return compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return (
+            zstandard.ZstdDecompressor(dict_data=self._dict_data).decompressobj().decompress(data)
+        )
+
+    def open_writer(self, fobj: BinaryIO) -> BinaryIO:
+        compressor = zstandard.ZstdCompressor(level=self._level, dict_data=self._dict_data)
+        return compressor.stream_writer(fobj)
+
+    def open_reader(self, fobj: BinaryIO) -> BinaryIO:
+        decompressor = zstandard.ZstdDecompressor(dict_data=self._dict_data)
+        # Decompression reader does not split lines
+        return io.BufferedReader(decompressor.stream_reader(fobj))  # type: ignore
+
+
+CODECS: Dict[str, Type[Codec]] = {GzipCodec.name: GzipCodec, ZstdCodec.name: ZstdCodec}
+# Encodings that requests decodes on its own
+_TRANSPARENT_ENCODINGS = frozenset(urllib3.util.request.ACCEPT_ENCODING.split(","))
+
+
+def accept_encoding() -> str:
+    encodings = set(_TRANSPARENT_ENCODINGS)
+    if zstandard is not None:
+        encodings.add(ZstdCodec.name)
+    return ", ".join(sorted(encodings))
+
+
+def codec_for_path(path: str) -> Optional[Codec]:
+    """Returns codec of a compressed file by its extension, or None."""
+    for codec_cls in CODECS.values():
+        if path.endswith(codec_cls.extension):
+            return codec_cls()
+    return None
+
+
+def decode_json(response: requests.Response, codec: Optional[Codec] = None) -> Any:
+    """Parses JSON response, decompressing encodings unknown to requests."""
+    encoding = response.headers.get("Content-Encoding", "")
+    if not encoding or encoding in _TRANSPARENT_ENCODINGS:
+        return response.json()
+    if not codec or codec.name != encoding:
+        if encoding not in CODECS:
+            raise ValueError(f"Unsupported Content-Encoding: {encoding}")
+        codec = CODECS[encoding]()
+    return json.loads(codec.decompress(response.content))
+
+
+def train_zstd_dictionary(samples: Iterable[bytes], dict_size: int = 16 * 1024) -> bytes:
+    """Trains zstd dictionary on a few hundred typical request bodies.
+
+    Use ``RelayConverter.encode`` to get the body of a checkpoint.
+    """
+    return zstandard.train_dictionary(dict_size, list(samples)).as_bytes()
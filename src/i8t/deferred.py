@@ -0,0 +1,94 @@
+import atexit
+import copy
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DeferredWorker:
+    """Encodes checkpoints on a background thread, off the instrumented code path.
+
+    Adapters capture cheap snapshots of the call and submit the encoding.
+    Snapshot policy decides how objects that can change after the call are captured:
+
+    * ``REFERENCE`` keeps references, later mutations leak into the checkpoint.
+    * ``SHALLOW`` copies top-level objects, e.g. the list passed as an argument.
+    * ``DEEP`` deep-copies objects, which is as safe as encoding in place.
+    """
+
+    REFERENCE = "reference"
+    SHALLOW = "shallow"
+    DEEP = "deep"
+    _STOP = object()
+
+    def __init__(
+        self,
+        snapshot_policy: str = SHALLOW,
+        max_queue_size: int = 10000,
+        flush_timeout_sec: float = 5.0,
+    ) -> None:
+        self._snapshot_policy = snapshot_policy
+        self._flush_timeout_sec = flush_timeout_sec
+        self._queue: "queue.Queue[Any]" = queue.Queue(max_queue_size)
+        self.dropped = 0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="i8t-encoder", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def snapshot(self, obj: Any) -> Any:
+        """Captures object according to the policy. Raises if it can't be copied."""
+        if self._snapshot_policy == self.DEEP:
+            return copy.deepcopy(obj)
+        if self._snapshot_policy == self.SHALLOW:
+            return _shallow_copy(obj)
+        return obj
+
+    def submit(self, func: Callable[..., None], *args: Any) -> None:
+        if self._closed:
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait((func, args))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Encodes queued checkpoints, waiting for at most ``timeout`` seconds."""
+        self._closed = True
+        deadline = time.monotonic() + (self._flush_timeout_sec if timeout is None else timeout)
+        try:
+            self._queue.put(self._STOP, timeout=max(deadline - time.monotonic(), 0))
+        except queue.Full:
+            # Encoder thread is a daemon, so it doesn't hold interpreter exit
+            logger.warning("Checkpoints were not encoded in time, %d left", self.queue_depth)
+        else:
+            self._thread.join(max(deadline - time.monotonic(), 0))
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                return
+            func, args = item
+            try:
+                func(*args)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Error encoding checkpoint")
+
+
+def _shallow_copy(obj: Any) -> Any:
+    if type(obj) is dict:  # pylint: disable=unidiomatic-typecheck
+        return {key: copy.copy(value) for key, value in obj.items()}
+    if type(obj) in (list, tuple):  # pylint: disable=unidiomatic-typecheck
+        return type(obj)(copy.copy(value) for value in obj)
+    return copy.copy(obj)
@@ -0,0 +1,185 @@
+"""Registry of checkpoint payload encoders, keyed by the hint stored in metadata.
+
+orjson and msgpack encoders are always registered, but encode only when the packages
+are installed. Checkpoints encoded with ``orjson`` can still be decoded without it.
+orjson is used only for objects that it encodes the same as stdlib json.
+"""
+
+import base64
+import enum
+import json
+import math
+import uuid
+from typing import Any, Dict, Tuple, Type, Union
+
+import dill  # type: ignore
+
+from . import pickling
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgpack  # type: ignore
+except ImportError:  # pragma: no cover
+    msgpack = None  # type: ignore[assignment]
+
+
+class Encoder:
+    hint = ""
+    # Exceptions meaning that the object is not supported by the encoder
+    errors: Tuple[Type[Exception], ...] = (TypeError,)
+    # False when the package, that the encoder needs, is not installed
+    available = True
+
+    def encode(self, obj: Any) -> str:
+        raise NotImplementedError()  # pragma: no cover
+
+    def decode(self, data: str) -> Any:
+        raise NotImplementedError()  # pragma: no cover
+
+
+class JsonEncoder(Encoder):
+    hint = "json"
+
+    def encode(self, obj: Any) -> str:
+        return json.dumps(obj)
+
+    def decode(self, data: str) -> Any:
+        return json.loads(data)
+
+
+class PickledPayload(str):
+    """Dill payload text, that carries its base85-decoded pickle, e.g. loaded from session cache.
+
+    Compares equal to the text, and is decoded without base85 decoding, that is slower than
+    unpickling small objects.
+    """
+
+    pickled: bytes
+
+    def __new__(cls, text: str, pickled: bytes) -> "PickledPayload":
+        payload = super().__new__(cls, text)
+        payload.pickled = pickled
+        return payload
+
+    def __reduce__(self) -> Tuple[type, Tuple[str, bytes]]:
+        return PickledPayload, (str(self), self.pickled)
+
+
+class DillEncoder(Encoder):
+    hint = "dill"
+
+    def encode(self, obj: Any) -> str:
+        return base64.b85encode(pickling.dumps(obj)).decode("utf-8")
+
+    def decode(self, data: str) -> Any:
+        if isinstance(data, PickledPayload):
+            return dill.loads(data.pickled)
+        return dill.loads(self.unwrap(data))
+
+    @staticmethod
+    def unwrap(data: str) -> bytes:
+        """Returns pickle of the encoded payload."""
+        return base64.b85decode(data.encode("utf-8"))
+
+
+class OrjsonEncoder(Encoder):
+    hint = "orjson"
+    errors = (TypeError, ValueError)
+    available = orjson is not None
+
+    def encode(self, obj: Any) -> str:
+        if not _same_in_orjson(obj):
+            raise ValueError("Object is encoded differently by orjson")
+        return orjson.dumps(obj, option=_ORJSON_STRICT).decode("utf-8")
+
+    def decode(self, data: str) -> Any:
+        return orjson.loads(data) if orjson else json.loads(data)
+
+
+class MsgpackEncoder(Encoder):
+    hint = "msgpack"
+    errors = (TypeError, ValueError, OverflowError)
+    available = msgpack is not None
+
+    def encode(self, obj: Any) -> str:
+        return base64.b85encode(msgpack.packb(obj, use_bin_type=True)).decode("utf-8")
+
+    def decode(self, data: str) -> Any:
+        return msgpack.unpackb(
+            base64.b85decode(data.encode("utf-8")), raw=False, strict_map_key=False
+        )
+
+
+# Leave types, which stdlib json encodes differently or rejects, to the fallback
+_ORJSON_STRICT = (
+    orjson.OPT_PASSTHROUGH_DATACLASS
+    | orjson.OPT_PASSTHROUGH_DATETIME
+    | orjson.OPT_PASSTHROUGH_SUBCLASS
+    if orjson
+    else 0
+)
+_JSON_SCALARS = frozenset((str, int, bool, type(None)))
+DILL = DillEncoder()
+ENCODERS: Dict[str, Encoder] = {
+    encoder.hint: encoder for encoder in (JsonEncoder(), DILL, OrjsonEncoder(), MsgpackEncoder())
+}
+# Byte-for-byte compatible with earlier versions
+DEFAULT_HINTS = ("json", "dill")
+# Fastest json-compatible encoders available in this environment.
+# msgpack keeps non-string dict keys, so it is left for explicit opt-in.
+FAST_HINTS = (("orjson",) if orjson else ()) + DEFAULT_HINTS
+
+
+def register_encoder(encoder: Encoder) -> None:
+    ENCODERS[encoder.hint] = encoder
+
+
+def get_encoder(hint: str) -> Encoder:
+    # Checkpoints without hint were always encoded with dill
+    return ENCODERS.get(hint, DILL)
+
+
+def dumps(obj: Any) -> str:
+    """Encodes JSON with orjson, if installed, falling back to stdlib."""
+    if orjson and _same_in_orjson(obj):
+        try:
+            return orjson.dumps(obj, option=_ORJSON_STRICT).decode("utf-8")
+        except (TypeError, ValueError):
+            pass
+    return json.dumps(obj)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson:
+        try:
+            return orjson.loads(data)
+        except ValueError:
+            pass
+    return json.loads(data)
+
+
+def _same_in_orjson(obj: Any) -> bool:
+    """Tells if orjson doesn't write NaN or infinity as null, and enums or UUIDs by value.
+
+    Other types, that orjson treats differently, are rejected by ``_ORJSON_STRICT``.
+    """
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        kind = type(item)
+        if kind in _JSON_SCALARS:
+            continue
+        if kind is float:
+            if not math.isfinite(item):
+                return False
+        elif kind is dict:
+            stack.extend(item.values())
+        elif kind is list or kind is tuple:
+            stack.extend(item)
+        elif isinstance(item, (enum.Enum, uuid.UUID)):
+            return False
+    return True
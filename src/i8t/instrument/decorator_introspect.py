@@ -1,32 +1,101 @@
+import inspect
+import threading
+import weakref
 from functools import wraps
-from typing import Optional
+from typing import Dict, Optional, Sequence, Tuple
 
-from i8t.adapters.decorator_adapter.exporter import DecoratorExporter
+from i8t.adapters.decorator_adapter.exporter import CallSite, DecoratorExporter
+from i8t.adapters.decorator_adapter.serde import HintStats
+from i8t.blobs import BlobWriter
 from i8t.client import IntrospectClient
+from i8t.encoders import DEFAULT_HINTS
+from i8t.location_filter import LocationFilter
+
+# Call sites of all decorated functions, rebound on register and unregister
+_SITES: "weakref.WeakSet[CallSite]" = weakref.WeakSet()
+_SITES_LOCK = threading.Lock()
 
 
 class DecoratorIntrospect:
     instance: Optional["DecoratorIntrospect"] = None
 
-    def __init__(self, client: IntrospectClient) -> None:
+    def __init__(
+        self,
+        client: IntrospectClient,
+        hints: Sequence[str] = DEFAULT_HINTS,
+        blob_writer: Optional[BlobWriter] = None,
+        locations: Optional[LocationFilter] = None,
+    ) -> None:
+        """``hints`` lists encoders to try in order, e.g. ``i8t.encoders.FAST_HINTS``.
+
+        ``blob_writer`` moves large arguments and results to a blob store.
+        ``locations`` limits introspection to matching functions,
+        others run without any overhead but a single attribute check.
+        """
         self._client = client
-        self._decorator_exporter = DecoratorExporter(client)
+        self._decorator_exporter = DecoratorExporter(client, hints, blob_writer)
+        self._locations = locations
+
+    @property
+    def hint_stats(self) -> Dict[Tuple[str, str], HintStats]:
+        """Encoder usage per ``(location, "input" | "output")``."""
+        return self._decorator_exporter.hint_stats
 
     def register(self) -> None:
         self.__class__.instance = self
+        _bind_all(self)
 
     def unregister(self) -> None:
         self.__class__.instance = None
+        _bind_all(None)
 
-    def wrapper(self, func, *args, **kwargs):
-        return self._decorator_exporter.wrapper(func, *args, **kwargs)
+    def bind(self, site: CallSite) -> None:
+        if self._locations is None or self._locations(site.location):
+            site.exporter = self._decorator_exporter
+        else:
+            site.exporter = None
 
 
 def introspect(func):
+    site = CallSite(func)
+    with _SITES_LOCK:
+        _SITES.add(site)
+        _bind(site, DecoratorIntrospect.instance)
+
+    if inspect.iscoroutinefunction(func):
+        return _introspect_async(site)
+
     @wraps(func)
     def wrapper(*args, **kwargs):
-        if DecoratorIntrospect.instance:
-            return DecoratorIntrospect.instance.wrapper(func, *args, **kwargs)
-        return func(*args, **kwargs)
+        exporter = site.exporter
+        if exporter is None:
+            return func(*args, **kwargs)
+        return exporter.wrapper(site, args, kwargs)
 
     return wrapper
+
+
+def _introspect_async(site: CallSite):
+    func = site.func
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        exporter = site.exporter
+        if exporter is None:
+            return await func(*args, **kwargs)
+        return await exporter.async_wrapper(site, args, kwargs)
+
+    return wrapper
+
+
+def _bind_all(decorator_introspect: Optional[DecoratorIntrospect]) -> None:
+    with _SITES_LOCK:
+        for site in list(_SITES):
+            _bind(site, decorator_introspect)
+
+
+def _bind(site: CallSite, decorator_introspect: Optional[DecoratorIntrospect]) -> None:
+    if decorator_introspect is None:
+        site.exporter = None
+    else:
+        decorator_introspect.bind(site)
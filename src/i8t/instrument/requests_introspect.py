@@ -18,7 +18,8 @@ class RequestsIntrospect:
         requests.Session.request = self._original_request  # type: ignore[assignment]
 
     def _instrumented_request(self, method, url, **kwargs):
-        if not self._requests_adapter.should_record(url):
+        rate = self._requests_adapter.sample(url)
+        if not rate:
             return self._session_request(method, url, **kwargs)
-        with self._requests_adapter.record(method, url, kwargs) as recorder:
+        with self._requests_adapter.record(method, url, kwargs, rate) as recorder:
             return recorder(self._session_request(method, url, **kwargs))
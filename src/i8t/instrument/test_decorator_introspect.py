@@ -1,8 +1,12 @@
+import asyncio
 import unittest
 from unittest import mock
 
 from i8t.client import IntrospectClient
+from i8t.deferred import DeferredWorker
 from i8t.inmemory_storage import IntrospectInMemoryStorage
+from i8t.location_filter import LocationFilter
+from i8t.sampling import AdaptiveSampler
 
 from .decorator_introspect import DecoratorIntrospect, introspect
 
@@ -31,6 +35,8 @@ class TestDecoratorIntrospect(unittest.TestCase):
                     "start_ts": 1000,
                     "finish_ts": 2000,
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                     "input_hint": "json",
                     "output_hint": "json",
                 },
@@ -53,6 +59,8 @@ class TestDecoratorIntrospect(unittest.TestCase):
                     "start_ts": 1000,
                     "finish_ts": 2000,
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                     "input_hint": "json",
                     "output_hint": "json",
                 },
@@ -72,6 +80,8 @@ class TestDecoratorIntrospect(unittest.TestCase):
                 "input": '{"args": [3], "kwargs": {}}',
                 "metadata": {
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                     "finish_ts": 3,
                     "input_hint": "json",
                     "location": "i8t.instrument.test_decorator_introspect.Dummy.method",
@@ -88,6 +98,8 @@ class TestDecoratorIntrospect(unittest.TestCase):
                 ),
                 "metadata": {
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                     "finish_ts": 4,
                     "input_hint": "dill",
                     "location": "i8t.instrument.test_decorator_introspect.Dummy.non_json",
@@ -98,6 +110,9 @@ class TestDecoratorIntrospect(unittest.TestCase):
                 "output": "6",
             },
         ]
+        stats = self.decorator.hint_stats
+        location = "i8t.instrument.test_decorator_introspect.Dummy.non_json"
+        self.assertEqual(stats[(location, "input")].encoded, {"dill": 1})
 
     def test_nested_function_introspected(self):
         dummy = Dummy()
@@ -113,6 +128,8 @@ class TestDecoratorIntrospect(unittest.TestCase):
                     "start_ts": 2,
                     "finish_ts": 3,
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                     "input_hint": "json",
                     "output_hint": "json",
                 },
@@ -126,6 +143,8 @@ class TestDecoratorIntrospect(unittest.TestCase):
                     "start_ts": 1,
                     "finish_ts": 4,
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                     "input_hint": "json",
                     "output_hint": "json",
                 },
@@ -140,6 +159,151 @@ class TestDecoratorIntrospect(unittest.TestCase):
         self.assertEqual(dummy_func(1, 2), 3)
         assert not self.storage.checkpoints
 
+    def test_coroutine_introspected(self):
+        with mock.patch("time.time", side_effect=[1000, 2000]):
+            result = asyncio.run(dummy_async(1, 2))
+
+        self.assertEqual(result, 3)
+        assert self.storage.checkpoints == [
+            {
+                "metadata": {
+                    "name": "test_client",
+                    "location": "i8t.instrument.test_decorator_introspect.dummy_async",
+                    "start_ts": 1000,
+                    "finish_ts": 2000,
+                    "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
+                    "input_hint": "json",
+                    "output_hint": "json",
+                },
+                "input": '{"args": [1, 2], "kwargs": {}}',
+                "output": "3",
+            },
+        ]
+
+    def test_coroutine_exception_introspected(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(dummy_async(1, -1))
+        self.assertEqual(self.storage.checkpoints[0]["output"], '{"error": "Test exception"}')
+
+    def test_cancelled_coroutine_introspected(self):
+        async def run():
+            await asyncio.wait_for(dummy_async(1, 0, delay=1), timeout=0.01)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(run())
+        self.assertEqual(self.storage.checkpoints[0]["output"], '{"error": "cancelled"}')
+
+    def test_coroutine_unregistered(self):
+        self.decorator.unregister()
+        self.assertEqual(asyncio.run(dummy_async(1, 2)), 3)
+        assert not self.storage.checkpoints
+
+    def test_unsampled_coroutine_skipped(self):
+        client = IntrospectClient(
+            "http://example.com", "test_client", storage=self.storage, sample_rate=0
+        )
+        DecoratorIntrospect(client).register()
+
+        async def run():
+            client.start_context()
+            return await dummy_async(1, 2)
+
+        self.assertEqual(asyncio.run(run()), 3)
+        assert not self.storage.checkpoints
+
+    def test_deferred_encoding_snapshots_arguments(self):
+        worker = DeferredWorker()
+        client = IntrospectClient(
+            "http://example.com", "test_client", storage=self.storage, deferred_worker=worker
+        )
+        DecoratorIntrospect(client).register()
+        items = [1, 2]
+        with mock.patch("time.time", side_effect=[1000, 2000]):
+            self.assertEqual(dummy_func(items, [3]), [1, 2, 3])
+        items.append(4)
+        worker.close()
+        assert self.storage.checkpoints == [
+            {
+                "metadata": {
+                    "name": "test_client",
+                    "location": "i8t.instrument.test_decorator_introspect.dummy_func",
+                    "start_ts": 1000,
+                    "finish_ts": 2000,
+                    "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
+                    "input_hint": "json",
+                    "output_hint": "json",
+                },
+                "input": '{"args": [[1, 2], [3]], "kwargs": {}}',
+                "output": "[1, 2, 3]",
+            },
+        ]
+
+    def test_deferred_encoding_falls_back_for_uncopyable(self):
+        worker = DeferredWorker(DeferredWorker.DEEP)
+        client = IntrospectClient(
+            "http://example.com", "test_client", storage=self.storage, deferred_worker=worker
+        )
+        DecoratorIntrospect(client).register()
+        with mock.patch("copy.deepcopy", side_effect=TypeError):
+            self.assertEqual(dummy_func(1, 2), 3)
+        self.assertEqual(len(self.storage.checkpoints), 1)
+        worker.close()
+
+    def test_unsampled_context_skipped(self):
+        client = IntrospectClient(
+            "http://example.com", "test_client", storage=self.storage, sample_rate=0
+        )
+        DecoratorIntrospect(client).register()
+        client.start_context()
+        try:
+            self.assertEqual(dummy_func(1, 2), 3)
+        finally:
+            client.reset_context()
+        assert not self.storage.checkpoints
+
+    def test_denied_locations_skipped(self):
+        client = IntrospectClient("http://example.com", "test_client", storage=self.storage)
+        DecoratorIntrospect(client, locations=LocationFilter(deny=["*.Dummy.*"])).register()
+        self.assertEqual(Dummy().method(1), 2)
+        self.assertEqual(dummy_func(1, 2), 3)
+        self.assertEqual(
+            [checkpoint["metadata"]["location"] for checkpoint in self.storage.checkpoints],
+            ["i8t.instrument.test_decorator_introspect.dummy_func"],
+        )
+
+    def test_functions_decorated_after_register(self):
+        client = IntrospectClient("http://example.com", "test_client", storage=self.storage)
+        DecoratorIntrospect(client, locations=LocationFilter(allow=["*.late_*"])).register()
+
+        @introspect
+        def late_func():
+            return 1
+
+        @introspect
+        def other_func():
+            return 2
+
+        self.assertEqual((late_func(), other_func()), (1, 2))
+        self.assertEqual(len(self.storage.checkpoints), 1)
+
+    def test_adaptive_sample_rate_recorded(self):
+        sampler = mock.Mock(AdaptiveSampler)
+        sampler.sample.side_effect = [0.25, 0.0]
+        client = IntrospectClient(
+            "http://example.com", "test_client", storage=self.storage, sampler=sampler
+        )
+        DecoratorIntrospect(client).register()
+        self.assertEqual((dummy_func(1, 2), dummy_func(3, 4)), (3, 7))
+        self.assertEqual(len(self.storage.checkpoints), 1)
+        self.assertEqual(self.storage.checkpoints[0]["metadata"]["sample_rate"], 0.25)
+        location = "i8t.instrument.test_decorator_introspect.dummy_func"
+        sampler.sample.assert_called_with(location)
+        sampler.record.assert_called_once_with(location, mock.ANY)
+
     def test_exception_introspected(self):
         # Act & Assert
         with mock.patch("time.time", side_effect=[1000, 2000]):
@@ -154,6 +318,8 @@ class TestDecoratorIntrospect(unittest.TestCase):
                     "start_ts": 1000,
                     "finish_ts": 2000,
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                     "input_hint": "json",
                     "output_hint": "json",
                 },
@@ -173,6 +339,14 @@ def dummy_raise(first, second):
     raise ValueError("Test exception")
 
 
+@introspect
+async def dummy_async(first, second, delay=0):
+    await asyncio.sleep(delay)
+    if second < 0:
+        raise ValueError("Test exception")
+    return first + second
+
+
 class Dummy:
     @introspect
     def method(self, param: int) -> int:
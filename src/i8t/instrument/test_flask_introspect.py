@@ -5,6 +5,7 @@ from unittest.mock import patch
 import flask
 
 from i8t.client import IntrospectClient
+from i8t.deferred import DeferredWorker
 from i8t.inmemory_storage import IntrospectInMemoryStorage
 
 from .flask_introspect import FlaskIntrospect
@@ -40,6 +41,8 @@ class TestFlaskIntrospect(unittest.TestCase):
                     "start_ts": 1,
                     "finish_ts": 5,
                     "context": mock.ANY,
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                 },
                 "input": {
                     "method": "POST",
@@ -88,8 +91,45 @@ class TestFlaskIntrospect(unittest.TestCase):
                         "start_ts": 1,
                         "finish_ts": 5,
                         "context": mock.ANY,
+                        "producer": mock.ANY,
+                        "seq": mock.ANY,
                     },
                     "input": mock.ANY,
                     "output": mock.ANY,
                 }
             )
+
+    def test_sampled_request_keeps_rate(self):
+        self.mock_client.sample.return_value = 0.25
+        with self.app.test_client() as client:
+            client.post("/test")
+        (checkpoint,), _ = self.mock_client.send.call_args
+        self.assertEqual(checkpoint["metadata"]["sample_rate"], 0.25)
+
+    def test_unsampled_request_skipped(self):
+        client = IntrospectClient("api_url", "test_client", storage=self.storage, sample_rate=0)
+        app = flask.Flask(__name__)
+        FlaskIntrospect(client).register(app)
+        app.route("/test")(lambda: "Test Response")
+        with app.test_client() as test_client:
+            test_client.get("/test")
+        assert not self.storage.checkpoints
+
+    def test_deferred_encoding_matches_inline(self):
+        worker = DeferredWorker()
+        client = IntrospectClient("api_url", "test_client", deferred_worker=worker)
+        client.send = mock.Mock()  # type: ignore[method-assign]
+        app = flask.Flask(__name__)
+        FlaskIntrospect(client).register(app)
+        app.route("/test", methods=["POST"])(lambda: "Test Response")
+        with app.test_client() as test_client:
+            with patch("time.time", side_effect=[1, 5, 30, 100]):
+                test_client.post("/test", json={"key": "value"})
+                test_client.post("/test", data="{malformed", content_type="application/json")
+        worker.close()
+        (first,), (second,) = [call.args for call in client.send.call_args_list]
+        self.assertEqual(first["metadata"]["finish_ts"], 5)
+        self.assertEqual(first["input"]["json"], {"key": "value"})
+        self.assertEqual(first["input"]["data"], '{"key": "value"}')
+        self.assertEqual(first["output"]["body"], "Test Response")
+        self.assertIsNone(second["input"]["json"])
@@ -40,6 +40,8 @@ class RequestsIntrospectTestCase(unittest.TestCase):
                     "start_ts": mock.ANY,
                     "finish_ts": mock.ANY,
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                 },
                 "input": {
                     "method": "post",
@@ -64,6 +66,8 @@ class RequestsIntrospectTestCase(unittest.TestCase):
                     "start_ts": mock.ANY,
                     "finish_ts": mock.ANY,
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                 },
                 "input": {
                     "method": "post",
@@ -75,6 +79,17 @@ class RequestsIntrospectTestCase(unittest.TestCase):
             }
         )
 
+    @requests_mock.Mocker()
+    def test_sampled_request_keeps_rate(self, req_mock) -> None:
+        req_mock.get("http://external-api", text="ok")
+        self.introspect_client.sample.return_value = 0.25
+        requests.get("http://external-api", timeout=1)
+        self.introspect_client.sample.return_value = 0.0
+        requests.get("http://external-api", timeout=1)
+        (checkpoint,), _ = self.introspect_client.send.call_args
+        self.assertEqual(checkpoint["metadata"]["sample_rate"], 0.25)
+        self.introspect_client.send.assert_called_once()
+
     @requests_mock.Mocker()
     def test_instrumented_request_sends_checkpoint_for_exception(self, req_mock) -> None:
         req_mock.post("http://external-api/fail", exc=requests.exceptions.ConnectTimeout)
@@ -88,6 +103,8 @@ class RequestsIntrospectTestCase(unittest.TestCase):
                     "start_ts": mock.ANY,
                     "finish_ts": mock.ANY,
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                 },
                 "input": {
                     "method": "post",
@@ -0,0 +1,22 @@
+import fnmatch
+import re
+from typing import Sequence
+
+
+class LocationFilter:
+    """Matches checkpoint locations against allow and deny globs, deny taking precedence.
+
+    Globs are compiled into a single regular expression each.
+    """
+
+    def __init__(self, allow: Sequence[str] = ("*",), deny: Sequence[str] = ()) -> None:
+        self._allow = _compile(allow)
+        self._deny = _compile(deny)
+
+    def __call__(self, location: str) -> bool:
+        return bool(self._allow.match(location)) and not self._deny.match(location)
+
+
+def _compile(globs: Sequence[str]) -> "re.Pattern[str]":
+    # Empty pattern list matches nothing
+    return re.compile("|".join(map(fnmatch.translate, globs)) or "(?!)")
@@ -0,0 +1,222 @@
+"""In-process metrics of i8t itself.
+
+Each thread updates its own counters without locking,
+snapshots merge counters of all threads.
+Counters of finished threads are merged together when new threads start.
+Values owned by other objects (queue depth, drop counters) are pulled from collectors.
+"""
+
+import bisect
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+CAPTURE_SECONDS = "i8t_capture_seconds"
+CHECKPOINTS = "i8t_checkpoints_total"
+SERIALIZED_BYTES = "i8t_serialized_bytes_total"
+ENCODED = "i8t_encoded_total"
+DILL_FALLBACKS = "i8t_dill_fallbacks_total"
+QUEUE_DEPTH = "i8t_queue_depth"
+SEND_SECONDS = "i8t_send_seconds"
+SEND_FAILURES = "i8t_send_failures_total"
+DROPPED = "i8t_dropped_total"
+
+_LATENCY_BUCKETS = (0.00001, 0.0001, 0.001, 0.01, 0.1, 1.0, 10.0)
+
+Collector = Callable[[], Iterable[Tuple[str, str, float]]]
+Hook = Callable[[str, str, float], None]
+
+
+@dataclass
+class MetricInfo:
+    kind: str
+    help: str
+    label: str
+    buckets: Tuple[float, ...] = ()
+
+
+METRICS: Dict[str, MetricInfo] = {
+    CAPTURE_SECONDS: MetricInfo(
+        "histogram", "Time spent capturing a call.", "location", _LATENCY_BUCKETS
+    ),
+    CHECKPOINTS: MetricInfo("counter", "Checkpoints passed to storage.", "location"),
+    SERIALIZED_BYTES: MetricInfo("counter", "Size of encoded input and output.", "hint"),
+    ENCODED: MetricInfo("counter", "Encoded inputs and outputs.", "hint"),
+    DILL_FALLBACKS: MetricInfo("counter", "Values json encoders failed on.", "location"),
+    QUEUE_DEPTH: MetricInfo("gauge", "Items waiting in queue.", "queue"),
+    SEND_SECONDS: MetricInfo(
+        "histogram", "Latency of storage requests.", "storage", _LATENCY_BUCKETS
+    ),
+    SEND_FAILURES: MetricInfo("counter", "Failed storage requests.", "storage"),
+    DROPPED: MetricInfo("counter", "Checkpoints dropped without sending.", "component"),
+}
+
+
+class _ThreadValues:
+    def __init__(self) -> None:
+        self.counters: Dict[Tuple[str, str], float] = {}
+        # Bucket counts including +Inf, followed by sum and count
+        self.histograms: Dict[Tuple[str, str], List[float]] = {}
+
+    def merge(self, other: "_ThreadValues") -> None:
+        for key, value in list(other.counters.items()):
+            self.counters[key] = self.counters.get(key, 0.0) + value
+        for key, histogram in list(other.histograms.items()):
+            merged = self.histograms.setdefault(key, [0.0] * len(histogram))
+            for index, value in enumerate(list(histogram)):
+                merged[index] += value
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._threads: List[Tuple["weakref.ref[threading.Thread]", _ThreadValues]] = []
+        self._finished = _ThreadValues()
+        # Collectors, or weak references to collectors that are bound methods
+        self._collectors: List[Any] = []
+        self._hooks: List[Hook] = []
+
+    def inc(self, name: str, label: str = "", value: float = 1.0) -> None:
+        try:
+            counters = self._local.counters
+        except AttributeError:
+            counters = self._values().counters
+        key = (name, label)
+        counters[key] = counters.get(key, 0.0) + value
+        if self._hooks:
+            self._call_hooks(name, label, value)
+
+    def observe(self, name: str, label: str, value: float) -> None:
+        try:
+            histograms = self._local.histograms
+        except AttributeError:
+            histograms = self._values().histograms
+        key = (name, label)
+        buckets = METRICS[name].buckets
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [0.0] * (len(buckets) + 3)
+        histogram[bisect.bisect_left(buckets, value)] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+        if self._hooks:
+            self._call_hooks(name, label, value)
+
+    def add_hook(self, hook: Hook) -> None:
+        """Calls ``hook(name, label, value)`` on every update, e.g. to forward it to statsd."""
+        self._hooks.append(hook)
+
+    def add_collector(self, collector: Collector) -> None:
+        """Adds source of ``(name, label, value)`` pulled on snapshot.
+
+        Bound methods are referenced weakly, and are dropped with their object.
+        """
+        ref: Any = collector
+        if hasattr(collector, "__self__"):
+            ref = weakref.WeakMethod(collector)  # type: ignore[arg-type]
+        with self._lock:
+            self._collectors.append(ref)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Returns ``{name: {label: value}}``, histogram values being dicts."""
+        total = _ThreadValues()
+        with self._lock:
+            total.merge(self._finished)
+            for _, values in self._threads:
+                total.merge(values)
+        result: Dict[str, Dict[str, Any]] = {}
+        for (name, label), value in total.counters.items():
+            result.setdefault(name, {})[label] = value
+        for (name, label), histogram in total.histograms.items():
+            result.setdefault(name, {})[label] = histogram
+        for name, label, value in self._collect():
+            labels = result.setdefault(name, {})
+            labels[label] = labels.get(label, 0.0) + value
+        for name, labels in result.items():
+            info = METRICS.get(name)
+            if info and info.kind == "histogram":
+                result[name] = {
+                    label: _histogram_dict(info.buckets, histogram)
+                    for label, histogram in labels.items()
+                }
+        return result
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        for name, labels in sorted(self.snapshot().items()):
+            info = METRICS.get(name, MetricInfo("untyped", "", "label"))
+            if info.help:
+                lines.append(f"# HELP {name} {info.help}")
+            lines.append(f"# TYPE {name} {info.kind}")
+            for label, value in sorted(labels.items()):
+                selector = f'{info.label}="{_escape(label)}"'
+                if info.kind != "histogram":
+                    lines.append(f"{name}{{{selector}}} {value}")
+                    continue
+                cumulative = 0.0
+                for bound, count in value["buckets"].items():
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{selector},le="{bound}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{selector}}} {value['sum']}")
+                lines.append(f"{name}_count{{{selector}}} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._finished = _ThreadValues()
+            for _, values in self._threads:
+                # Cleared in place, as threads keep references to the dicts
+                values.counters.clear()
+                values.histograms.clear()
+
+    def _values(self) -> _ThreadValues:
+        values = _ThreadValues()
+        self._local.counters = values.counters
+        self._local.histograms = values.histograms
+        with self._lock:
+            self._merge_finished()
+            self._threads.append((weakref.ref(threading.current_thread()), values))
+        return values
+
+    def _merge_finished(self) -> None:
+        alive = []
+        for thread_ref, values in self._threads:
+            thread = thread_ref()
+            if thread is not None and thread.is_alive():
+                alive.append((thread_ref, values))
+            else:
+                self._finished.merge(values)
+        self._threads = alive
+
+    def _collect(self) -> List[Tuple[str, str, float]]:
+        with self._lock:
+            collectors: List[Optional[Collector]] = [
+                ref() if isinstance(ref, weakref.WeakMethod) else ref for ref in self._collectors
+            ]
+            self._collectors = [
+                ref for ref, collector in zip(self._collectors, collectors) if collector
+            ]
+        return [sample for collector in collectors if collector for sample in collector()]
+
+    def _call_hooks(self, name: str, label: str, value: float) -> None:
+        for hook in self._hooks:
+            hook(name, label, value)
+
+
+def _histogram_dict(buckets: Tuple[float, ...], histogram: List[float]) -> Dict[str, Any]:
+    bounds = [str(bound) for bound in buckets] + ["+Inf"]
+    return {
+        "buckets": dict(zip(bounds, histogram[:-2])),
+        "sum": histogram[-2],
+        "count": histogram[-1],
+    }
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Registry used by default
+REGISTRY = MetricsRegistry()
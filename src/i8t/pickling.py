@@ -0,0 +1,35 @@
+"""dill pickling with custom reducers and protocol 5 out-of-band buffers."""
+
+import copyreg
+import io
+from collections import ChainMap
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import dill  # type: ignore
+
+_REDUCERS: Dict[type, Callable[[Any], Any]] = {}
+
+
+def register_reducer(cls: type, reducer: Callable[[Any], Any]) -> None:
+    """Registers ``copyreg``-style reducer, used instead of pickling ``cls`` with dill.
+
+    Reducer returning ``pickle.PickleBuffer`` in arguments lets blob store
+    write the buffer out-of-band and load it without copying.
+    """
+    _REDUCERS[cls] = reducer
+
+
+def dumps(obj: Any, buffer_callback: Optional[Callable[[Any], Any]] = None) -> bytes:
+    """Pickles with dill, passing out-of-band buffers to ``buffer_callback`` if given."""
+    file = io.BytesIO()
+    # Protocol 5 lets reducers return PickleBuffer, which is serialized in-band without callback.
+    # Default protocol keeps payloads identical to plain dill.
+    protocol = 5 if buffer_callback or _REDUCERS else dill.settings["protocol"]
+    pickler = dill.Pickler(file, protocol=protocol, recurse=True, buffer_callback=buffer_callback)
+    pickler.dispatch_table = ChainMap(_REDUCERS, copyreg.dispatch_table)
+    pickler.dump(obj)
+    return file.getvalue()
+
+
+def loads(data: Any, buffers: Optional[Iterable[Any]] = None) -> Any:
+    return dill.loads(data, buffers=buffers)
@@ -1,77 +1,606 @@
+"""Collects checkpoints from relays and prints them as JSON lines.
+
+Relays that support cursors return ``X-I8t-Cursor`` header with the position after
+the last returned record, and only return records after ``?after=<cursor>``.
+Collector persists the cursor to resume after a restart.
+Relays that don't, return all records, and the collector skips the ones seen before.
+``ETag`` of the response is sent back in ``If-None-Match`` to skip unchanged responses.
+"""
+
+import argparse
+import functools
+import hashlib
 import json
+import os
+import queue
+import re
 import sys
+import tempfile
+import threading
 import time
-from typing import Iterable, Optional, Set
+import urllib.parse
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import requests
 
+from .compression import CODECS, Codec, accept_encoding, decode_json
 from .relay_storage import RelayConverter
+from .session_writers import OutputPolicy, PartitionedWriter, SourceWriter
+
+
+@dataclass
+class ProducerStats:
+    received: int = 0
+    duplicates: int = 0
+    # Sequence numbers not received between the lowest and the highest received
+    missing: int = 0
+
+
+class _SequenceWindow:
+    """Remembers sequence numbers of a producer within ``size`` from the highest one.
+
+    Older sequence numbers are taken for duplicates.
+    """
+
+    def __init__(self, size: int) -> None:
+        self._size = size
+        self._seen: Set[int] = set()
+        self._lowest = 0
+        self._highest = 0
+        self.stats = ProducerStats()
+        self.seen_at = time.monotonic()
+
+    def add(self, seq: int) -> bool:
+        """Returns True if the sequence number is new."""
+        if seq <= self._highest - self._size or seq in self._seen:
+            self.stats.duplicates += 1
+            return False
+        self._seen.add(seq)
+        if not self.stats.received or seq < self._lowest:
+            self._lowest = seq
+        if seq > self._highest:
+            self._highest = seq
+            if len(self._seen) > 2 * self._size:
+                self._seen = {old for old in self._seen if old > seq - self._size}
+        self.stats.received += 1
+        self.stats.missing = self._highest - self._lowest + 1 - self.stats.received
+        return True
 
 
 class CheckpointCollector:
-    def __init__(self) -> None:
-        self._all_records: Set[str] = set()
+    """Skips checkpoints seen before, and counts missing ones per producer.
+
+    Checkpoints are identified by ``producer`` and ``seq`` of their metadata,
+    keeping a bounded window of sequence numbers per producer.
+    Producers idle for ``max_idle_sec``, e.g. recycled worker processes, are forgotten.
+    Digests of lines are kept for checkpoints of older clients, which lack them.
+    """
+
+    DEFAULT_WINDOW = 1024
+    DEFAULT_MAX_IDLE_SEC = 3600.0
+
+    def __init__(
+        self, window: int = DEFAULT_WINDOW, max_idle_sec: float = DEFAULT_MAX_IDLE_SEC
+    ) -> None:
+        self._window = window
+        self._max_idle_sec = max_idle_sec
+        # Least recently seen producers first
+        self._producers: "OrderedDict[str, _SequenceWindow]" = OrderedDict()
+        self._digests: Set[bytes] = set()
+        # Finish time of the last new checkpoint, to estimate collection lag
+        self.last_finish_ts: Optional[float] = None
+
+    @property
+    def stats(self) -> Dict[str, ProducerStats]:
+        return {producer: window.stats for producer, window in self._producers.items()}
 
     def filter_new(self, latest: Iterable[str]) -> Iterable[str]:
         """Records latest lines and returns only new ones."""
         for line in latest:
-            if line not in self._all_records:
-                self._all_records.add(line)
+            if self._is_new(json.loads(line).get("metadata") or {}, line):
                 yield line
 
+    def filter_new_records(self, latest: Iterable[dict]) -> Iterable[str]:
+        """Records latest checkpoints and returns lines of new ones, serializing only them."""
+        for record in latest:
+            metadata = record.get("metadata") or {}
+            # Checkpoints without sequence numbers are identified by their lines
+            line = None if _has_seq(metadata) else json.dumps(record)
+            if self._is_new(metadata, line):
+                yield line or json.dumps(record)
+
+    def _is_new(self, metadata: dict, line: Optional[str]) -> bool:
+        if self._is_new_seq(metadata, line):
+            self.last_finish_ts = metadata.get("finish_ts", self.last_finish_ts)
+            return True
+        return False
+
+    def _is_new_seq(self, metadata: dict, line: Optional[str]) -> bool:
+        producer, seq = metadata.get("producer"), metadata.get("seq")
+        if producer is None or seq is None:
+            assert line is not None
+            digest = hashlib.blake2b(line.encode("utf-8"), digest_size=16).digest()
+            if digest in self._digests:
+                return False
+            self._digests.add(digest)
+            return True
+        now = time.monotonic()
+        while self._producers:
+            oldest = next(iter(self._producers.values()))
+            if now - oldest.seen_at < self._max_idle_sec:
+                break
+            self._producers.popitem(last=False)
+        window = self._producers.get(producer)
+        if window is None:
+            window = self._producers[producer] = _SequenceWindow(self._window)
+        else:
+            self._producers.move_to_end(producer)
+            window.seen_at = now
+        return window.add(seq)
+
+
+def _has_seq(metadata: dict) -> bool:
+    return metadata.get("producer") is not None and metadata.get("seq") is not None
+
+
+CURSOR_HEADER = "X-I8t-Cursor"
+
+
+class CursorFile:
+    """Keeps relay cursor in a file, replacing it atomically."""
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+
+    def load(self) -> Optional[str]:
+        try:
+            with open(self._path, encoding="utf-8") as fobj:
+                return fobj.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def save(self, cursor: str) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self._path)))
+        with os.fdopen(fd, "wt", encoding="utf-8") as fobj:
+            fobj.write(cursor)
+        os.replace(tmp_path, self._path)
+
 
 class CheckpointFetcher:
-    def __init__(self, api_url: str, session: requests.Session) -> None:
+    def __init__(
+        self,
+        api_url: str,
+        session: requests.Session,
+        codec: Optional[Codec] = None,
+        cursor_file: Optional[CursorFile] = None,
+    ) -> None:
         self._api_url = api_url
         self._session = session
+        self._codec = codec
+        # Collectors replace it to save the cursor once the records before it are written
+        self.save_cursor: Optional[Callable[[str], None]] = (
+            cursor_file.save if cursor_file else None
+        )
         self._relay_converter = RelayConverter()
+        self.cursor = cursor_file.load() if cursor_file else None
+        self._etag: Optional[str] = None
 
     def fetch(self) -> Iterable[str]:
-        response = self._session.get(self._api_url, timeout=1)
-        for record in response.json():
-            yield json.dumps(self._relay_converter.from_relay(record))
+        """Yields lines of records after the cursor, and advances it once all are consumed."""
+        for record in self.fetch_records():
+            yield json.dumps(record)
+
+    def fetch_records(self) -> Iterable[dict]:
+        """Yields records after the cursor, and advances it once all are consumed."""
+        response = self._session.get(
+            self._api_url,
+            params=self._params(),
+            headers=self._headers(),
+            timeout=1,
+        )
+        if response.status_code == 304:
+            return
+        for record in decode_json(response, self._codec):
+            yield self._relay_converter.from_relay(record)
+        self._etag = response.headers.get("ETag")
+        cursor = response.headers.get(CURSOR_HEADER)
+        if cursor and cursor != self.cursor:
+            # ETag belongs to the previous URL
+            self._etag = None
+            self.cursor = cursor
+            if self.save_cursor:
+                self.save_cursor(cursor)
+
+    def _params(self) -> Dict[str, Any]:
+        return {"after": self.cursor} if self.cursor else {}
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Accept-Encoding": accept_encoding()}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        return headers
+
+
+class CheckpointStreamer(CheckpointFetcher):
+    """Reads checkpoints from relay's server-sent events as soon as they are stored.
+
+    Event ``id`` is the cursor after the event, and is sent back in ``Last-Event-ID``
+    when reconnecting. Relay should use chunked encoding, as events are read chunk by chunk.
+    Relay may send comments to keep idle connection alive.
+    The cursor is saved at most once per ``SAVE_EVERY_SEC`` and when the stream ends.
+    """
+
+    READ_TIMEOUT_SEC = 30
+    SAVE_EVERY_SEC = 1
+
+    def fetch_records(self) -> Iterable[dict]:
+        """Yields records until relay closes the stream."""
+        headers = {"Accept": "text/event-stream"}
+        if self.cursor:
+            headers["Last-Event-ID"] = self.cursor
+        with self._session.get(
+            self._api_url,
+            params=self._params(),
+            headers=headers,
+            stream=True,
+            timeout=(1, self.READ_TIMEOUT_SEC),
+        ) as response:
+            response.raise_for_status()
+            saved_at = time.monotonic()
+            try:
+                # Events are always UTF-8, whatever the charset of the response
+                lines = (line.decode("utf-8") for line in response.iter_lines(chunk_size=None))
+                for cursor, data in iter_events(lines):
+                    yield self._relay_converter.from_relay(json.loads(data))
+                    self.cursor = cursor or self.cursor
+                    if self.save_cursor and time.monotonic() - saved_at >= self.SAVE_EVERY_SEC:
+                        self._save_cursor()
+                        saved_at = time.monotonic()
+            finally:
+                self._save_cursor()
+
+    def _save_cursor(self) -> None:
+        if self.save_cursor and self.cursor:
+            self.save_cursor(self.cursor)
+
+
+def iter_events(lines: Iterable[str]) -> Iterator[Tuple[Optional[str], str]]:
+    """Parses server-sent events into ``(id, data)``, skipping comments and other fields."""
+    event_id: Optional[str] = None
+    data: List[str] = []
+    for line in lines:
+        if not line:
+            if data:
+                yield event_id, "\n".join(data)
+            event_id, data = None, []
+            continue
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "data":
+            data.append(value)
+        elif field == "id":
+            event_id = value
 
 
 class CheckpointPoller:
     DEFAULT_DELAY_SEC = 1
+    PROGRESS_EVERY_SEC = 0.5
 
     def __init__(
         self,
         checkpoint_fetcher: CheckpointFetcher,
         checkpoint_collector: CheckpointCollector,
         delay_sec: float = DEFAULT_DELAY_SEC,
+        name: str = "",
     ) -> None:
         self._checkpoint_fetcher = checkpoint_fetcher
-        self._checkpoint_collector = checkpoint_collector
+        self.checkpoint_collector = checkpoint_collector
         self._delay_sec = delay_sec
+        self.name = name
+        self._stopped = threading.Event()
 
     def poll_once(self) -> Iterable[str]:
-        yield from self._checkpoint_collector.filter_new(self._checkpoint_fetcher.fetch())
+        yield from self.checkpoint_collector.filter_new_records(
+            self._checkpoint_fetcher.fetch_records()
+        )
+
+    def defer_cursor(self, save: Callable[[str], None]) -> Optional[Callable[[str], None]]:
+        """Passes cursors to ``save`` instead of saving them, and returns the saving function.
+
+        Fetchers that don't save cursors are left as they are.
+        """
+        saved = self._checkpoint_fetcher.save_cursor
+        if saved:
+            self._checkpoint_fetcher.save_cursor = save
+        return saved
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def stop(self) -> None:
+        """Makes ``iter_lines`` return after the current poll."""
+        self._stopped.set()
 
     def iter_lines(self) -> Iterable[str]:
-        while True:
+        while not self._stopped.is_set():
             try:
                 yield from self.poll_once()
                 time.sleep(self._delay_sec)
             except KeyboardInterrupt:
                 break
             except Exception as exc:  # pylint: disable=broad-except
-                print(f"WARNING: {exc}", file=sys.stderr)
+                source = f"{self.name}: " if self.name else ""
+                print(f"WARNING: {source}{exc}", file=sys.stderr)
+                # Reconnect after a delay
+                time.sleep(self._delay_sec)
 
     def print_forever(self) -> None:
-        for i, line in enumerate(self.iter_lines()):
-            print(f"\rCollected {i+1} checkpoints. Press Ctrl+C to stop.", file=sys.stderr, end="")
+        collected = 0
+        progress_at = 0.0
+        for collected, line in enumerate(self.iter_lines(), 1):
             print(line)
+            if time.monotonic() - progress_at >= self.PROGRESS_EVERY_SEC:
+                self._print_progress(collected)
+                progress_at = time.monotonic()
+        if collected:
+            self._print_progress(collected)
+        self.print_stats()
+
+    @staticmethod
+    def _print_progress(collected: int) -> None:
+        print(
+            f"\rCollected {collected} checkpoints. Press Ctrl+C to stop.", file=sys.stderr, end=""
+        )
+
+    def print_stats(self) -> None:
+        for producer, stats in self.checkpoint_collector.stats.items():
+            print(
+                f"\nProducer {producer}: {stats.received} received, "
+                f"{stats.duplicates} duplicates, {stats.missing} missing.",
+                file=sys.stderr,
+                end="",
+            )
+
+
+@dataclass
+class SourceStats:
+    collected: int = 0
+    # Collected as of the previous report, to compute rate
+    reported: int = 0
+
+
+class MultiSourceCollector:
+    """Collects checkpoints from many relays concurrently.
+
+    Every source is fetched and deduplicated by its own thread,
+    which passes new lines through a bounded queue to the writer running in the caller thread.
+    Cursors are passed through the queue as well, and saved once the lines before them
+    are flushed. Lines queued before the collector stops are written.
+    Throughput, lag and missing checkpoints of each source are reported to stderr.
+    """
+
+    QUEUE_SIZE = 10000
+    REPORT_EVERY_SEC = 5
+
+    def __init__(self, pollers: List[CheckpointPoller], writer: SourceWriter) -> None:
+        self._pollers = pollers
+        self._writer = writer
+        # Items are (source, line, None) or (source, None, cursor)
+        self._queue: "queue.Queue[Tuple[str, Optional[str], Optional[str]]]" = queue.Queue(
+            self.QUEUE_SIZE
+        )
+        self._save_cursor: Dict[str, Callable[[str], None]] = {}
+        # Cursors of written lines, to save once they are flushed
+        self._cursors: Dict[str, str] = {}
+        self.stats = {poller.name: SourceStats() for poller in pollers}
+
+    def run(self) -> None:
+        for poller in self._pollers:
+            save = poller.defer_cursor(functools.partial(self._put_cursor, poller))
+            if save:
+                self._save_cursor[poller.name] = save
+        threads = [
+            threading.Thread(target=self._fetch, args=(poller,), daemon=True)
+            for poller in self._pollers
+        ]
+        for thread in threads:
+            thread.start()
+        reported_at = time.monotonic()
+        try:
+            while True:
+                try:
+                    self._write(*self._queue.get(timeout=self.REPORT_EVERY_SEC))
+                except queue.Empty:
+                    pass
+                now = time.monotonic()
+                if now - reported_at >= self.REPORT_EVERY_SEC:
+                    self._writer.flush()
+                    self._save_cursors()
+                    self.report(now - reported_at)
+                    reported_at = now
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for poller in self._pollers:
+                poller.stop()
+            try:
+                self._drain(threads)
+            finally:
+                self._writer.close()
+        self._save_cursors()
+        self.report(time.monotonic() - reported_at)
+        for poller in self._pollers:
+            poller.print_stats()
+
+    def report(self, elapsed_sec: float) -> None:
+        now = time.time()
+        for poller in self._pollers:
+            stats = self.stats[poller.name]
+            collector = poller.checkpoint_collector
+            rate = (stats.collected - stats.reported) / elapsed_sec
+            lag = f"{now - collector.last_finish_ts:.1f}s" if collector.last_finish_ts else "-"
+            missing = sum(producer.missing for producer in collector.stats.values())
+            print(
+                f"{poller.name}: {stats.collected} collected, {rate:.1f}/s, "
+                f"lag {lag}, {missing} missing",
+                file=sys.stderr,
+            )
+            stats.reported = stats.collected
+
+    def _drain(self, threads: List[threading.Thread]) -> None:
+        """Writes queued lines until fetching threads finish.
+
+        Streams may stay blocked in reading, and are abandoned after ``REPORT_EVERY_SEC``.
+        """
+        deadline = time.monotonic() + self.REPORT_EVERY_SEC
+        while True:
+            fetching = time.monotonic() < deadline and any(t.is_alive() for t in threads)
+            try:
+                self._write(*self._queue.get(block=fetching, timeout=0.01))
+            except queue.Empty:
+                if not fetching:
+                    return
+
+    def _fetch(self, poller: CheckpointPoller) -> None:
+        for line in poller.iter_lines():
+            if not self._put(poller, (poller.name, line, None)):
+                return
+
+    def _put_cursor(self, poller: CheckpointPoller, cursor: str) -> None:
+        self._put(poller, (poller.name, None, cursor))
+
+    def _put(
+        self, poller: CheckpointPoller, item: Tuple[str, Optional[str], Optional[str]]
+    ) -> bool:
+        while True:
+            try:
+                self._queue.put(item, timeout=self.REPORT_EVERY_SEC)
+                return True
+            except queue.Full:
+                # Writer has stopped
+                if poller.stopped:
+                    return False
+
+    def _write(self, name: str, line: Optional[str], cursor: Optional[str]) -> None:
+        if cursor is not None:
+            self._cursors[name] = cursor
+        if line is not None:
+            self.stats[name].collected += 1
+            self._writer.write(name, line)
+
+    def _save_cursors(self) -> None:
+        for name, cursor in self._cursors.items():
+            self._save_cursor[name](cursor)
+        self._cursors.clear()
+
+
+def read_sources(path: str) -> List[Tuple[str, str]]:
+    """Reads ``[name] url`` lines, skipping blank lines and comments."""
+    sources = []
+    with open(path, encoding="utf-8") as fobj:
+        for line in fobj:
+            fields = line.split("#", 1)[0].split()
+            if fields:
+                sources.append((fields[0], fields[1]) if len(fields) > 1 else ("", fields[0]))
+    return sources
+
+
+def source_names(sources: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Names unnamed sources by the last segment of URL path, e.g. tenant id."""
+    names: Set[str] = set()
+    named = []
+    for name, url in sources:
+        if not name:
+            parts = urllib.parse.urlsplit(url)
+            name = re.sub(
+                r"[^\w.-]+", "_", parts.path.rstrip("/").rpartition("/")[2] or parts.netloc
+            )
+        unique, index = name, 1
+        while unique in names:
+            index += 1
+            unique = f"{name}-{index}"
+        names.add(unique)
+        named.append((unique, url))
+    return named
 
 
 def main(session: Optional[requests.Session] = None) -> None:
-    CheckpointPoller(
-        checkpoint_fetcher=CheckpointFetcher(
-            api_url=sys.argv[1],
+    parser = argparse.ArgumentParser(prog="i8t", description=__doc__.splitlines()[0])
+    parser.add_argument("api_urls", nargs="*", metavar="api_url")
+    parser.add_argument("--sources", help="File with '[name] url' lines to collect from")
+    parser.add_argument("--cursor-file", help="Persist relay cursor to resume from it")
+    parser.add_argument("--cursor-dir", help="Persist cursor of each source to <name>.cursor")
+    parser.add_argument("--output-dir", help="Write checkpoints to files in the directory")
+    parser.add_argument(
+        "--partition",
+        default=OutputPolicy.partition,
+        help="Output subdirectory template with {source}, {name}, {location} and {date} fields",
+    )
+    parser.add_argument("--rotate-mb", type=float, default=0, help="Rotate files of this size")
+    parser.add_argument("--rotate-min", type=float, default=0, help="Rotate files of this age")
+    parser.add_argument("--compress", choices=sorted(CODECS), help="Compress output files")
+    parser.add_argument(
+        "--max-open-files",
+        type=int,
+        default=OutputPolicy.max_open_files,
+        help="Seal files of least recently written partitions above this number",
+    )
+    parser.add_argument(
+        "--stream", action="store_true", help="Read server-sent events instead of polling"
+    )
+    args = parser.parse_args()
+    sources = source_names(
+        [("", url) for url in args.api_urls] + (read_sources(args.sources) if args.sources else [])
+    )
+    if not sources:
+        parser.error("no relay URLs given")
+    if args.cursor_file and len(sources) > 1:
+        parser.error("use --cursor-dir with many sources")
+    try:
+        writer = _make_writer(args)
+    except ValueError as exc:
+        parser.error(str(exc))
+    pollers = [_make_poller(name, url, args, session) for name, url in sources]
+    if len(pollers) == 1 and not args.output_dir:
+        pollers[0].print_forever()
+        return
+    MultiSourceCollector(pollers, writer).run()
+
+
+def _make_writer(args: argparse.Namespace) -> SourceWriter:
+    if not args.output_dir:
+        return SourceWriter()
+    policy = OutputPolicy(
+        partition=args.partition,
+        rotate_bytes=int(args.rotate_mb * 1024 * 1024),
+        rotate_sec=args.rotate_min * 60,
+        max_open_files=args.max_open_files,
+        codec=CODECS[args.compress]() if args.compress else None,
+    )
+    return PartitionedWriter(args.output_dir, policy)
+
+
+def _make_poller(
+    name: str, url: str, args: argparse.Namespace, session: Optional[requests.Session]
+) -> CheckpointPoller:
+    cursor_path = args.cursor_file
+    if args.cursor_dir:
+        os.makedirs(args.cursor_dir, exist_ok=True)
+        cursor_path = os.path.join(args.cursor_dir, f"{name}.cursor")
+    fetcher_class = CheckpointStreamer if args.stream else CheckpointFetcher
+    return CheckpointPoller(
+        checkpoint_fetcher=fetcher_class(
+            api_url=url,
+            # Sessions are not shared between threads
             session=session or requests.Session(),
+            cursor_file=CursorFile(cursor_path) if cursor_path else None,
         ),
         checkpoint_collector=CheckpointCollector(),
-    ).print_forever()
+        name=name,
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,478 @@
+"""Self-hosted relay server, as a WSGI app.
+
+Checkpoints of each tenant are appended to segment files, named by the sequence number
+of their first record, and indexed in memory by location, context and start time.
+Indexes are rebuilt from segments on start.
+
+Tenant is the last segment of the request path:
+
+* ``POST /<tenant>`` stores a checkpoint or a list of them, optionally compressed.
+* ``GET /<tenant>?after=<cursor>`` returns up to ``limit`` records after the cursor,
+  optionally filtered by ``location``, ``context``, and start time ``since`` and ``until``.
+  The cursor after the returned records is sent in ``X-I8t-Cursor`` header.
+  With ``Accept: text/event-stream``, records are streamed as server-sent events.
+
+Usage::
+
+    i8t serve ./relay-data --port 8080
+    gunicorn --threads 8 'i8t.relay_server:make_app("./relay-data")'
+"""
+
+import argparse
+import bisect
+import glob
+import json
+import logging
+import os
+import re
+import socketserver
+import threading
+import urllib.parse
+from array import array
+from dataclasses import dataclass
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from wsgiref import simple_server
+
+from . import encoders
+from .compression import CODECS, ZstdCodec, zstandard
+from .relay_consumer import CURSOR_HEADER
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl"
+_TENANT = re.compile(r"^[\w.-]+$")
+
+StartResponse = Callable[..., Any]
+
+
+@dataclass
+class RelayPolicy:
+    segment_bytes: int = 64 * 1024 * 1024
+    # Records returned by a single request
+    max_limit: int = 10000
+    # Idle event streams are kept alive with comments sent this often
+    keepalive_sec: float = 15.0
+    # Responses from this size are compressed, if client accepts it
+    compress_bytes: int = 1024
+    fsync: bool = False
+
+
+@dataclass
+class Query:
+    after: int = 0
+    limit: int = 1000
+    location: str = ""
+    context: str = ""
+    since: Optional[float] = None
+    until: Optional[float] = None
+
+    @classmethod
+    def parse(cls, query_string: str) -> "Query":
+        """Raises ``ValueError`` for malformed parameters."""
+        params = {key: values[-1] for key, values in urllib.parse.parse_qs(query_string).items()}
+        since, until = params.get("since"), params.get("until")
+        after, limit = int(params.get("after", 0)), int(params.get("limit", cls.limit))
+        if after < 0 or limit < 1:
+            raise ValueError("Expected non-negative cursor and positive limit")
+        return cls(
+            after=after,
+            limit=limit,
+            location=params.get("location", ""),
+            context=params.get("context", ""),
+            since=None if since is None else float(since),
+            until=None if until is None else float(until),
+        )
+
+
+class _Index:
+    """Sequence numbers of records by location, context and start time."""
+
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self._postings: Dict[Tuple[str, int], "array[int]"] = {}
+        # Location and context id of every record
+        self._fields: Dict[str, "array[int]"] = {"location": array("L"), "context": array("L")}
+        self.start_ts = array("d")
+        # Sorted start times and sequence numbers of their records
+        self._times: Tuple[List[float], List[int]] = ([], [])
+
+    def add(self, seq: int, metadata: dict) -> None:
+        for field in ("location", "context"):
+            value = str(metadata.get(field) or "")
+            value_id = self._ids.setdefault(value, len(self._ids))
+            self._fields[field].append(value_id)
+            if value:
+                self._postings.setdefault((field, value_id), array("Q")).append(seq)
+        start_ts = float(metadata.get("start_ts") or 0)
+        self.start_ts.append(start_ts)
+        keys, seqs = self._times
+        # Records mostly arrive in order, so insertion is at the end
+        position = bisect.bisect_right(keys, start_ts)
+        keys.insert(position, start_ts)
+        seqs.insert(position, seq)
+
+    def candidates(self, query: Query, total: int) -> Iterable[int]:
+        """Returns ascending sequence numbers of records that may match the query."""
+        for field in ("context", "location"):
+            value = getattr(query, field)
+            if value:
+                postings = self._postings.get((field, self._ids.get(value, -1)), array("Q"))
+                return postings[bisect.bisect_left(postings, query.after) :]
+        if query.since is not None or query.until is not None:
+            keys, seqs = self._times
+            start = 0 if query.since is None else bisect.bisect_left(keys, query.since)
+            end = len(keys) if query.until is None else bisect.bisect_left(keys, query.until)
+            return sorted(seq for seq in seqs[start:end] if seq >= query.after)
+        return range(query.after, total)
+
+    def matches(self, seq: int, query: Query) -> bool:
+        for field in ("location", "context"):
+            value = getattr(query, field)
+            if value and self._fields[field][seq] != self._ids.get(value):
+                return False
+        start_ts = self.start_ts[seq]
+        return (query.since is None or start_ts >= query.since) and (
+            query.until is None or start_ts < query.until
+        )
+
+
+class TenantLog:
+    """Append-only log of checkpoints of a tenant."""
+
+    def __init__(self, directory: str, policy: RelayPolicy) -> None:
+        self._directory = directory
+        self._policy = policy
+        # Notified when records are appended
+        self.changed = threading.Condition()
+        # First sequence number of each segment
+        self._segments: List[int] = []
+        # Offset after each record in its segment
+        self._ends = array("Q")
+        self._index = _Index()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+        self._active: Optional[BinaryIO] = None
+
+    @property
+    def total(self) -> int:
+        return len(self._ends)
+
+    def append(self, records: List[dict]) -> int:
+        """Stores records and returns the cursor after them."""
+        lines = [encoders.dumps(record).encode("utf-8") + b"\n" for record in records]
+        with self.changed:
+            for record, line in zip(records, lines):
+                active = self._writable()
+                active.write(line)
+                self._ends.append(active.tell())
+                self._index.add(len(self._ends) - 1, record.get("metadata") or {})
+            if self._active:
+                self._active.flush()
+                if self._policy.fsync:
+                    os.fsync(self._active.fileno())
+            self.changed.notify_all()
+            return self.total
+
+    def read(self, query: Query, limit: int) -> Tuple[List[Tuple[int, bytes]], int]:
+        """Returns ``(seq, line)`` of matching records, and the cursor after them."""
+        with self.changed:
+            # Records are flushed before the lock is released
+            total = self.total
+            candidates = self._index.candidates(query, total)
+        seqs: List[int] = []
+        for seq in candidates:
+            if self._index.matches(seq, query):
+                seqs.append(seq)
+                if len(seqs) >= limit:
+                    return self._read_lines(seqs), seq + 1
+        return self._read_lines(seqs), max(total, query.after)
+
+    def wait(self, after: int, timeout_sec: float) -> bool:
+        """Waits for records after the cursor, returning False on timeout."""
+        with self.changed:
+            return self.changed.wait_for(lambda: self.total > after, timeout_sec)
+
+    def close(self) -> None:
+        with self.changed:
+            if self._active:
+                self._active.close()
+                self._active = None
+
+    def _writable(self) -> BinaryIO:
+        if self._active and self._active.tell() >= self._policy.segment_bytes:
+            self._active.close()
+            self._active = None
+        if self._active is None:
+            if not self._segments or self._segment_size(-1) >= self._policy.segment_bytes:
+                self._segments.append(self.total)
+            # pylint: disable-next=consider-using-with
+            self._active = open(self._path(self._segments[-1]), "ab")
+        return self._active
+
+    def _segment_size(self, position: int) -> int:
+        return os.path.getsize(self._path(self._segments[position]))
+
+    def _read_lines(self, seqs: List[int]) -> List[Tuple[int, bytes]]:
+        lines = []
+        fobj: Optional[BinaryIO] = None
+        segment = -1
+        try:
+            for seq in seqs:
+                position = bisect.bisect_right(self._segments, seq) - 1
+                if position != segment:
+                    if fobj:
+                        fobj.close()
+                    segment = position
+                    # pylint: disable-next=consider-using-with
+                    fobj = open(self._path(self._segments[segment]), "rb")
+                assert fobj
+                start = 0 if seq == self._segments[segment] else self._ends[seq - 1]
+                fobj.seek(start)
+                lines.append((seq, fobj.read(self._ends[seq] - start).rstrip(b"\n")))
+        finally:
+            if fobj:
+                fobj.close()
+        return lines
+
+    def _load(self) -> None:
+        paths = sorted(glob.glob(os.path.join(self._directory, "*" + SEGMENT_SUFFIX)))
+        for path in paths:
+            self._segments.append(self.total)
+            with open(path, "rb+") as fobj:
+                offset = 0
+                for line in fobj:
+                    if not line.endswith(b"\n"):
+                        # Torn write
+                        logger.warning("Truncating incomplete record in %s", path)
+                        fobj.truncate(offset)
+                        break
+                    offset += len(line)
+                    self._ends.append(offset)
+                    self._index.add(self.total - 1, encoders.loads(line).get("metadata") or {})
+
+    def _path(self, first_seq: int) -> str:
+        return os.path.join(self._directory, f"{first_seq:012d}{SEGMENT_SUFFIX}")
+
+
+class RelayStore:
+    """Logs of all tenants in a directory."""
+
+    def __init__(self, directory: str, policy: Optional[RelayPolicy] = None) -> None:
+        self._directory = directory
+        self.policy = policy or RelayPolicy()
+        self._tenants: Dict[str, TenantLog] = {}
+        self._lock = threading.Lock()
+
+    def tenant(self, name: str) -> TenantLog:
+        """Raises ``KeyError`` for names unsafe as directory names."""
+        log = self._tenants.get(name)
+        if log is None:
+            path = self._path(name)
+            with self._lock:
+                log = self._tenants.get(name)
+                if log is None:
+                    log = TenantLog(path, self.policy)
+                    self._tenants[name] = log
+        return log
+
+    def find(self, name: str) -> Optional[TenantLog]:
+        """Returns the log of a tenant if it has stored checkpoints, without creating it."""
+        if name not in self._tenants and not os.path.isdir(self._path(name)):
+            return None
+        return self.tenant(name)
+
+    def _path(self, name: str) -> str:
+        if not _TENANT.match(name) or name.startswith("."):
+            raise KeyError(name)
+        return os.path.join(self._directory, name)
+
+    def close(self) -> None:
+        with self._lock:
+            for log in self._tenants.values():
+                log.close()
+
+
+class RelayApp:
+    """WSGI app serving ``RelayStore``."""
+
+    def __init__(self, store: RelayStore) -> None:
+        self.store = store
+
+    def __call__(self, environ: dict, start_response: StartResponse) -> Iterable[bytes]:
+        method = environ["REQUEST_METHOD"]
+        name = environ.get("PATH_INFO", "").rstrip("/").rpartition("/")[2]
+        try:
+            # Tenants are created by their first checkpoint
+            log = self.store.tenant(name) if method == "POST" else self.store.find(name)
+        except KeyError:
+            return _respond(start_response, "404 Not Found", b'{"error": "unknown tenant"}')
+        try:
+            if method == "POST":
+                assert log is not None
+                return self._post(log, environ, start_response)
+            if method == "GET":
+                return self._get(log, environ, start_response)
+        except ValueError as exc:
+            body = json.dumps({"error": str(exc)}).encode("utf-8")
+            return _respond(start_response, "400 Bad Request", body)
+        return _respond(start_response, "405 Method Not Allowed", b"{}")
+
+    @staticmethod
+    def _post(log: TenantLog, environ: dict, start_response: StartResponse) -> Iterable[bytes]:
+        body = environ["wsgi.input"].read(int(environ.get("CONTENT_LENGTH") or 0))
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "")
+        if encoding:
+            if encoding not in CODECS:
+                raise ValueError(f"Unsupported encoding {encoding}")
+            body = CODECS[encoding]().decompress(body)
+        payload = encoders.loads(body)
+        records = payload if isinstance(payload, list) else [payload]
+        if not all(isinstance(record, dict) for record in records):
+            raise ValueError("Expected checkpoint or list of checkpoints")
+        cursor = log.append(records)
+        return _respond(start_response, "200 OK", json.dumps({"cursor": str(cursor)}).encode())
+
+    def _get(
+        self, log: Optional[TenantLog], environ: dict, start_response: StartResponse
+    ) -> Iterable[bytes]:
+        """Returns no records of unknown tenants."""
+        query = Query.parse(environ.get("QUERY_STRING", ""))
+        limit = min(query.limit, self.store.policy.max_limit)
+        if environ.get("HTTP_ACCEPT") == "text/event-stream":
+            query.after = int(environ.get("HTTP_LAST_EVENT_ID") or query.after)
+            start_response("200 OK", [("Content-Type", "text/event-stream; charset=utf-8")])
+            # Client reconnects to the stream of an unknown tenant later
+            return self._stream(log, query, limit) if log else [b": connected\n\n"]
+        if log is None:
+            return _respond(start_response, "200 OK", b"[]", [(CURSOR_HEADER, str(query.after))])
+        etag = f'"{query.after}-{log.total}"'
+        if environ.get("HTTP_IF_NONE_MATCH") == etag:
+            return _respond(start_response, "304 Not Modified", b"", [("ETag", etag)])
+        records, cursor = log.read(query, limit)
+        body = b"[" + b",".join(line for _, line in records) + b"]"
+        headers = [(CURSOR_HEADER, str(cursor)), ("ETag", etag)]
+        if len(body) >= self.store.policy.compress_bytes:
+            body, encoding = _compress(body, environ.get("HTTP_ACCEPT_ENCODING", ""))
+            if encoding:
+                headers.append(("Content-Encoding", encoding))
+        return _respond(start_response, "200 OK", body, headers)
+
+    def _stream(self, log: TenantLog, query: Query, limit: int) -> Iterator[bytes]:
+        yield b": connected\n\n"
+        while True:
+            records, cursor = log.read(query, limit)
+            if records:
+                yield b"".join(b"id: %d\ndata: %s\n\n" % (seq + 1, line) for seq, line in records)
+            query.after = cursor
+            if not log.wait(cursor, self.store.policy.keepalive_sec):
+                yield b": keepalive\n\n"
+
+
+def _respond(
+    start_response: StartResponse,
+    status: str,
+    body: bytes,
+    headers: Optional[List[Tuple[str, str]]] = None,
+) -> List[bytes]:
+    headers = [("Content-Type", "application/json")] + (headers or [])
+    start_response(status, headers + [("Content-Length", str(len(body)))])
+    return [body]
+
+
+def _compress(body: bytes, accept_encoding: str) -> Tuple[bytes, str]:
+    accepted = {encoding.split(";")[0].strip() for encoding in accept_encoding.split(",")}
+    for name in ("zstd", "gzip"):
+        if name in accepted and (name != ZstdCodec.name or zstandard is not None):
+            return CODECS[name]().compress(body), name
+    return body, ""
+
+
+def make_app(directory: str, policy: Optional[RelayPolicy] = None) -> RelayApp:
+    return RelayApp(RelayStore(directory, policy))
+
+
+class _ChunkedHandler(simple_server.ServerHandler):
+    """Sends responses of unknown length with chunked encoding, e.g. event streams."""
+
+    http_version = "1.1"
+    _chunked = False
+
+    def start_response(self, status, headers, exc_info=None):
+        write = super().start_response(status, headers, exc_info)
+        # Connections are not reused
+        self.headers["Connection"] = "close"
+        if "Content-Length" not in self.headers:
+            self._chunked = True
+            self.headers["Transfer-Encoding"] = "chunked"
+        return write
+
+    def write(self, data: bytes) -> None:
+        if self._chunked and data:
+            data = b"%x\r\n%s\r\n" % (len(data), data)
+        super().write(data)
+
+    def finish_content(self) -> None:
+        super().finish_content()
+        if self._chunked:
+            self._write(b"0\r\n\r\n")
+            self._flush()
+
+
+class _RequestHandler(simple_server.WSGIRequestHandler):
+    def handle(self) -> None:
+        """Same as in base class, but with chunked encoding handler."""
+        self.raw_requestline = self.rfile.readline(65537)
+        if len(self.raw_requestline) > 65536:
+            self.requestline = self.request_version = self.command = ""
+            self.send_error(414)
+            return
+        if not self.parse_request():
+            return
+        handler = _ChunkedHandler(
+            self.rfile,
+            self.wfile,  # type: ignore[arg-type]
+            self.get_stderr(),
+            self.get_environ(),
+            multithread=True,
+        )
+        # pylint: disable-next=attribute-defined-outside-init
+        handler.request_handler = self  # type: ignore[attr-defined]
+        handler.run(self.server.get_app())  # type: ignore[attr-defined]
+
+    def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+        logger.debug(format, *args)
+
+
+class RelayServer(socketserver.ThreadingMixIn, simple_server.WSGIServer):
+    """Development server, handling each request in a thread."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], app: Callable[..., Iterable[bytes]]) -> None:
+        super().__init__(address, _RequestHandler)
+        self.set_app(app)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="i8t serve", description=__doc__.splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--segment-mb", type=float, default=RelayPolicy.segment_bytes / 2**20)
+    parser.add_argument("--fsync", action="store_true", help="Sync segments on every request")
+    args = parser.parse_args()
+    policy = RelayPolicy(segment_bytes=int(args.segment_mb * 2**20), fsync=args.fsync)
+    app = make_app(args.directory, policy)
+    server = RelayServer((args.host, args.port), app)
+    print(f"Serving relay on http://{args.host}:{server.server_port}/<tenant>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        app.store.close()
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
@@ -1,43 +1,87 @@
-import json
 import logging
+import time
+from typing import Any, List, Optional
 
 import requests
 
+from . import encoders
+from .compression import Codec
+from .metrics import REGISTRY, SEND_FAILURES, SEND_SECONDS, MetricsRegistry
 from .storage import IntrospectStorage
 
 logger = logging.getLogger(__name__)
 
 
 class RelayStorage(IntrospectStorage):
-    def __init__(self, session: requests.Session, api_url: str) -> None:
+    def __init__(
+        self,
+        session: requests.Session,
+        api_url: str,
+        codec: Optional[Codec] = None,
+        metrics: Optional[MetricsRegistry] = None,
+    ) -> None:
         self._api_url = api_url
         self._session = session
+        self._codec = codec
+        self._metrics = metrics or REGISTRY
         self._relay_converter = RelayConverter()
 
     def save(self, checkpoint: dict) -> None:
         try:
-            response = self._session.post(
-                self._api_url, json=self._relay_converter.to_relay(checkpoint)
-            )
+            response = self._post(self._relay_converter.to_relay(checkpoint))
             if response.status_code != 200:
+                self._metrics.inc(SEND_FAILURES, "relay")
                 logger.error("Failed to send checkpoint: %r", response.text)
         except Exception:  # pylint: disable=broad-except
+            self._metrics.inc(SEND_FAILURES, "relay")
             logger.exception("Error sending checkpoint")
 
+    def save_batch(self, checkpoints: List[dict]) -> None:
+        """Sends all checkpoints in a single request.
+
+        Unlike ``save``, errors are raised to the caller,
+        so that batching layer can account for lost checkpoints.
+        """
+        try:
+            response = self._post(
+                [self._relay_converter.to_relay(checkpoint) for checkpoint in checkpoints]
+            )
+            response.raise_for_status()
+        except Exception:
+            self._metrics.inc(SEND_FAILURES, "relay")
+            raise
+
+    def _post(self, payload: Any) -> requests.Response:
+        start = time.perf_counter()
+        try:
+            if not self._codec:
+                return self._session.post(self._api_url, json=payload)
+            return self._session.post(
+                self._api_url,
+                data=self._codec.compress(self._relay_converter.encode(payload)),
+                headers={"Content-Type": "application/json", "Content-Encoding": self._codec.name},
+            )
+        finally:
+            self._metrics.observe(SEND_SECONDS, "relay", time.perf_counter() - start)
+
 
 class RelayConverter:
     @staticmethod
     def from_relay(checkpoint: dict) -> dict:
         return dict(
             checkpoint,
-            input=json.loads(checkpoint["input"]),
-            output=json.loads(checkpoint["output"]),
+            input=encoders.loads(checkpoint["input"]),
+            output=encoders.loads(checkpoint["output"]),
         )
 
     @staticmethod
     def to_relay(checkpoint: dict) -> dict:
         return dict(
             checkpoint,
-            input=json.dumps(checkpoint["input"]),
-            output=json.dumps(checkpoint["output"]),
+            input=encoders.dumps(checkpoint["input"]),
+            output=encoders.dumps(checkpoint["output"]),
         )
+
+    @staticmethod
+    def encode(payload: Any) -> bytes:
+        return encoders.dumps(payload).encode("utf-8")
@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class SamplingBudget:
+    # Share of wall time spent capturing checkpoints, e.g. 0.02 for 2%
+    max_overhead: float = 0.02
+    # Checkpoints per second across all locations, 0 for no limit
+    max_checkpoints_per_sec: float = 0.0
+    # Rates are recomputed from calls observed within the window
+    window_sec: float = 1.0
+    # Every location keeps being recorded at least this often
+    min_rate: float = 0.001
+
+
+class _LocationStats:
+    def __init__(self) -> None:
+        self.rate = 1.0
+        self.calls = 0
+        self.captures = 0
+        self.capture_sec = 0.0
+        # Estimated time to capture a single call
+        self.cost_sec = 0.0
+
+
+class AdaptiveSampler:
+    """Adapts per-location sampling rates to keep capture overhead within the budget.
+
+    Calls and capture time are counted over a window.
+    When the window ends, the budget is split between locations with max-min fairness:
+    cheap and rare locations are recorded in full, and the rest share what's left.
+    Counters are updated without locking, so they are approximate under threads.
+    """
+
+    def __init__(self, budget: Optional[SamplingBudget] = None) -> None:
+        self._budget = budget or SamplingBudget()
+        self._locations: Dict[str, _LocationStats] = {}
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+
+    @property
+    def rates(self) -> Dict[str, float]:
+        return {location: stats.rate for location, stats in list(self._locations.items())}
+
+    def sample(self, location: str) -> float:
+        """Returns sampling rate applied to the call, or 0 if it should be skipped."""
+        stats = self._locations.get(location)
+        if stats is None:
+            stats = self._locations.setdefault(location, _LocationStats())
+        now = time.monotonic()
+        if now - self._window_start >= self._budget.window_sec:
+            self._adjust(now)
+        stats.calls += 1
+        rate = stats.rate
+        if rate < 1.0 and random.random() >= rate:
+            return 0.0
+        stats.captures += 1
+        return rate
+
+    def record(self, location: str, elapsed_sec: float) -> None:
+        """Accounts time spent capturing a sampled call."""
+        stats = self._locations.get(location)
+        if stats is not None:
+            stats.capture_sec += elapsed_sec
+
+    def _adjust(self, now: float) -> None:
+        # Skip if another thread is adjusting rates already
+        if not self._lock.acquire(blocking=False):  # pylint: disable=consider-using-with
+            return
+        try:
+            window_sec = now - self._window_start
+            if window_sec < self._budget.window_sec:
+                return
+            self._window_start = now
+            calls: Dict[str, int] = {}
+            for location, stats in list(self._locations.items()):
+                if stats.captures:
+                    stats.cost_sec = stats.capture_sec / stats.captures
+                if stats.calls:
+                    calls[location] = stats.calls
+                stats.calls, stats.captures, stats.capture_sec = 0, 0, 0.0
+            self._set_rates(calls, window_sec)
+        finally:
+            self._lock.release()
+
+    def _set_rates(self, calls: Dict[str, int], window_sec: float) -> None:
+        budget = self._budget
+        # Time each location would take at full rate
+        demand = {
+            location: count * self._locations[location].cost_sec
+            for location, count in calls.items()
+        }
+        time_shares = _fair_share(demand, budget.max_overhead * window_sec)
+        count_shares = (
+            _fair_share(dict(calls), budget.max_checkpoints_per_sec * window_sec)
+            if budget.max_checkpoints_per_sec
+            else {}
+        )
+        for location, count in calls.items():
+            rate = 1.0
+            if demand[location] > 0:
+                rate = min(rate, time_shares[location] / demand[location])
+            if location in count_shares:
+                rate = min(rate, count_shares[location] / count)
+            self._locations[location].rate = max(rate, budget.min_rate)
+
+
+def _fair_share(demands: Dict[str, float], capacity: float) -> Dict[str, float]:
+    """Satisfies smaller demands in full and splits the rest of capacity equally."""
+    shares = {}
+    ordered = sorted(demands.items(), key=lambda item: item[1])
+    for index, (key, demand) in enumerate(ordered):
+        shares[key] = min(demand, capacity / (len(ordered) - index))
+        capacity -= shares[key]
+    return shares
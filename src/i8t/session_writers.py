@@ -0,0 +1,187 @@
+"""Writers of collected checkpoints.
+
+``PartitionedWriter`` splits checkpoints into directories by a template, e.g.
+``{source}/{date}/{location}``, with fields:
+
+* ``source`` - name of the relay the checkpoint was collected from;
+* ``name`` - name of the client that sent it;
+* ``location`` - instrumented location;
+* ``date`` - UTC date of the call, as ``YYYY-MM-DD``.
+
+Each partition is written to ``<timestamp>-<pid>-<index>.jsonl``, followed by
+the extension of the codec, if any. Files are written with ``.active`` suffix,
+which is removed once the file is rotated or the writer is closed.
+Files of least recently written partitions are sealed once too many are open,
+and a new file is started when the partition is written again.
+"""
+
+import json
+import os
+import re
+import string
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import BinaryIO, List, Optional
+
+from .compression import Codec
+
+ACTIVE_SUFFIX = ".active"
+FIELDS = frozenset(["source", "name", "location", "date"])
+_UNSAFE = re.compile(r"[^\w.-]+")
+# Leading dots would make "." and ".." path components, or hidden directories
+_LEADING_DOTS = re.compile(r"^\.+")
+
+
+class SourceWriter:
+    """Writes lines of all sources to stdout."""
+
+    def write(self, source: str, line: str) -> None:  # pylint: disable=unused-argument
+        print(line)
+
+    def flush(self) -> None:
+        sys.stdout.flush()
+
+    def close(self) -> None:
+        self.flush()
+
+
+@dataclass
+class OutputPolicy:
+    partition: str = "{source}"
+    # Files are rotated once they get this large before compression, 0 to disable
+    rotate_bytes: int = 0
+    # Files are rotated once they get this old, 0 to disable
+    rotate_sec: float = 0.0
+    # Lines are buffered in memory and written together
+    buffer_bytes: int = 1024 * 1024
+    # Buffers of all partitions are written once they total this much
+    max_buffered_bytes: int = 64 * 1024 * 1024
+    # Files of least recently written partitions are sealed above this number
+    max_open_files: int = 64
+    codec: Optional[Codec] = None
+
+
+class _OutputFile:
+    def __init__(self, path: str, codec: Optional[Codec]) -> None:
+        self.path = path
+        self.opened_at = time.monotonic()
+        self.size = 0
+        self.buffered = 0
+        # pylint: disable-next=consider-using-with
+        self._raw: BinaryIO = open(path + ACTIVE_SUFFIX, "wb")
+        self._stream = codec.open_writer(self._raw) if codec else self._raw
+        self._buffer: List[bytes] = []
+
+    def write(self, line: bytes, buffer_bytes: int) -> None:
+        self._buffer.append(line)
+        self.buffered += len(line)
+        self.size += len(line)
+        if self.buffered >= buffer_bytes:
+            self.write_buffer()
+
+    def flush(self) -> None:
+        self.write_buffer()
+        self._stream.flush()
+
+    def seal(self) -> None:
+        self.write_buffer()
+        # Compressed stream may not close the file it wraps
+        self._stream.close()
+        self._raw.close()
+        os.replace(self.path + ACTIVE_SUFFIX, self.path)
+
+    def write_buffer(self) -> None:
+        if self._buffer:
+            self._stream.write(b"".join(self._buffer))
+            self._buffer.clear()
+            self.buffered = 0
+
+
+class PartitionedWriter(SourceWriter):
+    """Writes lines into rotated, optionally compressed files of partitions."""
+
+    def __init__(self, directory: str, policy: Optional[OutputPolicy] = None) -> None:
+        self._directory = directory
+        self._policy = policy or OutputPolicy()
+        self._fields = {
+            field for _, field, _, _ in string.Formatter().parse(self._policy.partition) if field
+        }
+        if self._fields - FIELDS:
+            raise ValueError(
+                f"Unknown partition fields: {', '.join(sorted(self._fields - FIELDS))}, "
+                f"expected {', '.join(sorted(FIELDS))}"
+            )
+        # Open files by partition, from least to most recently written
+        self._files: "OrderedDict[str, _OutputFile]" = OrderedDict()
+        self._opened = 0
+        self._buffered = 0
+
+    def write(self, source: str, line: str) -> None:
+        partition = self._partition(source, line)
+        output = self._files.get(partition)
+        if output is None or self._should_rotate(output):
+            if output is not None:
+                self._seal(partition)
+            elif len(self._files) >= self._policy.max_open_files:
+                self._seal(next(iter(self._files)))
+            output = self._files[partition] = self._open(partition)
+        else:
+            self._files.move_to_end(partition)
+        self._buffered -= output.buffered
+        output.write(line.encode("utf-8") + b"\n", self._policy.buffer_bytes)
+        self._buffered += output.buffered
+        if self._buffered >= self._policy.max_buffered_bytes:
+            for buffered in self._files.values():
+                buffered.write_buffer()
+            self._buffered = 0
+
+    def flush(self) -> None:
+        """Writes buffered lines, and seals files due for rotation."""
+        for partition, output in list(self._files.items()):
+            if self._should_rotate(output):
+                self._seal(partition)
+            else:
+                output.flush()
+        self._buffered = 0
+
+    def close(self) -> None:
+        for partition in list(self._files):
+            self._seal(partition)
+
+    def _seal(self, partition: str) -> None:
+        output = self._files.pop(partition)
+        self._buffered -= output.buffered
+        output.seal()
+
+    def _partition(self, source: str, line: str) -> str:
+        values = {"source": source}
+        if self._fields - {"source"}:
+            metadata = json.loads(line).get("metadata") or {}
+            timestamp = metadata.get("start_ts") or metadata.get("finish_ts") or 0
+            values.update(
+                name=metadata.get("name", ""),
+                location=metadata.get("location", ""),
+                date=time.strftime("%Y-%m-%d", time.gmtime(timestamp)),
+            )
+        safe = {
+            key: _LEADING_DOTS.sub("_", _UNSAFE.sub("_", value)) or "_"
+            for key, value in values.items()
+        }
+        return self._policy.partition.format(**safe)
+
+    def _should_rotate(self, output: _OutputFile) -> bool:
+        policy = self._policy
+        return bool(
+            (policy.rotate_bytes and output.size >= policy.rotate_bytes)
+            or (policy.rotate_sec and time.monotonic() - output.opened_at >= policy.rotate_sec)
+        )
+
+    def _open(self, partition: str) -> _OutputFile:
+        directory = os.path.join(self._directory, partition)
+        os.makedirs(directory, exist_ok=True)
+        self._opened += 1
+        name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{os.getpid()}-{self._opened}"
+        extension = self._policy.codec.extension if self._policy.codec else ""
+        return _OutputFile(os.path.join(directory, name + ".jsonl" + extension), self._policy.codec)
@@ -0,0 +1,257 @@
+"""Spools checkpoints to local files, and uploads them from another thread or process.
+
+Usage::
+
+    i8t spool-upload /var/spool/i8t https://api.demin.dev/i8t/toy
+"""
+
+import argparse
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, List, Optional
+
+import requests
+
+from .relay_storage import RelayStorage
+from .storage import IntrospectStorage
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_SUFFIX = ".active"
+SEALED_SUFFIX = ".jsonl"
+
+
+@dataclass
+class SpoolPolicy:
+    segment_bytes: int = 4 * 1024 * 1024
+    segment_max_age_sec: float = 10.0
+    max_spool_bytes: int = 256 * 1024 * 1024
+    fsync_every: int = 100
+
+
+@dataclass
+class SpoolStats:
+    backlog_bytes: int = 0
+    dropped: int = 0
+
+
+class _Segment:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.opened_at = time.monotonic()
+        self._fobj: BinaryIO = open(path, "ab")  # pylint: disable=consider-using-with
+        self._unsynced = 0
+
+    @property
+    def size(self) -> int:
+        return self._fobj.tell()
+
+    def append(self, line: bytes, fsync_every: int) -> None:
+        self._fobj.write(line)
+        self._unsynced += 1
+        if self._unsynced >= fsync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        self._fobj.flush()
+        os.fsync(self._fobj.fileno())
+        self._unsynced = 0
+
+    def seal(self) -> None:
+        self.sync()
+        self._fobj.close()
+        seal_segment(self.path)
+
+
+class SpoolStorage(IntrospectStorage):
+    """Appends checkpoints to rotating JSONL segment files in a local directory.
+
+    Sealed segments are uploaded and deleted by ``SpoolUploader``,
+    possibly in another process.
+    Segments are sealed once they reach ``segment_bytes``, and by a background thread
+    once they get ``segment_max_age_sec`` old, even if nothing is saved after that.
+    Only one ``SpoolStorage`` may write to a directory at a time.
+    """
+
+    def __init__(self, directory: str, policy: Optional[SpoolPolicy] = None) -> None:
+        self._directory = directory
+        self._policy = policy or SpoolPolicy()
+        self._lock = threading.Condition()
+        self._closed = False
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, "*" + ACTIVE_SUFFIX)):
+            seal_segment(path)
+        self._next_seq = max((_segment_seq(path) for path in sealed_segments(directory)), default=0)
+        self.stats = SpoolStats(backlog_bytes=spool_backlog_bytes(directory))
+        self._segment: Optional[_Segment] = None
+        threading.Thread(
+            target=self._seal_aged_forever, name="i8t-spool-sealer", daemon=True
+        ).start()
+        atexit.register(self.close)
+
+    def save(self, checkpoint: dict) -> None:
+        line = (json.dumps(checkpoint) + "\n").encode("utf-8")
+        with self._lock:
+            segment = self._writable_segment()
+            if self.stats.backlog_bytes + len(line) > self._policy.max_spool_bytes:
+                self.stats.dropped += 1
+                return
+            segment.append(line, self._policy.fsync_every)
+            self.stats.backlog_bytes += len(line)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._lock.notify_all()
+            if self._segment:
+                self._segment.seal()
+                self._segment = None
+        atexit.unregister(self.close)
+
+    def _writable_segment(self) -> _Segment:
+        if self._segment and self._is_due_rotation(self._segment):
+            self._seal()
+        if not self._segment:
+            self._next_seq += 1
+            self._segment = _Segment(
+                os.path.join(self._directory, f"{self._next_seq:012d}{ACTIVE_SUFFIX}")
+            )
+            self._lock.notify_all()
+        return self._segment
+
+    def _seal(self) -> None:
+        assert self._segment is not None
+        self._segment.seal()
+        self._segment = None
+        self.stats.backlog_bytes = spool_backlog_bytes(self._directory)
+
+    def _seal_aged_forever(self) -> None:
+        with self._lock:
+            while not self._closed:
+                if self._segment is None:
+                    self._lock.wait()
+                    continue
+                age_sec = time.monotonic() - self._segment.opened_at
+                if age_sec < self._policy.segment_max_age_sec:
+                    self._lock.wait(self._policy.segment_max_age_sec - age_sec)
+                else:
+                    self._seal()
+
+    def _is_due_rotation(self, segment: _Segment) -> bool:
+        return segment.size >= self._policy.segment_bytes or (
+            time.monotonic() - segment.opened_at >= self._policy.segment_max_age_sec
+        )
+
+
+class SpoolUploader:
+    """Drains sealed spool segments into another storage, e.g. ``RelayStorage``.
+
+    A segment is deleted only after all of its checkpoints were saved,
+    so delivery is at-least-once: a failure in the middle of a segment
+    will re-send its first batches on the next attempt.
+    """
+
+    DEFAULT_DELAY_SEC = 1.0
+
+    def __init__(
+        self,
+        directory: str,
+        storage: IntrospectStorage,
+        batch_size: int = 100,
+        delay_sec: float = DEFAULT_DELAY_SEC,
+    ) -> None:
+        self._directory = directory
+        self._storage = storage
+        self._batch_size = batch_size
+        self._delay_sec = delay_sec
+        self._stopped = threading.Event()
+
+    def upload_once(self) -> int:
+        uploaded = 0
+        for path in sealed_segments(self._directory):
+            try:
+                for batch in self._read_batches(path):
+                    self._storage.save_batch(batch)
+                    uploaded += len(batch)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Error uploading segment %s", path)
+                break
+            os.remove(path)
+        return uploaded
+
+    def run_forever(self) -> None:
+        while not self._stopped.is_set():
+            self.upload_once()
+            self._stopped.wait(self._delay_sec)
+
+    def start(self) -> threading.Thread:
+        """Runs ``run_forever`` in a daemon thread, to upload from the spooling process."""
+        thread = threading.Thread(target=self.run_forever, name="i8t-spool-uploader", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _read_batches(self, path: str) -> Iterator[List[dict]]:
+        batch: List[dict] = []
+        with open(path, "rb") as fobj:
+            for line in fobj:
+                try:
+                    batch.append(json.loads(line))
+                except ValueError:
+                    # Torn write from a crashed process
+                    logger.warning("Skipping corrupted line in %s", path)
+                    continue
+                if len(batch) >= self._batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+
+def sealed_segments(directory: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(directory, "*" + SEALED_SUFFIX)))
+
+
+def spool_backlog_bytes(directory: str) -> int:
+    return sum(
+        os.path.getsize(path)
+        for path in glob.glob(os.path.join(directory, "*"))
+        if path.endswith((ACTIVE_SUFFIX, SEALED_SUFFIX))
+    )
+
+
+def seal_segment(path: str) -> None:
+    os.replace(path, path[: -len(ACTIVE_SUFFIX)] + SEALED_SUFFIX)
+
+
+def _segment_seq(path: str) -> int:
+    return int(os.path.basename(path).split(".", 1)[0])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="i8t spool-upload", description="Uploads spooled checkpoints to relay."
+    )
+    parser.add_argument("directory")
+    parser.add_argument("api_url")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=SpoolUploader.DEFAULT_DELAY_SEC)
+    args = parser.parse_args()
+    uploader = SpoolUploader(
+        args.directory,
+        RelayStorage(requests.Session(), args.api_url),
+        batch_size=args.batch_size,
+        delay_sec=args.delay,
+    )
+    try:
+        uploader.run_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,3 +1,10 @@
+from typing import List
+
+
 class IntrospectStorage:
     def save(self, checkpoint: dict) -> None:
         raise NotImplementedError()  # pragma: no cover
+
+    def save_batch(self, checkpoints: List[dict]) -> None:
+        for checkpoint in checkpoints:
+            self.save(checkpoint)
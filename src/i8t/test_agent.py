@@ -0,0 +1,143 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from .agent import AgentStorage, IntrospectAgent, logger, main
+from .cli import cli
+from .inmemory_storage import IntrospectInMemoryStorage
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix sockets are not supported")
+class TestAgent(unittest.TestCase):
+    CHECKPOINT = {"input": "input", "output": "output"}
+
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmpdir.cleanup)
+        self.socket_path = os.path.join(tmpdir.name, "agent.sock")
+        self.storage = IntrospectInMemoryStorage()
+
+    def serve(self) -> IntrospectAgent:
+        agent = IntrospectAgent(self.socket_path, self.storage)
+        threading.Thread(target=agent.serve_forever, daemon=True).start()
+        self.addCleanup(agent.close)
+        self.addCleanup(agent.shutdown)
+        return agent
+
+    def wait_for(self, count: int) -> None:
+        for _ in range(500):
+            if len(self.storage.checkpoints) >= count:
+                return
+            time.sleep(0.01)
+
+    def test_merges_checkpoints_of_many_clients(self):
+        self.serve()
+        clients = [AgentStorage(self.socket_path) for _ in range(3)]
+        for client in clients:
+            client.save(self.CHECKPOINT)
+            client.save(self.CHECKPOINT)
+        self.wait_for(6)
+        for client in clients:
+            client.close()
+        self.assertEqual(self.storage.checkpoints, [self.CHECKPOINT] * 6)
+
+    def test_skips_malformed_lines(self):
+        self.serve()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(self.socket_path)
+            with self.assertLogs(logger=logger, level="WARNING"):
+                sock.sendall(b'{"inp\n{"input": 1}\n')
+                self.wait_for(1)
+        self.assertEqual(self.storage.checkpoints, [{"input": 1}])
+
+    def test_drops_without_agent(self):
+        client = AgentStorage(self.socket_path)
+        with self.assertLogs(logger=logger, level="WARNING"):
+            client.save(self.CHECKPOINT)
+        self.assertEqual(client.dropped, 1)
+
+    def test_backs_off_reconnecting(self):
+        client = AgentStorage(self.socket_path)
+        with mock.patch("time.monotonic", return_value=100.0), mock.patch(
+            "socket.socket", wraps=socket.socket
+        ) as make_socket, self.assertLogs(logger=logger, level="WARNING") as logs:
+            for _ in range(5):
+                client.save(self.CHECKPOINT)
+        self.assertEqual(client.dropped, 5)
+        self.assertEqual(make_socket.call_count, 1)
+        self.assertEqual(len(logs.records), 1)
+
+        with mock.patch("time.monotonic", return_value=100.0 + client.MIN_BACKOFF_SEC):
+            with self.assertLogs(logger=logger, level="WARNING") as logs:
+                client.save(self.CHECKPOINT)
+        self.assertIn("retrying in 0.2s, 4 dropped meanwhile", logs.output[0])
+
+        self.serve()
+        with mock.patch("time.monotonic", return_value=101.0):
+            client.save(self.CHECKPOINT)
+        self.wait_for(1)
+        self.assertEqual(self.storage.checkpoints, [self.CHECKPOINT])
+        client.close()
+
+        os.rename(self.socket_path, self.socket_path + ".moved")
+        self.addCleanup(os.rename, self.socket_path + ".moved", self.socket_path)
+        with mock.patch("time.monotonic", return_value=101.0):
+            with self.assertLogs(logger=logger, level="WARNING") as logs:
+                client.save(self.CHECKPOINT)
+        self.assertIn("retrying in 0.1s", logs.output[0])
+
+    def test_caps_backoff(self):
+        client = AgentStorage(self.socket_path)
+        with self.assertLogs(logger=logger, level="WARNING") as logs:
+            for attempt in range(20):
+                with mock.patch("time.monotonic", return_value=attempt * 1000.0):
+                    client.save(self.CHECKPOINT)
+        self.assertIn("retrying in 30.0s", logs.output[-1])
+
+    def test_reconnects_after_fork(self):
+        self.serve()
+        client = AgentStorage(self.socket_path)
+        client.save(self.CHECKPOINT)
+        with mock.patch("os.getpid", return_value=-1):
+            client.save(self.CHECKPOINT)
+            client.close()
+        self.wait_for(2)
+        self.assertEqual(len(self.storage.checkpoints), 2)
+        client.close()
+
+    def test_replaces_stale_socket(self):
+        with open(self.socket_path, "w", encoding="utf-8"):
+            pass
+        self.serve()
+        client = AgentStorage(self.socket_path)
+        client.save(self.CHECKPOINT)
+        self.wait_for(1)
+        self.assertEqual(self.storage.checkpoints, [self.CHECKPOINT])
+        client.close()
+
+    def test_cli_collects_by_default(self):
+        with mock.patch("sys.argv", ["i8t", "http://example.com"]), mock.patch(
+            "i8t.cli.collect"
+        ) as collect:
+            cli()
+        collect.assert_called_once_with()
+
+    def test_main_runs_agent(self):
+        argv = ["i8t", "agent", "http://example.com", "--socket", self.socket_path]
+        with mock.patch("sys.argv", argv), mock.patch(
+            "i8t.agent.IntrospectAgent.serve_forever", side_effect=KeyboardInterrupt
+        ):
+            cli()
+        self.assertFalse(os.path.exists(self.socket_path))
+
+    def test_main_closes_storage(self):
+        with mock.patch("sys.argv", ["i8t agent", "http://example.com"]), mock.patch(
+            "i8t.agent.IntrospectAgent"
+        ) as agent_cls, mock.patch("i8t.agent.BatchingStorage") as storage_cls:
+            main()
+        agent_cls.return_value.serve_forever.assert_called_once_with()
+        storage_cls.return_value.close.assert_called_once_with()
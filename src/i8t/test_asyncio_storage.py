@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from .asyncio_storage import AsyncioBatchingStorage, logger
+from .batching_storage import BatchPolicy
+from .storage import IntrospectStorage
+
+
+class TestAsyncioBatchingStorage(unittest.IsolatedAsyncioTestCase):
+    IDLE = BatchPolicy(max_batch_size=100, max_delay_sec=60, max_queue_size=2)
+
+    def setUp(self) -> None:
+        self.target = mock.Mock(IntrospectStorage)
+
+    async def test_flushes_full_batch(self):
+        storage = AsyncioBatchingStorage(self.target, BatchPolicy(max_batch_size=2))
+        storage.start()
+        storage.save({"n": 1})
+        storage.save({"n": 2})
+        for _ in range(100):
+            if storage.stats.sent:
+                break
+            await asyncio.sleep(0.01)
+        self.target.save_batch.assert_called_once_with([{"n": 1}, {"n": 2}])
+        await storage.close()
+
+    async def test_flushes_on_close(self):
+        storage = AsyncioBatchingStorage(self.target, self.IDLE)
+        storage.start()
+        storage.save({"n": 1})
+        await storage.close()
+        self.target.save_batch.assert_called_once_with([{"n": 1}])
+        self.assertEqual(storage.stats.sent, 1)
+        self.assertEqual(storage.queue_depth, 0)
+
+    async def test_flushes_by_age(self):
+        storage = AsyncioBatchingStorage(self.target, BatchPolicy(max_delay_sec=0.01))
+        storage.start()
+        storage.save({"n": 1})
+        await asyncio.sleep(0.1)
+        self.target.save_batch.assert_called_once_with([{"n": 1}])
+        await storage.close()
+
+    async def test_drop_newest(self):
+        storage = AsyncioBatchingStorage(self.target, self.IDLE)
+        storage.start()
+        for i in range(3):
+            storage.save({"n": i})
+        await storage.close()
+        self.target.save_batch.assert_called_once_with([{"n": 0}, {"n": 1}])
+        self.assertEqual(storage.stats.dropped, 1)
+
+    async def test_drop_oldest(self):
+        policy = BatchPolicy(max_delay_sec=60, max_queue_size=2, overflow=BatchPolicy.DROP_OLDEST)
+        storage = AsyncioBatchingStorage(self.target, policy)
+        storage.start()
+        for i in range(3):
+            storage.save({"n": i})
+        await storage.close()
+        self.target.save_batch.assert_called_once_with([{"n": 1}, {"n": 2}])
+        self.assertEqual(storage.stats.dropped, 1)
+
+    async def test_counts_failures(self):
+        self.target.save_batch.side_effect = Exception("Test exception")
+        storage = AsyncioBatchingStorage(self.target, self.IDLE)
+        storage.start()
+        storage.save({"n": 1})
+        with self.assertLogs(logger=logger, level="ERROR"):
+            await storage.close()
+        self.assertEqual(storage.stats.failed, 1)
+
+    async def test_drops_after_close(self):
+        storage = AsyncioBatchingStorage(self.target, self.IDLE)
+        await storage.close()
+        storage.save({"n": 1})
+        self.assertEqual(storage.stats.dropped, 1)
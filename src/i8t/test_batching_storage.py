@@ -0,0 +1,100 @@
+import threading
+import unittest
+from unittest import mock
+
+from .batching_storage import BatchingStorage, BatchPolicy, logger
+from .storage import IntrospectStorage
+
+
+class TestBatchingStorage(unittest.TestCase):
+    IDLE = BatchPolicy(max_batch_size=100, max_delay_sec=60, max_queue_size=2)
+
+    def setUp(self) -> None:
+        self.target = mock.Mock(IntrospectStorage)
+
+    def test_flushes_full_batch(self):
+        storage = BatchingStorage(self.target, BatchPolicy(max_batch_size=2, max_delay_sec=60))
+        storage.save({"n": 1})
+        storage.save({"n": 2})
+        storage.close()
+        self.target.save_batch.assert_called_once_with([{"n": 1}, {"n": 2}])
+        self.assertEqual(storage.stats.sent, 2)
+
+    def test_flushes_by_age(self):
+        flushed = threading.Event()
+        self.target.save_batch.side_effect = lambda _: flushed.set()
+        storage = BatchingStorage(self.target, BatchPolicy(max_delay_sec=0.01))
+        storage.save({"n": 1})
+        self.assertTrue(flushed.wait(5))
+        storage.close()
+        self.target.save_batch.assert_called_once_with([{"n": 1}])
+
+    def test_drop_newest(self):
+        storage = BatchingStorage(self.target, self.IDLE)
+        for i in range(3):
+            storage.save({"n": i})
+        self.assertEqual(storage.queue_depth, 2)
+        storage.close()
+        self.target.save_batch.assert_called_once_with([{"n": 0}, {"n": 1}])
+        self.assertEqual(storage.stats.dropped, 1)
+
+    def test_drop_oldest(self):
+        policy = BatchPolicy(
+            max_batch_size=100,
+            max_delay_sec=60,
+            max_queue_size=2,
+            overflow=BatchPolicy.DROP_OLDEST,
+        )
+        storage = BatchingStorage(self.target, policy)
+        for i in range(3):
+            storage.save({"n": i})
+        storage.close()
+        self.target.save_batch.assert_called_once_with([{"n": 1}, {"n": 2}])
+        self.assertEqual(storage.stats.dropped, 1)
+
+    def test_block_times_out(self):
+        policy = BatchPolicy(
+            max_batch_size=100,
+            max_delay_sec=60,
+            max_queue_size=1,
+            overflow=BatchPolicy.BLOCK,
+            block_timeout_sec=0.01,
+        )
+        storage = BatchingStorage(self.target, policy)
+        storage.save({"n": 1})
+        storage.save({"n": 2})
+        storage.close()
+        self.target.save_batch.assert_called_once_with([{"n": 1}])
+        self.assertEqual(storage.stats.dropped, 1)
+
+    def test_block_waits_for_flush(self):
+        policy = BatchPolicy(
+            max_batch_size=1,
+            max_delay_sec=60,
+            max_queue_size=1,
+            overflow=BatchPolicy.BLOCK,
+            block_timeout_sec=5,
+        )
+        storage = BatchingStorage(self.target, policy)
+        for i in range(3):
+            storage.save({"n": i})
+        storage.close()
+        self.assertEqual(storage.stats.sent, 3)
+        self.assertEqual(storage.stats.dropped, 0)
+
+    def test_counts_failures(self):
+        self.target.save_batch.side_effect = Exception("Test exception")
+        storage = BatchingStorage(self.target, self.IDLE)
+        storage.save({"n": 1})
+        with self.assertLogs(logger=logger, level="ERROR") as log:
+            storage.close()
+        self.assertIn("ERROR:i8t.batching_storage:Error sending 1 checkpoints", log.output[0])
+        self.assertEqual(storage.stats.failed, 1)
+        self.assertEqual(storage.stats.sent, 0)
+
+    def test_drops_after_close(self):
+        storage = BatchingStorage(self.target, self.IDLE)
+        storage.close()
+        storage.save({"n": 1})
+        self.target.save_batch.assert_not_called()
+        self.assertEqual(storage.stats.dropped, 1)
@@ -0,0 +1,189 @@
+import mmap
+import pickle
+import tempfile
+import unittest
+from unittest import mock
+
+from .adapters.decorator_adapter.loader import DecoratedCase
+from .adapters.decorator_adapter.serde import DecoratorSerde
+from .blobs import (
+    BLOB_KEY,
+    BlobPolicy,
+    BlobStore,
+    BlobWriter,
+    DirectoryBlobStore,
+    dump_blob,
+    estimate_size,
+    load_blob,
+    resolve_input,
+)
+from .encoders import DillEncoder
+from .test_pickling import Frame, reduce_frame
+
+
+class TestDirectoryBlobStore(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmpdir.cleanup)
+        self.store = DirectoryBlobStore(tmpdir.name)
+
+    def test_memory_maps_blob(self):
+        self.store.put("abcdef", b"payload")
+        blob = self.store.get("abcdef")
+        self.assertIsInstance(blob, mmap.mmap)
+        self.assertEqual(blob[:], b"payload")
+
+    def test_keeps_existing_blob(self):
+        self.store.put("abcdef", b"payload")
+        self.store.put("abcdef", b"other")
+        self.assertEqual(self.store.get("abcdef")[:], b"payload")
+
+    def test_missing_blob(self):
+        with self.assertRaises(KeyError):
+            self.store.get("abcdef")
+
+    @mock.patch.dict("i8t.pickling._REDUCERS", {Frame: reduce_frame})
+    def test_loads_out_of_band_buffers_without_copying(self):
+        self.store.put_chunks("abcdef", dump_blob([Frame(bytearray(b"x" * 100)), Frame(b"yz")]))
+        blob = self.store.get("abcdef")
+        frames = load_blob(blob)
+        self.assertEqual([bytes(frame.data) for frame in frames], [b"x" * 100, b"yz"])
+        self.assertIs(frames[0].data.obj, blob)
+
+    def test_rejects_non_contiguous_buffers(self):
+        with mock.patch.dict("i8t.pickling._REDUCERS", {Frame: reduce_frame}):
+            with self.assertRaises(BufferError):
+                dump_blob(Frame(memoryview(bytearray(b"abcdef"))[::2]))
+
+    def test_default_put_chunks_joins_buffers(self):
+        class DictBlobStore(BlobStore):
+            def __init__(self) -> None:
+                self.blobs: dict = {}
+
+            def put(self, digest: str, data: bytes) -> None:
+                self.blobs[digest] = data
+
+            def get(self, digest: str) -> bytes:
+                return self.blobs[digest]
+
+        store = DictBlobStore()
+        store.put_chunks("abcdef", [b"a", memoryview(b"bc")])
+        self.assertEqual(store.get("abcdef"), b"abc")
+
+    def test_loads_blobs_without_header(self):
+        self.store.put("abcdef", pickle.dumps({"a": 1}))
+        self.assertEqual(load_blob(self.store.get("abcdef")), {"a": 1})
+
+
+class TestBlobWriter(unittest.TestCase):
+    LARGE = list(range(100))
+
+    def setUp(self) -> None:
+        self.store = mock.Mock(BlobStore)
+        self.writer = BlobWriter(self.store, BlobPolicy(min_bytes=100))
+
+    def test_uploads_repeated_value_once(self):
+        refs = [self.writer.extract(list(self.LARGE)) for _ in range(3)]
+        self.assertEqual(len({ref[BLOB_KEY] for ref in refs}), 1)
+        self.store.put_chunks.assert_called_once()
+        self.assertEqual((self.writer.uploaded, self.writer.reused), (1, 2))
+
+    def test_keeps_small_values(self):
+        input_ = {"args": (1, "a", [1, 2]), "kwargs": {"flag": None}}
+        self.assertEqual(self.writer.extract_input(input_), input_)
+        self.store.put_chunks.assert_not_called()
+
+    def test_skips_pickling_small_values(self):
+        with mock.patch("i8t.blobs.dump_blob", wraps=dump_blob) as dump:
+            self.assertEqual(
+                self.writer.extract({"a": [1, 2], "b": (None, 2.5)}),
+                {"a": [1, 2], "b": (None, 2.5)},
+            )
+            dump.assert_not_called()
+            # Size of other objects is known only after pickling
+            writer = BlobWriter(self.store, BlobPolicy(min_bytes=1000))
+            self.assertEqual(writer.extract(1j), 1j)
+            dump.assert_called_once()
+        self.store.put_chunks.assert_not_called()
+
+    def test_estimates_pickled_size(self):
+        cyclic: list = []
+        cyclic.append(cyclic)
+        self.assertEqual(estimate_size(cyclic, 100), 100)
+        self.assertEqual(estimate_size({"key": {b"abc", 1}}, 100), 3 + 3 + 3 * 2)
+        self.assertEqual(estimate_size(memoryview(bytes(50)), 100), 50)
+        self.assertEqual(estimate_size(object(), 100), 100)
+
+    def test_keeps_values_in_band_on_store_errors(self):
+        self.store.put_chunks.side_effect = OSError("disk full")
+        with self.assertLogs("i8t.blobs", "ERROR"):
+            self.assertEqual(self.writer.extract(self.LARGE), self.LARGE)
+        self.assertEqual((self.writer.uploaded, self.writer.failed), (0, 1))
+
+    def test_extracts_and_resolves_whole_input(self):
+        tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmpdir.cleanup)
+        store = DirectoryBlobStore(tmpdir.name)
+        ref = BlobWriter(store, BlobPolicy(min_bytes=100)).extract_input(self.LARGE)
+        self.assertEqual(list(ref), [BLOB_KEY])
+        self.assertEqual(resolve_input(ref, store), self.LARGE)
+
+    def test_evicts_uploaded_digests(self):
+        writer = BlobWriter(self.store, BlobPolicy(min_bytes=100, cache_size=1))
+        for value in (self.LARGE, self.LARGE[1:], self.LARGE):
+            writer.extract(value)
+        self.assertEqual(self.store.put_chunks.call_count, 3)
+
+
+class TestBlobCheckpoints(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmpdir.cleanup)
+        self.store = DirectoryBlobStore(tmpdir.name)
+        self.serde = DecoratorSerde(blob_writer=BlobWriter(self.store, BlobPolicy(min_bytes=1000)))
+
+    def record(self, input_, output) -> dict:
+        serialized = self.serde.serialize("mod.func", input_, output, 1)
+        return {
+            "input": serialized["input_data"],
+            "output": serialized["output_data"],
+            "metadata": {
+                "location": "mod.func",
+                "start_ts": 1,
+                "finish_ts": 2,
+                "input_hint": serialized["input_hint"],
+                "output_hint": serialized["output_hint"],
+            },
+        }
+
+    def test_from_record_resolves_blobs(self):
+        config = {f"key{i}": i for i in range(200)}
+        record = self.record({"args": (config, 5), "kwargs": {"big": "x" * 2000}}, [0] * 500)
+        self.assertLess(len(record["input"]) + len(record["output"]), 1000)
+        self.assertEqual(record["metadata"]["input_hint"], "json")
+        case = DecoratedCase.from_record(record, self.store)
+        self.assertEqual(case.args, [config, 5])
+        self.assertEqual(case.kwargs, {"big": "x" * 2000})
+        self.assertEqual(case.expected, [0] * 500)
+
+    def test_encodes_extracted_values_only(self):
+        serde = DecoratorSerde(
+            hints=("dill",), blob_writer=BlobWriter(self.store, BlobPolicy(min_bytes=1000))
+        )
+        large = bytearray(10000)
+        with mock.patch.object(
+            DillEncoder, "encode", autospec=True, side_effect=DillEncoder.encode
+        ) as encode:
+            serde.serialize("mod.func", {"args": (large,), "kwargs": {}}, large, 1)
+        (input_,), (output,) = [call.args[1:] for call in encode.call_args_list]
+        self.assertEqual(list(input_["args"][0]), [BLOB_KEY])
+        self.assertEqual(list(output), [BLOB_KEY])
+
+    def test_small_checkpoints_are_inline(self):
+        record = self.record({"args": (1,), "kwargs": {}}, 2)
+        self.assertEqual(DecoratedCase.from_record(record).args, [1])
+
+    def test_blob_store_required(self):
+        record = self.record({"args": (), "kwargs": {}}, "x" * 2000)
+        with self.assertRaisesRegex(ValueError, "no blob store"):
+            DecoratedCase.from_record(record)
@@ -4,7 +4,7 @@ from unittest import mock
 
 import requests
 
-from .client import IntrospectClient
+from .client import IntrospectClient, _ProducerIds
 from .relay_storage import RelayStorage, logger
 
 
@@ -78,8 +78,58 @@ class TestIntrospectClient(unittest.TestCase):
                     "start_ts": 1,
                     "finish_ts": 5,
                     "context": "",
+                    "producer": mock.ANY,
+                    "seq": mock.ANY,
                 },
                 "input": {"input": "data"},
                 "output": {"output": "data"},
             },
         )
+
+    def test_checkpoints_numbered_per_producer(self):
+        client = IntrospectClient("http://example.com", "test_client")
+        first, second = (client.capture_finish() for _ in range(2))
+        self.assertEqual(first["producer"], second["producer"])
+        self.assertEqual(second["seq"], first["seq"] + 1)
+
+    def test_forked_process_is_new_producer(self):
+        producer_ids = _ProducerIds()
+        producer = producer_ids.producer
+        producer_ids.next_seq()
+        producer_ids.reset()
+        self.assertNotEqual(producer_ids.producer, producer)
+        self.assertEqual(producer_ids.next_seq(), 1)
+
+    def test_send_batch(self):
+        # Arrange
+        mock_session = mock.Mock(requests.Session)
+        storage = RelayStorage(mock_session, self.API_URL)
+
+        # Act
+        storage.save_batch([self.CHECKPOINT, self.CHECKPOINT])
+
+        # Assert
+        mock_session.post.assert_called_once_with(
+            "http://example.com", json=[self.SENT_CHECKPOINT, self.SENT_CHECKPOINT]
+        )
+        mock_session.post.return_value.raise_for_status.assert_called_once_with()
+
+    def test_sampling_disabled(self):
+        client = IntrospectClient("http://example.com", "test_client", sample_rate=0)
+        client.start_context()
+        self.assertFalse(client.is_sampled())
+        client.reset_context()
+        self.assertTrue(client.is_sampled())
+
+    def test_sampling_is_consistent(self):
+        client = IntrospectClient("http://example.com", "test_client", sample_rate=0.5)
+        other = IntrospectClient("http://example.org", "other_client", sample_rate=0.5)
+        decisions = []
+        for i in range(1000):
+            client.start_context(str(i))
+            decision = client.is_sampled()
+            other.start_context(str(i))
+            self.assertEqual(other.is_sampled(), decision)
+            decisions.append(decision)
+        client.reset_context()
+        self.assertTrue(400 < sum(decisions) < 600)
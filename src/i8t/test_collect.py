@@ -1,11 +1,29 @@
+import glob
 import json
 import os
 import sys
+import tempfile
 from unittest import mock
 
+import pytest
 import requests
 
-from i8t.relay_consumer import CheckpointCollector, CheckpointFetcher, CheckpointPoller, main
+from i8t.relay_consumer import (
+    CheckpointCollector,
+    CheckpointFetcher,
+    CheckpointPoller,
+    CheckpointStreamer,
+    CursorFile,
+    MultiSourceCollector,
+    ProducerStats,
+    iter_events,
+    main,
+    read_sources,
+    source_names,
+)
+from i8t.relay_storage import RelayStorage
+from i8t.session_writers import OutputPolicy, PartitionedWriter, SourceWriter
+from i8t.testing.stand_in_relay import StandInRelay, make_checkpoint
 
 HERE = os.path.dirname(__file__)
 TESTDATA = os.path.join(HERE, "testdata")
@@ -20,17 +38,25 @@ def test_collect_prints_jsonl() -> None:
         collected_session = list(fobj)
     assert len(raw_session) == len(collected_session)
     mock_session = mock.Mock(requests.Session)
+    mock_session.get.return_value.headers = {}
     mock_session.get.return_value.json.side_effect = (raw_session, KeyboardInterrupt())
     with mock.patch("i8t.relay_consumer.time.sleep"):
         with mock.patch("i8t.relay_consumer.print") as mock_print:
-            main(mock_session)
-    assert len(mock_print.call_args_list) == len(raw_session) * 2
+            with mock.patch("sys.argv", ["i8t", "api_url"]):
+                main(mock_session)
     printed = [call[0][0] + "\n" for call in mock_print.call_args_list if not call[1].get("file")]
     assert printed == collected_session
+    # Progress is printed for the first checkpoint and once all are collected
+    progress = [call[0][0] for call in mock_print.call_args_list if call[1].get("file")]
+    assert progress == [
+        "\rCollected 1 checkpoints. Press Ctrl+C to stop.",
+        f"\rCollected {len(raw_session)} checkpoints. Press Ctrl+C to stop.",
+    ]
 
 
 def test_collect_warns_on_exceptions() -> None:
     mock_session = mock.Mock(requests.Session)
+    mock_session.get.return_value.headers = {}
     mock_session.get.return_value.json.side_effect = (
         requests.ConnectionError(),
         KeyboardInterrupt(),
@@ -43,3 +69,298 @@ def test_collect_warns_on_exceptions() -> None:
     with mock.patch("i8t.relay_consumer.print") as mock_print:
         checkpoint_poller.print_forever()
     mock_print.assert_called_once_with("WARNING: ", file=sys.stderr)
+
+
+def test_fetch_after_cursor() -> None:
+    with StandInRelay() as relay, requests.Session() as session:
+        storage = RelayStorage(session, relay.url)
+        fetcher = CheckpointFetcher(relay.url, session)
+        storage.save_batch([make_checkpoint(0), make_checkpoint(1)])
+        assert len(list(fetcher.fetch())) == 2
+        assert not list(fetcher.fetch())
+        # Not modified
+        assert not list(fetcher.fetch())
+        storage.save(make_checkpoint(2))
+        assert [json.loads(line) for line in fetcher.fetch()] == [make_checkpoint(2)]
+    assert relay.requested == ["/checkpoints", "/checkpoints?after=2", "/checkpoints?after=2"]
+
+
+def test_cursor_file_resumes_collection() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cursor_file = CursorFile(os.path.join(tmpdir, "cursor"))
+        assert cursor_file.load() is None
+        with StandInRelay() as relay, requests.Session() as session:
+            storage = RelayStorage(session, relay.url)
+            storage.save(make_checkpoint(0))
+            assert list(CheckpointFetcher(relay.url, session, cursor_file=cursor_file).fetch())
+            storage.save(make_checkpoint(1))
+            restarted = CheckpointFetcher(relay.url, session, cursor_file=cursor_file)
+            assert [json.loads(line) for line in restarted.fetch()] == [make_checkpoint(1)]
+        assert cursor_file.load() == "2"
+
+
+def producer_line(producer: str, seq: int) -> str:
+    return json.dumps({"metadata": {"producer": producer, "seq": seq}, "input": {}, "output": {}})
+
+
+def test_collector_dedups_by_sequence_window() -> None:
+    collector = CheckpointCollector(window=4)
+    seqs = [1, 2, 2, 4, 3, 9, 1, 6, 20, 8]
+    lines = [producer_line("a", seq) for seq in seqs] + [
+        producer_line("b", 5),
+        producer_line("b", 3),
+    ]
+    new = [json.loads(line)["metadata"]["seq"] for line in collector.filter_new(lines)]
+    assert new == [1, 2, 4, 3, 9, 6, 20, 5, 3]
+    assert collector.stats["a"] == ProducerStats(received=7, duplicates=3, missing=13)
+    assert collector.stats["b"] == ProducerStats(received=2, missing=1)
+
+
+def test_collector_window_memory_is_bounded() -> None:
+    collector = CheckpointCollector(window=10)
+    lines = (producer_line("a", seq) for seq in range(1, 1000))
+    assert len(list(collector.filter_new(lines))) == 999
+    # pylint: disable=protected-access
+    assert len(collector._producers["a"]._seen) <= 20
+
+
+def test_collector_forgets_idle_producers() -> None:
+    collector = CheckpointCollector(max_idle_sec=60)
+    with mock.patch("time.monotonic", return_value=0):
+        list(collector.filter_new([producer_line("a", 1), producer_line("b", 1)]))
+    with mock.patch("time.monotonic", return_value=30):
+        list(collector.filter_new([producer_line("b", 2)]))
+    with mock.patch("time.monotonic", return_value=60):
+        list(collector.filter_new([producer_line("c", 1)]))
+    assert list(collector.stats) == ["b", "c"]
+
+
+def test_poller_reports_producer_stats() -> None:
+    fetcher = mock.Mock(CheckpointFetcher)
+    fetcher.fetch_records.side_effect = (
+        [json.loads(producer_line("a", 1)), json.loads(producer_line("a", 3))],
+        KeyboardInterrupt(),
+    )
+    checkpoint_poller = CheckpointPoller(fetcher, CheckpointCollector(), delay_sec=0)
+    with mock.patch("i8t.relay_consumer.print") as mock_print:
+        checkpoint_poller.print_forever()
+    mock_print.assert_called_with(
+        "\nProducer a: 2 received, 0 duplicates, 1 missing.", file=sys.stderr, end=""
+    )
+
+
+def test_collector_dedups_checkpoints_without_sequence() -> None:
+    lines = ['{"metadata": {"location": "a"}}', '{"metadata": {"location": "a"}}', "{}"]
+    assert list(CheckpointCollector().filter_new(lines)) == [lines[0], lines[2]]
+
+
+def test_collector_serializes_only_new_records() -> None:
+    records = [json.loads(producer_line("a", seq)) for seq in (1, 1, 2)]
+    records += [{"metadata": {"location": "a"}}] * 2
+    with mock.patch("i8t.relay_consumer.json.dumps", wraps=json.dumps) as dumps:
+        lines = list(CheckpointCollector().filter_new_records(records))
+    assert lines == [json.dumps(record) for record in records[::2]]
+    # Two new records with sequence numbers, and two lines of records without them
+    assert dumps.call_count == 4
+
+
+@mock.patch.object(CheckpointStreamer, "SAVE_EVERY_SEC", 0)
+def test_stream_resumes_after_reconnect() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cursor_file = CursorFile(os.path.join(tmpdir, "cursor"))
+        with StandInRelay() as relay, requests.Session() as session:
+            storage = RelayStorage(session, relay.url)
+            storage.save(make_checkpoint(0))
+            streamer = CheckpointStreamer(relay.url, session, cursor_file=cursor_file)
+            stream = iter(streamer.fetch())
+            assert json.loads(next(stream)) == make_checkpoint(0)
+            # Stored while the stream is open
+            storage.save_batch([make_checkpoint(1), make_checkpoint(2)])
+            assert [json.loads(next(stream)) for _ in range(2)] == [
+                make_checkpoint(1),
+                make_checkpoint(2),
+            ]
+            # Saved once the record after it is requested
+            assert cursor_file.load() == "2"
+            assert not list(stream)
+            assert cursor_file.load() == "3"
+            storage.save(make_checkpoint(3))
+            restarted = CheckpointStreamer(relay.url, session, cursor_file=cursor_file)
+            assert [json.loads(line) for line in restarted.fetch()] == [make_checkpoint(3)]
+        assert relay.requested == ["/checkpoints", "/checkpoints?after=3"]
+
+
+def test_stream_decodes_utf8() -> None:
+    checkpoint = {"metadata": {}, "input": {"q": "héllo"}, "output": "✓"}
+    with StandInRelay() as relay, requests.Session() as session:
+        relay.stream_idle_sec = 0
+        RelayStorage(session, relay.url).save(checkpoint)
+        streamer = CheckpointStreamer(relay.url, session)
+        assert [json.loads(line) for line in streamer.fetch()] == [checkpoint]
+
+
+def test_iter_events() -> None:
+    lines = [": comment", "id: 1", "data: {", "data: }", "", "", "event: x", "data:2", ""]
+    assert list(iter_events(lines)) == [("1", "{\n}"), (None, "2")]
+
+
+class InterruptingWriter(PartitionedWriter):
+    def __init__(self, directory: str, limit: int) -> None:
+        super().__init__(directory)
+        self.written = 0
+        self._limit = limit
+
+    def write(self, source: str, line: str) -> None:
+        super().write(source, line)
+        self.written += 1
+        if self.written == self._limit:
+            raise KeyboardInterrupt()
+
+
+@mock.patch.object(MultiSourceCollector, "REPORT_EVERY_SEC", 0.01)
+def test_multi_source_collector_writes_file_per_source() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with StandInRelay() as first, StandInRelay() as second:
+            with requests.Session() as session:
+                RelayStorage(session, first.url).save_batch(
+                    [make_checkpoint(0), make_checkpoint(1)]
+                )
+                RelayStorage(session, second.url).save(make_checkpoint(2))
+            pollers = [
+                CheckpointPoller(
+                    CheckpointFetcher(relay.url, requests.Session()),
+                    CheckpointCollector(),
+                    delay_sec=0.01,
+                    name=name,
+                )
+                for name, relay in (("first", first), ("second", second))
+            ]
+            multi_source_collector = MultiSourceCollector(pollers, InterruptingWriter(tmpdir, 3))
+            with mock.patch("i8t.relay_consumer.print") as mock_print:
+                multi_source_collector.run()
+        for name, expected in (("first", [0, 1]), ("second", [2])):
+            (path,) = glob.glob(os.path.join(tmpdir, name, "*.jsonl"))
+            with open(path, encoding="utf-8") as fobj:
+                assert [json.loads(line) for line in fobj] == [make_checkpoint(i) for i in expected]
+    assert multi_source_collector.stats["first"].collected == 2
+    reports = [call[0][0] for call in mock_print.call_args_list]
+    assert any(report.startswith("second: 1 collected,") for report in reports)
+
+
+@mock.patch.object(MultiSourceCollector, "REPORT_EVERY_SEC", 0.01)
+def test_multi_source_collector_saves_cursor_of_written_lines() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cursor_file = CursorFile(os.path.join(tmpdir, "cursor"))
+        with StandInRelay() as relay, requests.Session() as session:
+            RelayStorage(session, relay.url).save_batch([make_checkpoint(i) for i in range(5)])
+            poller = CheckpointPoller(
+                CheckpointFetcher(relay.url, requests.Session(), cursor_file=cursor_file),
+                CheckpointCollector(),
+                name="relay",
+            )
+            writer = InterruptingWriter(tmpdir, 1)
+            with mock.patch("i8t.relay_consumer.print"):
+                MultiSourceCollector([poller], writer).run()
+        # Lines queued before the interruption are written along with the cursor after them
+        assert writer.written == 5
+        assert cursor_file.load() == "5"
+
+        poller = CheckpointPoller(
+            CheckpointFetcher("api_url", mock.Mock(requests.Session), cursor_file=cursor_file),
+            CheckpointCollector(),
+        )
+        failing = mock.Mock(SourceWriter)
+        failing.write.side_effect = OSError()
+        collector = MultiSourceCollector([poller], failing)
+        collector._put_cursor(poller, "6")  # pylint: disable=protected-access
+        collector._put(poller, ("", "line", None))  # pylint: disable=protected-access
+        with mock.patch.object(poller, "iter_lines", return_value=[]), pytest.raises(OSError):
+            collector.run()
+        failing.close.assert_called_once_with()
+        assert cursor_file.load() == "5"
+
+
+def test_source_names() -> None:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "sources.txt")
+        with open(path, "wt", encoding="utf-8") as fobj:
+            fobj.write(
+                "# Tenants\nshop http://relay/checkpoints/shop\n\nhttp://relay/checkpoints/a\n"
+            )
+        sources = read_sources(path)
+    assert source_names(
+        [("", "http://relay/checkpoints/a/"), ("", "http://host:80")] + sources
+    ) == [
+        ("a", "http://relay/checkpoints/a/"),
+        ("host_80", "http://host:80"),
+        ("shop", "http://relay/checkpoints/shop"),
+        ("a-2", "http://relay/checkpoints/a"),
+    ]
+
+
+def test_main_collects_from_many_sources() -> None:
+    argv = ["i8t", "http://relay/a", "http://relay/b", "--cursor-dir", "cursors", "--stream"]
+    with mock.patch("sys.argv", argv), mock.patch("os.makedirs"), mock.patch.object(
+        MultiSourceCollector, "run", autospec=True
+    ) as mock_run:
+        main()
+    multi_source_collector = mock_run.call_args[0][0]
+    assert list(multi_source_collector.stats) == ["a", "b"]
+
+
+def test_main_writes_partitioned_files() -> None:
+    argv = ["i8t", "http://relay/a", "--output-dir", "out", "--compress", "gzip"]
+    argv += ["--partition", "{date}", "--rotate-mb", "1", "--rotate-min", "10"]
+    with mock.patch("sys.argv", argv), mock.patch.object(
+        MultiSourceCollector, "__init__", return_value=None
+    ) as mock_init, mock.patch.object(MultiSourceCollector, "run"):
+        main()
+    writer = mock_init.call_args[0][1]
+    assert isinstance(writer, PartitionedWriter)
+    # pylint: disable-next=protected-access
+    assert writer._policy == OutputPolicy("{date}", 1024 * 1024, 600, codec=mock.ANY)
+
+
+@mock.patch("sys.stderr", new_callable=mock.MagicMock)
+def test_main_validates_sources(_) -> None:
+    for argv in (
+        ["i8t"],
+        ["i8t", "http://relay/a", "http://relay/b", "--cursor-file", "c"],
+        ["i8t", "http://relay/a", "--output-dir", "out", "--partition", "{tenant}"],
+    ):
+        with mock.patch("sys.argv", argv), pytest.raises(SystemExit):
+            main()
+
+
+@mock.patch.object(MultiSourceCollector, "REPORT_EVERY_SEC", 0.01)
+def test_multi_source_collector_reports_idle_sources() -> None:
+    poller = mock.Mock(CheckpointPoller, checkpoint_collector=CheckpointCollector())
+    poller.name = "idle"
+    poller.iter_lines.return_value = []
+    writer = mock.Mock(SourceWriter)
+    writer.flush.side_effect = (None, KeyboardInterrupt())
+    with mock.patch("i8t.relay_consumer.print") as mock_print:
+        MultiSourceCollector([poller], writer).run()
+    mock_print.assert_any_call("idle: 0 collected, 0.0/s, lag -, 0 missing", file=sys.stderr)
+    poller.stop.assert_called_once_with()
+    writer.close.assert_called_once_with()
+
+
+@mock.patch.object(MultiSourceCollector, "REPORT_EVERY_SEC", 0.01)
+@mock.patch.object(MultiSourceCollector, "QUEUE_SIZE", 1)
+def test_multi_source_collector_abandons_lines_after_stop() -> None:
+    poller = mock.Mock(CheckpointPoller, stopped=True)
+    poller.name = "full"
+    poller.iter_lines.return_value = ["first", "second"]
+    multi_source_collector = MultiSourceCollector([poller], SourceWriter())
+    multi_source_collector._fetch(poller)  # pylint: disable=protected-access
+    assert multi_source_collector.stats["full"].collected == 0
+
+
+def test_stopped_poller_does_not_poll() -> None:
+    fetcher = mock.Mock(CheckpointFetcher)
+    checkpoint_poller = CheckpointPoller(fetcher, CheckpointCollector())
+    checkpoint_poller.stop()
+    assert checkpoint_poller.stopped
+    assert not list(checkpoint_poller.iter_lines())
+    fetcher.fetch_records.assert_not_called()
@@ -0,0 +1,61 @@
+import json
+import unittest
+
+import requests
+
+from .compression import (
+    Codec,
+    GzipCodec,
+    ZstdCodec,
+    decode_json,
+    train_zstd_dictionary,
+    zstandard,
+)
+from .relay_consumer import CheckpointFetcher
+from .relay_storage import RelayConverter, RelayStorage
+from .testing.stand_in_relay import StandInRelay, make_checkpoint
+
+
+class TestCompression(unittest.TestCase):
+    def roundtrip(self, codec: Codec) -> StandInRelay:
+        with StandInRelay(codec) as relay:
+            with requests.Session() as session:
+                storage = RelayStorage(session, relay.url, codec=codec)
+                storage.save(make_checkpoint(0))
+                storage.save_batch([make_checkpoint(1), make_checkpoint(2)])
+                fetched = list(CheckpointFetcher(relay.url, session, codec=codec).fetch())
+        self.assertEqual(
+            [json.loads(line) for line in fetched], [make_checkpoint(i) for i in range(3)]
+        )
+        return relay
+
+    def test_gzip(self):
+        relay = self.roundtrip(GzipCodec())
+        self.assertEqual(relay.received[0][:2], b"\x1f\x8b")
+
+    @unittest.skipUnless(zstandard, "zstandard is not installed")
+    def test_zstd(self):
+        self.roundtrip(ZstdCodec())
+
+    @unittest.skipUnless(zstandard, "zstandard is not installed")
+    def test_zstd_dictionary(self):
+        samples = [
+            RelayConverter.encode(RelayConverter.to_relay(make_checkpoint(i))) for i in range(500)
+        ]
+        dictionary = train_zstd_dictionary(samples, dict_size=4096)
+        relay = self.roundtrip(ZstdCodec(dictionary=dictionary))
+        plain = len(ZstdCodec().compress(samples[0]))
+        self.assertLess(len(relay.received[0]), plain)
+
+    def test_rejects_unknown_encoding(self):
+        response = requests.Response()
+        response.headers["Content-Encoding"] = "compress"
+        with self.assertRaisesRegex(ValueError, "Unsupported Content-Encoding: compress"):
+            decode_json(response)
+
+    def test_uncompressed(self):
+        with StandInRelay() as relay:
+            with requests.Session() as session:
+                RelayStorage(session, relay.url).save(make_checkpoint(0))
+                fetched = list(CheckpointFetcher(relay.url, session).fetch())
+        self.assertEqual([json.loads(line) for line in fetched], [make_checkpoint(0)])
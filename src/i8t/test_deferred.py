@@ -0,0 +1,77 @@
+import threading
+import unittest
+from unittest import mock
+
+from .deferred import DeferredWorker, logger
+
+
+class TestDeferredWorker(unittest.TestCase):
+    def test_runs_submitted_calls(self):
+        worker = DeferredWorker()
+        func = mock.Mock()
+        worker.submit(func, 1, 2)
+        worker.close()
+        func.assert_called_once_with(1, 2)
+
+    def test_drops_when_full(self):
+        started, release = threading.Event(), threading.Event()
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        worker = DeferredWorker(max_queue_size=1)
+        worker.submit(block)
+        started.wait(5)
+        worker.submit(mock.Mock())
+        worker.submit(mock.Mock())
+        self.assertEqual(worker.queue_depth, 1)
+        self.assertEqual(worker.dropped, 1)
+        release.set()
+        worker.close()
+
+    def test_close_gives_up_on_full_queue(self):
+        started, release = threading.Event(), threading.Event()
+        self.addCleanup(release.set)
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        worker = DeferredWorker(max_queue_size=1)
+        worker.submit(block)
+        started.wait(5)
+        worker.submit(mock.Mock())
+        with self.assertLogs(logger=logger, level="WARNING"):
+            worker.close(timeout=0.05)
+        func = mock.Mock()
+        worker.submit(func)
+        self.assertEqual(worker.dropped, 1)
+        release.set()
+        func.assert_not_called()
+
+    def test_logs_errors(self):
+        worker = DeferredWorker()
+        with self.assertLogs(logger=logger, level="ERROR") as log:
+            worker.submit(mock.Mock(side_effect=ValueError()))
+            worker.close()
+        self.assertIn("Error encoding checkpoint", log.output[0])
+
+    def test_snapshot_policies(self):
+        args = ([1], {"a": [2]})
+        reference = DeferredWorker(DeferredWorker.REFERENCE).snapshot(args)
+        shallow = DeferredWorker(DeferredWorker.SHALLOW).snapshot(args)
+        deep = DeferredWorker(DeferredWorker.DEEP).snapshot(args)
+        args[0].append(3)
+        args[1]["a"].append(4)
+        self.assertEqual(reference, ([1, 3], {"a": [2, 4]}))
+        self.assertEqual(shallow, ([1], {"a": [2, 4]}))
+        self.assertEqual(deep, ([1], {"a": [2]}))
+
+    def test_shallow_snapshot(self):
+        worker = DeferredWorker(DeferredWorker.SHALLOW)
+        items = [1]
+        self.assertEqual(worker.snapshot({"items": items}), {"items": [1]})
+        self.assertIsNot(worker.snapshot({"items": items})["items"], items)
+        self.assertIsNot(worker.snapshot(items), items)
+        self.assertEqual(worker.snapshot({1, 2}), {1, 2})
@@ -0,0 +1,100 @@
+import ast
+import dataclasses
+import datetime
+import enum
+import json
+import math
+import pickle
+import unittest
+import uuid
+from unittest import mock
+
+from werkzeug.datastructures import ImmutableMultiDict
+
+from . import encoders
+from .relay_storage import RelayConverter
+
+
+@dataclasses.dataclass
+class Point:
+    x: int
+
+
+class Color(enum.Enum):
+    RED = 1
+
+
+class TestEncoders(unittest.TestCase):
+    def test_roundtrip(self):
+        obj = {"args": [1, 2.5, "ы", None, True], "kwargs": {"nested": {"list": []}}}
+        for hint in ("json", "dill", "orjson", "msgpack"):
+            with self.subTest(hint=hint):
+                encoder = encoders.get_encoder(hint)
+                self.assertEqual(encoder.decode(encoder.encode(obj)), obj)
+
+    def test_missing_hint_is_dill(self):
+        self.assertIs(encoders.get_encoder(""), encoders.DILL)
+
+    def test_orjson_rejects_types_json_treats_differently(self):
+        encoder = encoders.get_encoder("orjson")
+        for obj in (
+            Point(1),
+            datetime.date(2024, 1, 1),
+            ImmutableMultiDict([("a", "1")]),
+            {"x": [float("nan")]},
+            (float("inf"),),
+            Color.RED,
+            uuid.UUID(int=1),
+        ):
+            with self.subTest(obj=obj):
+                with self.assertRaises(encoder.errors):
+                    encoder.encode(obj)
+
+    def test_dumps_matches_stdlib_semantics(self):
+        for obj in (
+            {"a": [1, 2.5, "x"], "b": None},
+            {"args": ImmutableMultiDict([("a", "1"), ("a", "2")])},
+            {1: "int key"},
+            {"x": float("nan")},
+            [Color.RED.value, -math.inf],
+        ):
+            with self.subTest(obj=obj):
+                # repr compares NaN too
+                self.assertEqual(
+                    repr(json.loads(encoders.dumps(obj))), repr(json.loads(json.dumps(obj)))
+                )
+
+    def test_relay_converter_keeps_nan(self):
+        checkpoint = RelayConverter.from_relay(
+            RelayConverter.to_relay({"input": {"x": math.nan}, "output": None})
+        )
+        self.assertTrue(math.isnan(checkpoint["input"]["x"]))
+
+    def test_loads_falls_back_to_stdlib(self):
+        self.assertTrue(math.isnan(encoders.loads("NaN")))
+        self.assertEqual(encoders.loads('{"a": [1]}'), {"a": [1]})
+
+    def test_register_encoder(self):
+        class ReprEncoder(encoders.Encoder):
+            hint = "repr"
+
+            def encode(self, obj):
+                return repr(obj)
+
+            def decode(self, data):
+                return ast.literal_eval(data)
+
+        encoders.register_encoder(ReprEncoder())
+        self.addCleanup(encoders.ENCODERS.pop, "repr")
+        encoder = encoders.get_encoder("repr")
+        self.assertEqual(encoder.decode(encoder.encode({1: (2,)})), {1: (2,)})
+
+    def test_pickled_payload_skips_base85(self):
+        text = encoders.DILL.encode({1, 2})
+        payload = pickle.loads(
+            pickle.dumps(encoders.PickledPayload(text, encoders.DILL.unwrap(text)))
+        )
+        self.assertEqual(payload, text)
+        with mock.patch("base64.b85decode") as b85decode:
+            self.assertEqual(encoders.DILL.decode(payload), {1, 2})
+        b85decode.assert_not_called()
@@ -23,3 +23,8 @@ class TestIntrospectInMemoryStorage(unittest.TestCase):
             '"finish_ts": 5, "input": {"input": "data"}, "output": '
             '{"output": "data"}}\n'
         )
+
+    def test_save_batch_saves_each_checkpoint(self):
+        storage = IntrospectInMemoryStorage()
+        storage.save_batch([{"n": 1}, {"n": 2}])
+        assert storage.checkpoints == [{"n": 1}, {"n": 2}]
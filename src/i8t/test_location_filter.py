@@ -0,0 +1,18 @@
+import unittest
+
+from .location_filter import LocationFilter
+
+
+class TestLocationFilter(unittest.TestCase):
+    def test_allows_everything_by_default(self):
+        self.assertTrue(LocationFilter()("app.module.func"))
+
+    def test_deny_takes_precedence(self):
+        location_filter = LocationFilter(allow=["app.*", "lib.api.*"], deny=["app.hot.*"])
+        self.assertTrue(location_filter("app.views.index"))
+        self.assertTrue(location_filter("lib.api.call"))
+        self.assertFalse(location_filter("app.hot.loop"))
+        self.assertFalse(location_filter("lib.internal.call"))
+
+    def test_empty_allow_list(self):
+        self.assertFalse(LocationFilter(allow=[])("app.func"))
@@ -0,0 +1,144 @@
+import threading
+import unittest
+from unittest import mock
+
+import requests
+
+from .batching_storage import BatchingStorage
+from .client import IntrospectClient
+from .deferred import DeferredWorker
+from .inmemory_storage import IntrospectInMemoryStorage
+from .instrument.decorator_introspect import DecoratorIntrospect, introspect
+from .metrics import (
+    CAPTURE_SECONDS,
+    CHECKPOINTS,
+    DILL_FALLBACKS,
+    DROPPED,
+    ENCODED,
+    QUEUE_DEPTH,
+    SEND_FAILURES,
+    SEND_SECONDS,
+    SERIALIZED_BYTES,
+    MetricsRegistry,
+)
+from .relay_storage import RelayStorage
+
+
+class Collected:
+    def collect(self):
+        yield QUEUE_DEPTH, "test", 3
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self) -> None:
+        self.metrics = MetricsRegistry()
+
+    def test_merges_threads(self):
+        def work():
+            for _ in range(100):
+                self.metrics.inc(ENCODED, "json")
+            self.metrics.observe(SEND_SECONDS, "relay", 0.005)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Registers a new thread, merging finished ones
+        threading.Thread(target=self.metrics.inc, args=(ENCODED, "dill")).start()
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot[ENCODED]["json"], 400)
+        self.assertEqual(snapshot[SEND_SECONDS]["relay"]["count"], 4)
+        self.assertEqual(snapshot[SEND_SECONDS]["relay"]["buckets"]["0.01"], 4)
+
+    def test_collectors_are_dropped_with_owner(self):
+        collected = Collected()
+        self.metrics.add_collector(collected.collect)
+        self.assertEqual(self.metrics.snapshot(), {QUEUE_DEPTH: {"test": 3}})
+        del collected
+        self.assertEqual(self.metrics.snapshot(), {})
+
+    def test_hooks(self):
+        hook = mock.Mock()
+        self.metrics.add_hook(hook)
+        self.metrics.inc(SERIALIZED_BYTES, "json", 10)
+        hook.assert_called_once_with(SERIALIZED_BYTES, "json", 10)
+        self.metrics.observe(SEND_SECONDS, "relay", 0.5)
+        hook.assert_called_with(SEND_SECONDS, "relay", 0.5)
+
+    def test_prometheus_text(self):
+        self.metrics.inc(SEND_FAILURES, 'a"b')
+        self.metrics.observe(CAPTURE_SECONDS, "loc", 0.5)
+        text = self.metrics.to_prometheus()
+        self.assertIn(
+            "# TYPE i8t_send_failures_total counter\n"
+            'i8t_send_failures_total{storage="a\\"b"} 1.0\n',
+            text,
+        )
+        self.assertIn('i8t_capture_seconds_bucket{location="loc",le="0.1"} 0.0\n', text)
+        self.assertIn('i8t_capture_seconds_bucket{location="loc",le="1.0"} 1.0\n', text)
+        self.assertIn('i8t_capture_seconds_bucket{location="loc",le="+Inf"} 1.0\n', text)
+        self.assertIn('i8t_capture_seconds_count{location="loc"} 1.0\n', text)
+
+    def test_reset(self):
+        self.metrics.inc(ENCODED, "json")
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot(), {})
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.metrics = MetricsRegistry()
+
+    def test_decorated_calls(self):
+        client = IntrospectClient(
+            "", "test", storage=IntrospectInMemoryStorage(), metrics=self.metrics
+        )
+        decorator = DecoratorIntrospect(client)
+        decorator.register()
+        self.addCleanup(decorator.unregister)
+        location = f"{__name__}.identity"
+        identity(1)
+        identity(object())
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot[CHECKPOINTS], {location: 2})
+        self.assertEqual(snapshot[CAPTURE_SECONDS][location]["count"], 2)
+        self.assertEqual(snapshot[ENCODED], {"json": 2, "dill": 2})
+        self.assertEqual(snapshot[DILL_FALLBACKS], {location: 2})
+        self.assertEqual(set(snapshot[SERIALIZED_BYTES]), {"json", "dill"})
+
+    def test_deferred_queue_depth(self):
+        worker = DeferredWorker()
+        self.addCleanup(worker.close)
+        client = IntrospectClient("", "test", deferred_worker=worker, metrics=self.metrics)
+        self.assertEqual(self.metrics.snapshot()[QUEUE_DEPTH], {"deferred": 0})
+        del client
+        self.assertEqual(self.metrics.snapshot(), {})
+
+    def test_relay_failures(self):
+        session = mock.Mock(requests.Session)
+        session.post.return_value.status_code = 500
+        storage = RelayStorage(session, "http://example.com", metrics=self.metrics)
+        storage.save({"input": 1, "output": 2})
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot[SEND_FAILURES], {"relay": 1})
+        self.assertEqual(snapshot[SEND_SECONDS]["relay"]["count"], 1)
+
+    def test_batching_storage_gauges(self):
+        session = mock.Mock(requests.Session)
+        session.post.side_effect = requests.ConnectionError
+        relay = RelayStorage(session, "http://example.com", metrics=self.metrics)
+        storage = BatchingStorage(relay)
+        client = IntrospectClient("", "test", storage=storage, metrics=self.metrics)
+        self.assertEqual(self.metrics.snapshot()[QUEUE_DEPTH], {"BatchingStorage": 0})
+        storage.save({"input": 1, "output": 2})
+        storage.close()
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot[SEND_FAILURES], {"relay": 1})
+        self.assertEqual(snapshot[DROPPED], {"BatchingStorage": 1})
+        del client
+
+
+@introspect
+def identity(value):
+    return value
@@ -0,0 +1,46 @@
+import pickle
+import unittest
+from unittest import mock
+
+import dill  # type: ignore
+
+from . import pickling
+
+
+class Frame:
+    def __init__(self, data) -> None:
+        self.data = data
+
+    def __reduce__(self):
+        raise AssertionError("Pickled without reducer")
+
+
+def reduce_frame(frame: Frame):
+    return Frame, (pickle.PickleBuffer(frame.data),)
+
+
+@mock.patch.dict("i8t.pickling._REDUCERS", {Frame: reduce_frame})
+class TestPickling(unittest.TestCase):
+    def test_uses_registered_reducer(self):
+        frame = pickling.loads(pickling.dumps({"frame": Frame(bytearray(b"abc"))}))["frame"]
+        self.assertEqual(bytes(frame.data), b"abc")
+
+    def test_passes_buffers_out_of_band(self):
+        buffers = []
+        data = pickling.dumps(Frame(bytearray(b"x" * 1000)), buffer_callback=buffers.append)
+        self.assertLess(len(data), 1000)
+        frame = pickling.loads(data, [buffer.raw() for buffer in buffers])
+        self.assertIs(frame.data.obj, buffers[0].raw().obj)
+
+
+class TestPicklingWithoutReducers(unittest.TestCase):
+    def test_matches_dill(self):
+        obj = {"args": (1, [2.5], {"a"}), "kwargs": {"func": len}}
+        self.assertEqual(pickling.dumps(obj), dill.dumps(obj, recurse=True))
+
+    def test_register_reducer(self):
+        with mock.patch.dict("i8t.pickling._REDUCERS", clear=True):
+            with self.assertRaises(AssertionError):
+                pickling.dumps(Frame(b"abc"))
+            pickling.register_reducer(Frame, reduce_frame)
+            self.assertEqual(pickling.loads(pickling.dumps(Frame(b"abc"))).data, b"abc")
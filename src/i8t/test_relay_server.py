@@ -0,0 +1,225 @@
+import json
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from typing import List, Optional
+from unittest import mock
+
+import requests
+
+from .cli import cli
+from .compression import GzipCodec, ZstdCodec
+from .relay_consumer import CURSOR_HEADER, CheckpointFetcher, CheckpointStreamer
+from .relay_server import Query, RelayApp, RelayPolicy, RelayServer, RelayStore, TenantLog
+from .relay_storage import RelayConverter, RelayStorage
+from .testing.stand_in_relay import make_checkpoint
+
+
+def relay_records(start: int, stop: int) -> List[dict]:
+    return [RelayConverter.to_relay(make_checkpoint(i)) for i in range(start, stop)]
+
+
+class TestTenantLog(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmpdir.cleanup)
+        self.directory = tmpdir.name
+        self.log = self.open()
+
+    def open(self, policy: Optional[RelayPolicy] = None) -> TenantLog:
+        log = TenantLog(self.directory, policy or RelayPolicy())
+        self.addCleanup(log.close)
+        return log
+
+    def read(self, log: TenantLog, **kwargs) -> List[int]:
+        records, _ = log.read(Query(**kwargs), 1000)
+        return [json.loads(line)["metadata"]["start_ts"] for _, line in records]
+
+    def test_reads_after_cursor(self):
+        self.assertEqual(self.log.append(relay_records(0, 5)), 5)
+        records, cursor = self.log.read(Query(after=2), 2)
+        self.assertEqual([seq for seq, _ in records], [2, 3])
+        self.assertEqual(cursor, 4)
+        self.assertEqual(self.log.read(Query(after=4), 10)[1], 5)
+        self.assertEqual(self.log.read(Query(after=7), 10), ([], 7))
+
+    def test_filters_by_location_context_and_time(self):
+        records = relay_records(0, 6)
+        for i, record in enumerate(records):
+            record["metadata"].update(location=f"loc{i % 2}", context=f"ctx{i // 3}")
+        self.log.append(records)
+        self.assertEqual(self.read(self.log, location="loc1"), [1, 3, 5])
+        self.assertEqual(self.read(self.log, location="loc1", after=2), [3, 5])
+        self.assertEqual(self.read(self.log, context="ctx1", location="loc0"), [4])
+        self.assertEqual(self.read(self.log, since=2, until=4), [2, 3])
+        self.assertEqual(self.read(self.log, since=4, location="loc0"), [4])
+        self.assertEqual(self.read(self.log, location="missing"), [])
+
+    def test_time_index_keeps_out_of_order_records(self):
+        self.log.append([relay_records(i, i + 1)[0] for i in (5, 1, 3)])
+        self.assertEqual(self.read(self.log, since=2), [5, 3])
+        self.assertEqual(self.read(self.log, until=4, after=1), [1, 3])
+
+    def test_limit_of_filtered_read_sets_cursor(self):
+        self.log.append(relay_records(0, 10))
+        records, cursor = self.log.read(Query(since=3), 2)
+        self.assertEqual([seq for seq, _ in records], [3, 4])
+        self.assertEqual(cursor, 5)
+
+    def test_rolls_segments_and_reloads(self):
+        log = self.open(RelayPolicy(segment_bytes=500))
+        log.append(relay_records(0, 4))
+        log.append(relay_records(4, 8))
+        log.close()
+        self.assertGreater(len(os.listdir(self.directory)), 2)
+        reopened = self.open(RelayPolicy(segment_bytes=500, fsync=True))
+        self.assertEqual(reopened.total, 8)
+        self.assertEqual(self.read(reopened, since=3, until=6), [3, 4, 5])
+        reopened.append(relay_records(8, 9))
+        self.assertEqual(self.read(reopened), list(range(9)))
+
+    def test_truncates_torn_record(self):
+        self.log.append(relay_records(0, 2))
+        self.log.close()
+        (segment,) = os.listdir(self.directory)
+        with open(os.path.join(self.directory, segment), "ab") as fobj:
+            fobj.write(b'{"metadata": {')
+        with self.assertLogs("i8t.relay_server", "WARNING"):
+            reopened = self.open()
+        reopened.append(relay_records(2, 3))
+        self.assertEqual(self.read(reopened), [0, 1, 2])
+
+    def test_wait_returns_on_append(self):
+        timer = threading.Timer(0.05, self.log.append, [relay_records(0, 1)])
+        timer.start()
+        self.addCleanup(timer.join)
+        self.assertTrue(self.log.wait(0, 5))
+        self.assertFalse(self.log.wait(1, 0.01))
+
+
+class TestRelayServer(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmpdir.cleanup)
+        self.directory = tmpdir.name
+        self.store = RelayStore(
+            self.directory, RelayPolicy(max_limit=3, keepalive_sec=0.05, compress_bytes=100)
+        )
+        server = RelayServer(("127.0.0.1", 0), RelayApp(self.store))
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.store.close)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.address = ("127.0.0.1", server.server_port)
+        self.url = f"http://127.0.0.1:{server.server_port}/api/tenant"
+        self.session = requests.Session()
+        self.addCleanup(self.session.close)
+
+    def test_fetches_stored_checkpoints_in_pages(self):
+        storage = RelayStorage(self.session, self.url)
+        storage.save(make_checkpoint(0))
+        storage.save_batch([make_checkpoint(1), make_checkpoint(2), make_checkpoint(3)])
+        fetcher = CheckpointFetcher(self.url, self.session)
+        first_page = [json.loads(line) for line in fetcher.fetch()]
+        self.assertEqual(first_page, [make_checkpoint(i) for i in range(3)])
+        self.assertEqual(fetcher.cursor, "3")
+        self.assertEqual(len(list(fetcher.fetch())), 1)
+        self.assertEqual(list(fetcher.fetch()), [])
+        response = self.session.get(
+            self.url, params={"after": 4}, headers={"If-None-Match": '"4-4"'}
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_decodes_and_encodes_compressed_bodies(self):
+        for codec in (GzipCodec(), ZstdCodec()):
+            with self.subTest(codec.name):
+                RelayStorage(self.session, self.url, codec=codec).save_batch(
+                    [make_checkpoint(i) for i in range(3)]
+                )
+                response = self.session.get(self.url, headers={"Accept-Encoding": codec.name})
+                self.assertEqual(response.headers.get("Content-Encoding"), codec.name)
+                self.assertEqual(len(list(CheckpointFetcher(self.url, self.session).fetch())), 3)
+
+    def test_streams_appended_checkpoints(self):
+        self.store.tenant("tenant").append(relay_records(0, 2))
+        streamer = CheckpointStreamer(self.url, self.session)
+        streamer.cursor = "1"
+        stream = streamer.fetch()
+        self.assertEqual(json.loads(next(stream)), make_checkpoint(1))
+        threading.Timer(0.1, self.store.tenant("tenant").append, [relay_records(2, 3)]).start()
+        self.assertEqual(json.loads(next(stream)), make_checkpoint(2))
+        stream.close()
+
+    def test_filters_by_query(self):
+        self.store.tenant("tenant").append(relay_records(0, 5))
+        response = self.session.get(self.url, params={"since": 1, "until": 3})
+        self.assertEqual([record["metadata"]["start_ts"] for record in response.json()], [1, 2])
+        self.assertEqual(response.headers[CURSOR_HEADER], "5")
+
+    def test_rejects_invalid_requests(self):
+        self.assertEqual(self.session.get(self.url, params={"after": "x"}).status_code, 400)
+        self.assertEqual(self.session.get(self.url, params={"after": -1}).status_code, 400)
+        self.assertEqual(self.session.post(self.url, json=[1]).status_code, 400)
+        self.assertEqual(
+            self.session.post(self.url, data=b"{}", headers={"Content-Encoding": "br"}).status_code,
+            400,
+        )
+        self.assertEqual(self.session.get(self.url + "/.hidden").status_code, 404)
+        self.assertEqual(self.session.delete(self.url).status_code, 405)
+
+    def test_creates_tenants_only_on_post(self):
+        tenant_path = os.path.join(self.directory, "tenant")
+        for headers in ({}, {"Accept": "text/event-stream"}):
+            response = self.session.get(self.url, params={"after": 2}, headers=headers)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.session.get(self.url + "/favicon.ico").json(), [])
+        self.assertEqual(response.text, ": connected\n\n")
+        self.assertFalse(os.path.exists(tenant_path))
+        self.assertEqual(list(CheckpointFetcher(self.url, self.session).fetch()), [])
+
+        RelayStorage(self.session, self.url).save(make_checkpoint(0))
+        self.assertTrue(os.path.isdir(tenant_path))
+        # Tenants stored before a restart are found on disk
+        restarted = RelayStore(self.directory)
+        self.addCleanup(restarted.close)
+        self.assertIsNotNone(restarted.find("tenant"))
+
+    def test_rejects_malformed_request_lines(self):
+        for request_line, status in ((b"GARBAGE", b"400"), (b"GET /" + b"x" * 70000, b"414")):
+            with self.subTest(status=status), socket.create_connection(self.address) as sock:
+                sock.sendall(request_line + b"\r\n\r\n")
+                self.assertIn(status, sock.recv(1024).split(b"\r\n")[0])
+
+    def test_sends_uncompressed_response_by_default(self):
+        self.store.tenant("tenant").append(relay_records(0, 3))
+        response = self.session.get(self.url, headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(len(response.json()), 3)
+
+
+def test_main_serves_directory(tmp_path, capsys) -> None:
+    argv = ["i8t", "serve", str(tmp_path), "--port", "0", "--segment-mb", "1"]
+    with mock.patch("sys.argv", argv), mock.patch(
+        "i8t.relay_server.RelayServer.serve_forever", side_effect=KeyboardInterrupt
+    ):
+        cli()
+    assert "Serving relay on http://127.0.0.1:" in capsys.readouterr().out
+
+
+def test_server_chunks_responses_without_length() -> None:
+    def app(_, start_response):
+        start_response("200 OK", [("Content-Type", "text/plain")])
+        return iter([b"first", b"", b"second"])
+
+    server = RelayServer(("127.0.0.1", 0), app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        response = requests.get(f"http://127.0.0.1:{server.server_port}/", timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert response.headers["Transfer-Encoding"] == "chunked"
+    assert response.text == "firstsecond"
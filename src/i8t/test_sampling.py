@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+
+from .sampling import AdaptiveSampler, SamplingBudget, _fair_share
+
+
+class TestFairShare(unittest.TestCase):
+    def test_small_demands_satisfied(self):
+        self.assertEqual(
+            _fair_share({"a": 1.0, "b": 10.0, "c": 10.0}, 9.0), {"a": 1.0, "b": 4.0, "c": 4.0}
+        )
+
+
+@mock.patch("random.random", return_value=0.5)
+class TestAdaptiveSampler(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        patcher = mock.patch("time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_rates(self, sampler: AdaptiveSampler, expected: dict) -> None:
+        rates = sampler.rates
+        self.assertEqual(rates.keys(), expected.keys())
+        for location, rate in expected.items():
+            self.assertAlmostEqual(rates[location], rate)
+
+    def run_window(self, sampler: AdaptiveSampler, calls: dict, cost_sec: float) -> None:
+        for location, count in calls.items():
+            for _ in range(count):
+                if sampler.sample(location):
+                    sampler.record(location, cost_sec)
+        self.now += 1.0
+
+    def test_limits_overhead_of_hot_locations(self, _):
+        sampler = AdaptiveSampler(SamplingBudget(max_overhead=0.02))
+        self.run_window(sampler, {"hot": 1000, "cold": 10}, 0.001)
+        sampler.sample("cold")
+        self.assert_rates(sampler, {"hot": 0.01, "cold": 1.0})
+
+    def test_limits_checkpoint_rate(self, _):
+        sampler = AdaptiveSampler(SamplingBudget(max_overhead=1, max_checkpoints_per_sec=100))
+        self.run_window(sampler, {"hot": 1000, "cold": 10}, 0.0)
+        self.assertEqual(sampler.sample("hot"), 0.0)
+        self.assert_rates(sampler, {"hot": 0.09, "cold": 1.0})
+
+    def test_keeps_minimal_rate(self, random_mock):
+        sampler = AdaptiveSampler(SamplingBudget(max_overhead=0.0001, min_rate=0.01))
+        self.run_window(sampler, {"hot": 1000}, 0.001)
+        random_mock.return_value = 0.001
+        self.assertEqual(sampler.sample("hot"), 0.01)
+
+    def test_skips_adjusting_concurrently(self, _):
+        sampler = AdaptiveSampler(SamplingBudget(max_overhead=0.0001))
+        self.run_window(sampler, {"hot": 1000}, 0.001)
+        # pylint: disable=protected-access
+        with sampler._lock:
+            sampler.sample("hot")
+        sampler._adjust(self.now - 0.5)
+        self.assert_rates(sampler, {"hot": 1.0})
+        sampler.sample("hot")
+        self.assertLess(sampler.rates["hot"], 1.0)
@@ -0,0 +1,141 @@
+import glob
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from .compression import GzipCodec, ZstdCodec, zstandard
+from .session_writers import ACTIVE_SUFFIX, OutputPolicy, PartitionedWriter, SourceWriter
+
+
+def make_line(location: str, start_ts: float) -> str:
+    return json.dumps({"metadata": {"name": "app", "location": location, "start_ts": start_ts}})
+
+
+class TestPartitionedWriter(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmpdir.cleanup)
+        self.directory = tmpdir.name
+
+    def files(self, pattern: str = "**/*") -> list:
+        paths = glob.glob(os.path.join(self.directory, pattern), recursive=True)
+        return sorted(
+            os.path.relpath(path, self.directory) for path in paths if os.path.isfile(path)
+        )
+
+    def read(self, path: str) -> list:
+        with open(os.path.join(self.directory, path), "rb") as fobj:
+            return fobj.read().decode("utf-8").splitlines()
+
+    def test_partitions_by_template(self):
+        writer = PartitionedWriter(self.directory, OutputPolicy("{source}/{date}/{location}"))
+        writer.write("tenant", make_line("app.add", 0))
+        writer.write("tenant", make_line("app/mul", 86400))
+        writer.write("tenant", make_line("app.add", 1))
+        writer.close()
+        partitions = [os.path.dirname(path) for path in self.files()]
+        self.assertEqual(partitions, ["tenant/1970-01-01/app.add", "tenant/1970-01-02/app_mul"])
+        self.assertEqual(len(self.read(self.files("tenant/1970-01-01/*/*")[0])), 2)
+
+    def test_keeps_partitions_inside_directory(self):
+        writer = PartitionedWriter(self.directory, OutputPolicy("{source}/{name}/{location}"))
+        for name, location in (("..", ".."), (".", "../../etc"), ("", ".hidden")):
+            writer.write("..", json.dumps({"metadata": {"name": name, "location": location}}))
+        writer.close()
+        partitions = [os.path.dirname(path) for path in self.files()]
+        self.assertEqual(partitions, ["_/_/_", "_/_/__.._etc", "_/_/_hidden"])
+
+    def test_rejects_unknown_fields(self):
+        with self.assertRaisesRegex(ValueError, "Unknown partition fields: tenant"):
+            PartitionedWriter(self.directory, OutputPolicy("{source}/{tenant}"))
+
+    def test_seals_least_recently_written_partitions(self):
+        writer = PartitionedWriter(
+            self.directory, OutputPolicy("{location}", max_open_files=2, buffer_bytes=1)
+        )
+        for location in ("a", "b", "a", "c", "a"):
+            writer.write("tenant", make_line(location, 0))
+        self.assertEqual(len(self.files("b/*.jsonl")), 1)
+        self.assertEqual(len(self.files("**/*" + ACTIVE_SUFFIX)), 2)
+        writer.write("tenant", make_line("b", 0))
+        writer.close()
+        self.assertEqual(len(self.files("b/*.jsonl")), 2)
+        self.assertEqual(self.read(self.files("a/*")[0]), [make_line("a", 0)] * 3)
+
+    def test_writes_buffers_above_total_budget(self):
+        # Larger than buffer of the file object
+        line = make_line("app" * 4000, 0)
+        writer = PartitionedWriter(self.directory, OutputPolicy(max_buffered_bytes=4 * len(line)))
+        for source in ("a", "b", "a"):
+            writer.write(source, line)
+        self.assertEqual([self.read(path) for path in self.files()], [[], []])
+        writer.write("b", line)
+        self.assertEqual([len(self.read(path)) for path in self.files()], [2, 2])
+        writer.close()
+
+    def test_buffers_lines_until_flush(self):
+        writer = PartitionedWriter(self.directory)
+        writer.write("tenant", make_line("app.add", 0))
+        (active,) = self.files()
+        self.assertTrue(active.endswith(".jsonl" + ACTIVE_SUFFIX))
+        self.assertEqual(self.read(active), [])
+        writer.flush()
+        self.assertEqual(self.read(active), [make_line("app.add", 0)])
+        writer.close()
+        self.assertEqual(self.files(), [active[: -len(ACTIVE_SUFFIX)]])
+
+    def test_rotates_by_size(self):
+        line = make_line("app.add", 0)
+        writer = PartitionedWriter(
+            self.directory, OutputPolicy(rotate_bytes=2 * len(line) + 2, buffer_bytes=1)
+        )
+        for _ in range(5):
+            writer.write("tenant", line)
+        writer.close()
+        self.assertEqual([len(self.read(path)) for path in self.files()], [2, 2, 1])
+
+    def test_rotates_by_age_on_flush(self):
+        writer = PartitionedWriter(self.directory, OutputPolicy(rotate_sec=60))
+        writer.write("tenant", make_line("app.add", 0))
+        with mock.patch("time.monotonic", return_value=float("inf")):
+            writer.flush()
+        self.assertFalse(self.files("**/*" + ACTIVE_SUFFIX))
+        writer.write("tenant", make_line("app.add", 0))
+        writer.close()
+        self.assertEqual(len(self.files()), 2)
+
+    def test_gzip(self):
+        writer = PartitionedWriter(self.directory, OutputPolicy(codec=GzipCodec()))
+        writer.write("tenant", make_line("app.add", 0))
+        writer.close()
+        (path,) = self.files()
+        self.assertTrue(path.endswith(".jsonl.gz"))
+        with gzip.open(os.path.join(self.directory, path), "rt") as fobj:
+            self.assertEqual(fobj.read(), make_line("app.add", 0) + "\n")
+
+    @unittest.skipUnless(zstandard, "zstandard is not installed")
+    def test_zstd(self):
+        writer = PartitionedWriter(self.directory, OutputPolicy(codec=ZstdCodec()))
+        writer.write("tenant", make_line("app.add", 0))
+        writer.flush()
+        writer.write("tenant", make_line("app.mul", 0))
+        writer.close()
+        (path,) = self.files()
+        self.assertTrue(path.endswith(".jsonl.zst"))
+        with open(os.path.join(self.directory, path), "rb") as fobj:
+            data = zstandard.ZstdDecompressor().stream_reader(fobj).read()
+        self.assertEqual(
+            data.decode("utf-8").splitlines(), [make_line("app.add", 0), make_line("app.mul", 0)]
+        )
+
+
+class TestSourceWriter(unittest.TestCase):
+    def test_prints_lines(self):
+        with mock.patch("i8t.session_writers.print") as mock_print, mock.patch("sys.stdout"):
+            writer = SourceWriter()
+            writer.write("tenant", "line")
+            writer.close()
+        mock_print.assert_called_once_with("line")
@@ -0,0 +1,135 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from .cli import cli
+from .relay_storage import RelayStorage
+from .spool_storage import (
+    SpoolPolicy,
+    SpoolStorage,
+    SpoolUploader,
+    logger,
+    sealed_segments,
+    spool_backlog_bytes,
+)
+from .storage import IntrospectStorage
+
+
+class TestSpoolStorage(unittest.TestCase):
+    CHECKPOINT = {"input": "input", "output": "output"}
+    LINE_SIZE = len('{"input": "input", "output": "output"}\n')
+
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.directory = self._tmpdir.name
+        self.target = mock.Mock(IntrospectStorage)
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def test_rotates_segments_by_size(self):
+        storage = SpoolStorage(self.directory, SpoolPolicy(segment_bytes=self.LINE_SIZE * 2))
+        for _ in range(5):
+            storage.save(self.CHECKPOINT)
+        self.assertEqual(len(sealed_segments(self.directory)), 2)
+        storage.close()
+        self.assertEqual(len(sealed_segments(self.directory)), 3)
+        self.assertEqual(storage.stats.backlog_bytes, self.LINE_SIZE * 5)
+        self.assertEqual(spool_backlog_bytes(self.directory), self.LINE_SIZE * 5)
+
+    def test_rotates_segments_by_age(self):
+        storage = SpoolStorage(self.directory, SpoolPolicy(segment_max_age_sec=60))
+        storage.save(self.CHECKPOINT)
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 60):
+            storage.save(self.CHECKPOINT)
+        self.assertEqual(len(sealed_segments(self.directory)), 1)
+        storage.close()
+
+    def test_seals_idle_segments_by_age(self):
+        storage = SpoolStorage(self.directory, SpoolPolicy(segment_max_age_sec=0.05))
+        self.addCleanup(storage.close)
+        storage.save(self.CHECKPOINT)
+        for _ in range(500):
+            if sealed_segments(self.directory):
+                break
+            time.sleep(0.01)
+        self.assertEqual(SpoolUploader(self.directory, self.target).upload_once(), 1)
+
+    def test_drops_above_spool_cap(self):
+        storage = SpoolStorage(self.directory, SpoolPolicy(max_spool_bytes=self.LINE_SIZE))
+        storage.save(self.CHECKPOINT)
+        storage.save(self.CHECKPOINT)
+        storage.close()
+        self.assertEqual(storage.stats.dropped, 1)
+        self.assertEqual(spool_backlog_bytes(self.directory), self.LINE_SIZE)
+
+    def test_resumes_after_restart(self):
+        with mock.patch("i8t.spool_storage.atexit"):
+            storage = SpoolStorage(self.directory, SpoolPolicy(fsync_every=1))
+        storage.save(self.CHECKPOINT)
+        # Simulate crash: active segment is left behind unsealed
+        restarted = SpoolStorage(self.directory)
+        self.assertEqual(restarted.stats.backlog_bytes, self.LINE_SIZE)
+        restarted.save(self.CHECKPOINT)
+        restarted.close()
+        self.assertEqual(
+            [os.path.basename(path) for path in sealed_segments(self.directory)],
+            ["000000000001.jsonl", "000000000002.jsonl"],
+        )
+
+    def test_uploads_and_deletes_segments(self):
+        storage = SpoolStorage(self.directory, SpoolPolicy(segment_bytes=self.LINE_SIZE * 3))
+        for _ in range(4):
+            storage.save(self.CHECKPOINT)
+        storage.close()
+        uploader = SpoolUploader(self.directory, self.target, batch_size=2)
+        self.assertEqual(uploader.upload_once(), 4)
+        self.assertEqual(
+            self.target.save_batch.call_args_list,
+            [
+                mock.call([self.CHECKPOINT, self.CHECKPOINT]),
+                mock.call([self.CHECKPOINT]),
+                mock.call([self.CHECKPOINT]),
+            ],
+        )
+        self.assertEqual(sealed_segments(self.directory), [])
+
+    def test_keeps_segment_on_failure(self):
+        storage = SpoolStorage(self.directory)
+        storage.save(self.CHECKPOINT)
+        storage.close()
+        self.target.save_batch.side_effect = Exception("Test exception")
+        uploader = SpoolUploader(self.directory, self.target)
+        with self.assertLogs(logger=logger, level="ERROR"):
+            self.assertEqual(uploader.upload_once(), 0)
+        self.assertEqual(len(sealed_segments(self.directory)), 1)
+
+    def test_skips_torn_lines(self):
+        with open(os.path.join(self.directory, "000000000001.jsonl"), "wb") as fobj:
+            fobj.write(b'{"input": 1}\n{"inp')
+        uploader = SpoolUploader(self.directory, self.target)
+        with self.assertLogs(logger=logger, level="WARNING"):
+            self.assertEqual(uploader.upload_once(), 1)
+        self.target.save_batch.assert_called_once_with([{"input": 1}])
+
+    def test_uploads_from_thread(self):
+        uploader = SpoolUploader(self.directory, self.target, delay_sec=0)
+        with mock.patch.object(uploader, "upload_once", side_effect=uploader.stop) as upload_once:
+            uploader.start().join()
+        upload_once.assert_called_once_with()
+
+    def test_main_uploads_to_relay(self):
+        argv = ["i8t", "spool-upload", self.directory, "http://relay/a", "--delay", "0"]
+        with mock.patch("sys.argv", argv), mock.patch.object(
+            SpoolUploader, "run_forever", autospec=True, side_effect=KeyboardInterrupt
+        ) as run_forever:
+            cli()
+        uploader = run_forever.call_args[0][0]
+        self.assertIsInstance(uploader._storage, RelayStorage)  # pylint: disable=protected-access
+
+    def test_run_forever_stops(self):
+        uploader = SpoolUploader(self.directory, self.target, delay_sec=0)
+        with mock.patch.object(uploader, "upload_once", side_effect=uploader.stop):
+            uploader.run_forever()
@@ -0,0 +1,162 @@
+"""Compact binary session format.
+
+A file starts with ``MAGIC`` followed by frames.
+Each frame is a little-endian uint32 length and a msgpack array ``[kind, payload]``:
+
+* ``STRINGS`` frame appends its payload to the string table.
+* ``SHAPES`` frame appends its payload to the metadata shape table.
+  Shape is ``[keys, string_positions]``: metadata keys in order,
+  and positions of the values stored as string table indexes.
+* ``RECORD`` frame payload is ``[metadata, input, output, rest]``.
+  Metadata is ``[shape_index, *values]``, or nil.
+  ``rest`` holds other top-level keys of the record, if any.
+
+Usage::
+
+    python -m i8t.testing.binary_session session.jsonl session.i8t
+    python -m i8t.testing.binary_session session.i8t session.jsonl
+"""
+
+import json
+import struct
+import sys
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import msgpack  # type: ignore
+except ImportError:  # pragma: no cover
+    msgpack = None  # type: ignore[assignment]
+
+MAGIC = b"I8T\x00\x01"
+STRINGS = 0
+SHAPES = 1
+RECORD = 2
+_LENGTH = struct.Struct("<I")
+_RECORD_KEYS = ("metadata", "input", "output")
+
+
+class BinarySessionWriter:
+    def __init__(self, fobj: BinaryIO) -> None:
+        _require_msgpack()
+        self._fobj = fobj
+        self._strings: Dict[str, int] = {}
+        self._shapes: Dict[Tuple[Tuple[str, bool], ...], int] = {}
+        self._packer = msgpack.Packer(use_bin_type=True)
+        fobj.write(MAGIC)
+
+    def write(self, record: dict) -> None:
+        new_strings: List[str] = []
+        new_shapes: List[list] = []
+        metadata = record.get("metadata")
+        encoded_metadata = (
+            None if metadata is None else self._encode_metadata(metadata, new_strings, new_shapes)
+        )
+        if new_strings:
+            self._write_frame([STRINGS, new_strings])
+        if new_shapes:
+            self._write_frame([SHAPES, new_shapes])
+        rest = {key: value for key, value in record.items() if key not in _RECORD_KEYS}
+        self._write_frame(
+            [RECORD, [encoded_metadata, record.get("input"), record.get("output"), rest]]
+        )
+
+    def _encode_metadata(
+        self, metadata: dict, new_strings: List[str], new_shapes: List[list]
+    ) -> list:
+        shape = tuple((key, isinstance(value, str)) for key, value in metadata.items())
+        shape_index = self._shapes.get(shape)
+        if shape_index is None:
+            shape_index = self._shapes[shape] = len(self._shapes)
+            new_shapes.append(
+                [list(metadata), [i for i, (_, is_str) in enumerate(shape) if is_str]]
+            )
+        return [shape_index] + [
+            self._intern(value, new_strings) if is_str else value
+            for value, (_, is_str) in zip(metadata.values(), shape)
+        ]
+
+    def _intern(self, value: str, new_strings: List[str]) -> int:
+        index = self._strings.get(value)
+        if index is None:
+            index = self._strings[value] = len(self._strings)
+            new_strings.append(value)
+        return index
+
+    def _write_frame(self, frame: list) -> None:
+        data = self._packer.pack(frame)
+        self._fobj.write(_LENGTH.pack(len(data)))
+        self._fobj.write(data)
+
+
+def iter_binary_records(fobj: BinaryIO) -> Iterator[dict]:
+    _require_msgpack()
+    if fobj.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not an i8t binary session")
+    table: List[str] = []
+    shapes: List[list] = []
+    unpackb = msgpack.unpackb
+    while True:
+        header = fobj.read(_LENGTH.size)
+        if not header:
+            return
+        kind, payload = unpackb(fobj.read(_LENGTH.unpack(header)[0]))
+        if kind == RECORD:
+            yield _decode_record(payload, table, shapes)
+        elif kind == STRINGS:
+            table.extend(payload)
+        else:
+            shapes.extend(payload)
+
+
+def _require_msgpack() -> None:
+    if msgpack is None:
+        raise ImportError("Binary sessions require 'pip install i8t[msgpack]'")
+
+
+def _decode_record(payload: list, table: List[str], shapes: List[list]) -> dict:
+    encoded_metadata, input_, output, rest = payload
+    record = {
+        "input": input_,
+        "output": output,
+        "metadata": _decode_metadata(encoded_metadata, table, shapes),
+    }
+    if rest:
+        record.update(rest)
+    return record
+
+
+def _decode_metadata(
+    encoded: Optional[list], table: List[str], shapes: List[list]
+) -> Optional[dict]:
+    if encoded is None:
+        return None
+    keys, string_positions = shapes[encoded[0]]
+    for i in string_positions:
+        encoded[i + 1] = table[encoded[i + 1]]
+    return dict(zip(keys, encoded[1:]))
+
+
+def jsonl_to_binary(src: str, dst: str) -> None:
+    with open(src, encoding="utf-8") as fin, open(dst, "wb") as fout:
+        writer = BinarySessionWriter(fout)
+        for line in fin:
+            writer.write(json.loads(line))
+
+
+def binary_to_jsonl(src: str, dst: str) -> None:
+    with open(src, "rb") as fin, open(dst, "w", encoding="utf-8") as fout:
+        for record in iter_binary_records(fin):
+            json.dump(record, fout)
+            fout.write("\n")
+
+
+def main() -> None:
+    src, dst = sys.argv[1:3]
+    if src.endswith(".jsonl"):
+        jsonl_to_binary(src, dst)
+    else:
+        binary_to_jsonl(src, dst)
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
@@ -1,20 +1,176 @@
-import json
-from typing import Callable, List
+import bisect
+import fnmatch
+import functools
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from i8t import encoders
+from i8t.compression import codec_for_path
+
+from .binary_session import iter_binary_records
+from .session_cache import SessionCache
+from .time_range import TimeRange
+
+_GLOB_CHARS = frozenset("*?[")
+
+
+@dataclass(frozen=True)
+class SessionQuery:
+    """Records at locations matching the glob pattern, optionally of a context and time range."""
+
+    location: str = "*"
+    context: Optional[str] = None
+    within: Optional[TimeRange] = None
+
+    def __call__(self, record: dict) -> bool:
+        metadata = record["metadata"]
+        return (
+            fnmatch.fnmatch(metadata["location"], self.location)
+            and (self.context is None or metadata.get("context") == self.context)
+            and (
+                self.within is None
+                or metadata["start_ts"] >= self.within.start_ts
+                and metadata["finish_ts"] <= self.within.finish_ts
+            )
+        )
+
+
+class _SessionIndex:
+    """Positions of records by location and context, and by start time within location."""
+
+    def __init__(self, records: List[dict]) -> None:
+        self._records = records
+        self.by_location: Dict[str, List[int]] = {}
+        self.by_context: Dict[Optional[str], List[int]] = {}
+        for position, record in enumerate(records):
+            metadata = record["metadata"]
+            self.by_location.setdefault(metadata["location"], []).append(position)
+            self.by_context.setdefault(metadata.get("context"), []).append(position)
+        # Sorted start times and positions of their records, by location
+        self._starts: Dict[str, Tuple[List[float], List[int]]] = {}
+        self._patterns: Dict[str, List[str]] = {}
+
+    def positions(self, query: SessionQuery) -> List[int]:
+        """Returns ascending positions of records matching the query."""
+        locations = self._locations(query.location)
+        if query.context is not None:
+            in_context = self.by_context.get(query.context, [])
+            if len(in_context) < sum(len(self.by_location[location]) for location in locations):
+                return [pos for pos in in_context if query(self._records[pos])]
+        positions: List[int] = []
+        for location in locations:
+            positions += self._within(location, query.within)
+        if query.context is not None:
+            positions = [
+                pos
+                for pos in positions
+                if self._records[pos]["metadata"].get("context") == query.context
+            ]
+        return sorted(positions)
+
+    def _locations(self, pattern: str) -> List[str]:
+        if not _GLOB_CHARS.intersection(pattern):
+            return [pattern] if pattern in self.by_location else []
+        locations = self._patterns.get(pattern)
+        if locations is None:
+            locations = self._patterns[pattern] = fnmatch.filter(self.by_location, pattern)
+        return locations
+
+    def _within(self, location: str, within: Optional[TimeRange]) -> List[int]:
+        if within is None:
+            return self.by_location[location]
+        starts, positions = self._sorted_starts(location)
+        begin = bisect.bisect_left(starts, within.start_ts)
+        # Records finishing within the range started within it too
+        end = bisect.bisect_right(starts, within.finish_ts)
+        return [
+            pos
+            for pos in positions[begin:end]
+            if self._records[pos]["metadata"]["finish_ts"] <= within.finish_ts
+        ]
+
+    def _sorted_starts(self, location: str) -> Tuple[List[float], List[int]]:
+        if location not in self._starts:
+            positions = sorted(
+                self.by_location[location],
+                key=lambda pos: self._records[pos]["metadata"]["start_ts"],
+            )
+            starts = [self._records[pos]["metadata"]["start_ts"] for pos in positions]
+            self._starts[location] = (starts, positions)
+        return self._starts[location]
 
 
 class IntrospectSession:
     def __init__(self, records: List[dict]) -> None:
         self._records = records
+        self._index: Optional[_SessionIndex] = None
 
     @classmethod
-    def from_jsonl(cls, jsonl: str, main_is: str = "") -> "IntrospectSession":
-        with open(jsonl, encoding="utf-8") as fobj:
-            records = [json.loads(line.strip()) for line in fobj]
-        for record in records:
-            record["metadata"]["location"] = record["metadata"]["location"].replace(
-                "__main__", main_is
-            )
+    def from_jsonl(
+        cls, jsonl: str, main_is: str = "", cache: Optional[SessionCache] = None
+    ) -> "IntrospectSession":
+        """Loads all records, decompressing ``.jsonl.gz`` and ``.jsonl.zst`` files.
+
+        Parsed records are cached in ``cache``, or in ``I8T_SESSION_CACHE`` directory if set.
+        """
+        cache = cache or SessionCache.from_environ()
+        if cache is None:
+            return cls(list(iter_jsonl(jsonl, main_is)))
+        return cls(cache.records(jsonl, main_is, lambda: list(iter_jsonl(jsonl, main_is))))
+
+    @classmethod
+    def stream_jsonl(cls, jsonl: str, main_is: str = "") -> "IntrospectSession":
+        """Returns session, that reads records from the file on every lookup.
+
+        Only the records matching a lookup are kept in memory.
+        """
+        return StreamedSession(functools.partial(iter_jsonl, jsonl, main_is))
+
+    @classmethod
+    def from_binary(cls, path: str, main_is: str = "") -> "IntrospectSession":
+        """Loads session converted with ``i8t.testing.binary_session``."""
+        with open(path, "rb") as fobj:
+            records = [_rename_main(record, main_is) for record in iter_binary_records(fobj)]
         return cls(records)
 
+    def iter_records(self) -> Iterator[dict]:
+        return iter(self._records)
+
+    def iter_filtered(self, filter_func: Callable[[dict], bool]) -> Iterator[dict]:
+        return (record for record in self.iter_records() if filter_func(record))
+
     def filter_by(self, filter_func: Callable[[dict], bool]) -> List[dict]:
-        return [record for record in self._records if filter_func(record)]
+        return list(self.iter_filtered(filter_func))
+
+    def select(self, query: SessionQuery) -> List[dict]:
+        """Returns matching records in session order, using indexes built on first call."""
+        if self._index is None:
+            self._index = _SessionIndex(self._records)
+        return [self._records[position] for position in self._index.positions(query)]
+
+
+class StreamedSession(IntrospectSession):
+    def __init__(self, iter_records: Callable[[], Iterable[dict]]) -> None:
+        super().__init__([])
+        self._iter_records = iter_records
+
+    def iter_records(self) -> Iterator[dict]:
+        return iter(self._iter_records())
+
+    def select(self, query: SessionQuery) -> List[dict]:
+        return self.filter_by(query)
+
+
+def iter_jsonl(path: str, main_is: str = "") -> Iterator[dict]:
+    """Yields records of session file one by one, decompressing it by extension."""
+    codec = codec_for_path(path)
+    with open(path, "rb") as raw:
+        with codec.open_reader(raw) if codec else raw as fobj:
+            for line in fobj:
+                if line.strip():
+                    yield _rename_main(encoders.loads(line), main_is)
+
+
+def _rename_main(record: dict, main_is: str) -> dict:
+    record["metadata"]["location"] = record["metadata"]["location"].replace("__main__", main_is)
+    return record
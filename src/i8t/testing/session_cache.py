@@ -0,0 +1,207 @@
+"""On-disk cache of parsed sessions.
+
+Sessions with dill payloads are pickled after parsing, with each dill payload carrying
+its base85-decoded pickle, under a key made of file path, size, mtime, content hash,
+``main_is`` and i8t version. Other sessions are not cached, as unpickling records
+is no faster than parsing JSON. Instead an empty marker, keyed without the content hash,
+lets later loads skip hashing them.
+Least recently used entries are evicted when the cache outgrows its size.
+
+Loading with ``IntrospectSession.from_jsonl`` uses the cache in ``I8T_SESSION_CACHE``
+directory, if set.
+
+Usage::
+
+    i8t session-cache warm toy/testdata/session-04.jsonl --main-is toy.app
+    i8t session-cache clear
+"""
+
+import argparse
+import contextlib
+import gc
+import hashlib
+import importlib.metadata
+import logging
+import os
+import pickle
+import tempfile
+from typing import Callable, Iterator, List, Optional
+
+from i8t.encoders import DILL, PickledPayload
+
+logger = logging.getLogger(__name__)
+
+CACHE_ENV = "I8T_SESSION_CACHE"
+# Bumped when the layout of cached records changes
+FORMAT = 2
+SUFFIX = ".pickle"
+SKIP_SUFFIX = ".skip"
+_HASH_CHUNK = 1024 * 1024
+
+
+class SessionCache:
+    def __init__(self, directory: str, max_bytes: int = 1024**3) -> None:
+        self._directory = directory
+        self._max_bytes = max_bytes
+
+    @classmethod
+    def from_environ(cls) -> Optional["SessionCache"]:
+        directory = os.environ.get(CACHE_ENV)
+        return cls(directory) if directory else None
+
+    def records(self, path: str, main_is: str, load: Callable[[], List[dict]]) -> List[dict]:
+        """Returns cached records of the session file, calling ``load`` on miss.
+
+        Dill payloads of returned records are ``PickledPayload``, that compare equal to
+        the loaded text, so hits and misses return the same records.
+        """
+        skip = os.path.join(self._directory, _fingerprint(path, main_is, "") + SKIP_SUFFIX)
+        if os.path.exists(skip):
+            return load()
+        entry = self._entry(path, main_is)
+        try:
+            with open(entry, "rb") as fobj, _gc_paused():
+                records = pickle.loads(fobj.read())
+        except FileNotFoundError:
+            pass
+        except Exception:  # pylint: disable=broad-except
+            logger.warning("Ignoring broken cache entry %s", entry, exc_info=True)
+        else:
+            # Modification time orders entries for eviction
+            os.utime(entry)
+            return records
+        loaded = load()
+        records = [with_pickled_payloads(record) for record in loaded]
+        if any(record is not original for record, original in zip(records, loaded)):
+            self._store(entry, records)
+        else:
+            os.makedirs(self._directory, exist_ok=True)
+            with open(skip, "wb"):
+                pass
+        return records
+
+    def cached(self, path: str, main_is: str) -> bool:
+        return os.path.exists(self._entry(path, main_is))
+
+    def clear(self) -> int:
+        """Removes all entries and markers, returning the number of entries."""
+        entries = self._entries()
+        for entry in entries + self._entries(SKIP_SUFFIX):
+            os.remove(entry)
+        return len(entries)
+
+    def _entry(self, path: str, main_is: str) -> str:
+        return os.path.join(self._directory, fingerprint(path, main_is) + SUFFIX)
+
+    def _store(self, entry: str, records: List[dict]) -> None:
+        data = pickle.dumps(records, protocol=pickle.HIGHEST_PROTOCOL)
+        os.makedirs(self._directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self._directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fobj:
+            fobj.write(data)
+        os.replace(tmp_path, entry)
+        self._evict(keep=entry)
+
+    def _evict(self, keep: str) -> None:
+        entries = sorted(self._entries(), key=os.path.getmtime, reverse=True)
+        total = 0
+        for entry in entries:
+            total += os.path.getsize(entry)
+            if total > self._max_bytes and entry != keep:
+                os.remove(entry)
+
+    def _entries(self, suffix: str = SUFFIX) -> List[str]:
+        if not os.path.isdir(self._directory):
+            return []
+        return [
+            os.path.join(self._directory, name)
+            for name in os.listdir(self._directory)
+            if name.endswith(suffix)
+        ]
+
+
+def fingerprint(path: str, main_is: str) -> str:
+    content = hashlib.blake2b()
+    with open(path, "rb") as fobj:
+        for chunk in iter(lambda: fobj.read(_HASH_CHUNK), b""):
+            content.update(chunk)
+    return _fingerprint(path, main_is, content.hexdigest())
+
+
+def _fingerprint(path: str, main_is: str, content_digest: str) -> str:
+    stat = os.stat(path)
+    key = (
+        os.path.abspath(path),
+        stat.st_size,
+        stat.st_mtime_ns,
+        content_digest,
+        main_is,
+        _version(),
+        FORMAT,
+    )
+    return hashlib.sha256(repr(key).encode("utf-8")).hexdigest()
+
+
+def with_pickled_payloads(record: dict) -> dict:
+    """Wraps dill payloads into ``PickledPayload``, returning other records as is."""
+    metadata = record.get("metadata") or {}
+    payloads = {}
+    for key in ("input", "output"):
+        data = record.get(key)
+        if metadata.get(f"{key}_hint") == DILL.hint and isinstance(data, str):
+            try:
+                payloads[key] = PickledPayload(data, DILL.unwrap(data))
+            except ValueError:
+                # Not base85, left for the loader to report
+                pass
+    return dict(record, **payloads) if payloads else record
+
+
+@contextlib.contextmanager
+def _gc_paused() -> Iterator[None]:
+    """Pauses garbage collection, that is triggered over and over by unpickled containers."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _version() -> str:
+    try:
+        return importlib.metadata.version("i8t")
+    except importlib.metadata.PackageNotFoundError:  # pragma: no cover
+        return ""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="i8t session-cache", description=__doc__.splitlines()[0])
+    parser.add_argument("action", choices=["warm", "clear"])
+    parser.add_argument("sessions", nargs="*", help="Session files to warm the cache with")
+    parser.add_argument("--main-is", default="", help="Module, that ran as __main__")
+    parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get(CACHE_ENV)
+        or os.path.join(os.path.expanduser("~"), ".cache", "i8t", "sessions"),
+    )
+    parser.add_argument("--max-mb", type=float, default=1024)
+    args = parser.parse_args()
+    cache = SessionCache(args.cache_dir, int(args.max_mb * 2**20))
+    if args.action == "clear":
+        print(f"Removed {cache.clear()} cached sessions from {args.cache_dir}")
+        return
+    # pylint: disable-next=import-outside-toplevel,cyclic-import
+    from .session import IntrospectSession
+
+    for path in args.sessions:
+        records = IntrospectSession.from_jsonl(path, args.main_is, cache).filter_by(bool)
+        if cache.cached(path, args.main_is):
+            print(f"Cached {len(records)} records of {path}")
+        else:
+            print(f"Skipped {path} without dill payloads")
+
+
+if __name__ == "__main__":
+    main()  # pragma: no cover
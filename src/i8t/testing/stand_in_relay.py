@@ -0,0 +1,122 @@
+"""Stand-in relay server and sample checkpoints for tests and benchmarks."""
+
+import http.server
+import json
+import threading
+import urllib.parse
+from typing import List, Optional
+
+from i8t.compression import Codec
+from i8t.relay_consumer import CURSOR_HEADER
+
+
+class StandInRelay(http.server.ThreadingHTTPServer):
+    """Local relay server that stores posted checkpoints in memory.
+
+    Records are returned after ``?after=<cursor>``, cursor being the number of records.
+    """
+
+    def __init__(self, codec: Optional[Codec] = None) -> None:
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.codec = codec
+        self.received: List[bytes] = []
+        self.records: List[dict] = []
+        # Paths of GET requests that returned records
+        self.requested: List[str] = []
+        self.stored = threading.Condition()
+        # Event streams are closed after being idle for this long
+        self.stream_idle_sec = 0.5
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/checkpoints"
+
+    def __enter__(self) -> "StandInRelay":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _StandInHandler(http.server.BaseHTTPRequestHandler):
+    server: StandInRelay
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append(body)
+        if self.headers.get("Content-Encoding"):
+            body = self.server.codec.decompress(body)
+        payload = json.loads(body)
+        with self.server.stored:
+            self.server.records.extend(payload if isinstance(payload, list) else [payload])
+            self.server.stored.notify_all()
+        self._respond(b"{}", {})
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        after = int(query.get("after", ["0"])[0])
+        if self.headers.get("Accept") == "text/event-stream":
+            self._stream(int(self.headers.get("Last-Event-ID", after)))
+            return
+        etag = f'"{after}-{len(self.server.records)}"'
+        if self.headers.get("If-None-Match") == etag:
+            self._respond(b"", {}, status=304)
+            return
+        self.server.requested.append(self.path)
+        body = json.dumps(self.server.records[after:]).encode("utf-8")
+        headers = {CURSOR_HEADER: str(len(self.server.records)), "ETag": etag}
+        if self.server.codec:
+            body = self.server.codec.compress(body)
+            headers["Content-Encoding"] = self.server.codec.name
+        self._respond(body, headers)
+
+    def _stream(self, after: int) -> None:
+        self.server.requested.append(self.path)
+        # Chunked encoding lets client read events as they come
+        self.protocol_version = "HTTP/1.1"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self._write_chunk(b": connected\n\n")
+        while True:
+            with self.server.stored:
+                if not self.server.stored.wait_for(
+                    lambda: len(self.server.records) > after, self.server.stream_idle_sec
+                ):
+                    break
+                records = self.server.records[after:]
+            for record in records:
+                after += 1
+                data = json.dumps(record, ensure_ascii=False)
+                self._write_chunk(f"id: {after}\ndata: {data}\n\n".encode("utf-8"))
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _respond(self, body: bytes, headers: dict, status: int = 200) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+def make_checkpoint(i: int) -> dict:
+    return {
+        "metadata": {"name": "app", "location": "flask", "start_ts": i, "finish_ts": i + 1},
+        "input": {"method": "GET", "url": f"http://localhost/example?number={i}"},
+        "output": {"status_code": 200, "body": json.dumps({"squares": list(range(i % 10))})},
+    }
@@ -0,0 +1,89 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from .binary_session import (
+    BinarySessionWriter,
+    binary_to_jsonl,
+    iter_binary_records,
+    jsonl_to_binary,
+    main,
+)
+from .session import IntrospectSession
+
+TESTDATA = os.path.join(os.path.dirname(os.path.dirname(__file__)), "testdata")
+SESSION_PATH = os.path.join(TESTDATA, "session.jsonl")
+CHECKPOINTS = [
+    {
+        "input": '{"args": [1, 2], "kwargs": {}}',
+        "output": "3",
+        "metadata": {
+            "name": "app",
+            "location": "__main__.dummy_func",
+            "start_ts": 1000.5,
+            "finish_ts": 2000,
+            "context": "",
+            "input_hint": "json",
+            "output_hint": "json",
+        },
+    },
+    {
+        "input": {"method": "GET", "url": "http://localhost/"},
+        "output": {"status_code": 200, "headers": {}, "body": ""},
+        "metadata": {"name": "app", "location": "flask", "start_ts": 1, "context": "abc"},
+    },
+]
+
+
+class TestBinarySession(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.jsonl_path = os.path.join(self._tmpdir.name, "session.jsonl")
+        self.binary_path = os.path.join(self._tmpdir.name, "session.i8t")
+        with open(self.jsonl_path, "w", encoding="utf-8") as fobj:
+            for checkpoint in CHECKPOINTS * 2:
+                fobj.write(json.dumps(checkpoint) + "\n")
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def test_from_binary_matches_from_jsonl(self):
+        jsonl_to_binary(self.jsonl_path, self.binary_path)
+        self.assertEqual(
+            IntrospectSession.from_binary(self.binary_path, main_is="toy.app").filter_by(bool),
+            IntrospectSession.from_jsonl(self.jsonl_path, main_is="toy.app").filter_by(bool),
+        )
+        self.assertLess(os.path.getsize(self.binary_path), os.path.getsize(self.jsonl_path))
+
+    def test_roundtrip_keeps_legacy_records(self):
+        jsonl_to_binary(SESSION_PATH, self.binary_path)
+        binary_to_jsonl(self.binary_path, self.jsonl_path)
+        with open(SESSION_PATH, encoding="utf-8") as expected, open(
+            self.jsonl_path, encoding="utf-8"
+        ) as got:
+            self.assertEqual(
+                [json.loads(line) for line in got], [json.loads(line) for line in expected]
+            )
+
+    def test_requires_msgpack(self):
+        with mock.patch("i8t.testing.binary_session.msgpack", None):
+            with self.assertRaisesRegex(ImportError, r"i8t\[msgpack\]"):
+                next(iter_binary_records(io.BytesIO()))
+            with self.assertRaisesRegex(ImportError, r"i8t\[msgpack\]"):
+                BinarySessionWriter(io.BytesIO())
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            list(iter_binary_records(io.BytesIO(b"{}\n")))
+
+    def test_main_converts_both_ways(self):
+        roundtrip_path = os.path.join(self._tmpdir.name, "roundtrip.jsonl")
+        with mock.patch("sys.argv", ["", self.jsonl_path, self.binary_path]):
+            main()
+        with mock.patch("sys.argv", ["", self.binary_path, roundtrip_path]):
+            main()
+        with open(roundtrip_path, encoding="utf-8") as fobj:
+            self.assertEqual([json.loads(line) for line in fobj], CHECKPOINTS * 2)
@@ -0,0 +1,126 @@
+import json
+import math
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from i8t.adapters.decorator_adapter.loader import DecoratedCase, DecoratedPatch
+from i8t.compression import GzipCodec, ZstdCodec
+
+from .session import IntrospectSession, SessionQuery, iter_jsonl
+from .time_range import TimeRange
+
+
+def decorated_record(location: str, i: int) -> dict:
+    return {
+        "input": json.dumps({"args": [i], "kwargs": {}}),
+        "output": json.dumps(i * i),
+        "metadata": {
+            "location": location,
+            "start_ts": i,
+            "finish_ts": i + 1,
+            "input_hint": "json",
+            "output_hint": "json",
+        },
+    }
+
+
+RECORDS = [decorated_record(f"__main__.{name}", i) for i in range(6) for name in ("square", "log")]
+
+
+class TestSessionLoading(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmpdir.cleanup)
+        self.directory = tmpdir.name
+        self.path = self.write("session.jsonl", b"".join(self.lines()))
+
+    def lines(self):
+        for record in RECORDS:
+            yield json.dumps(record).encode("utf-8") + b"\n"
+        yield b"\n"
+
+    def write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as fobj:
+            fobj.write(data)
+        return path
+
+    def test_reads_compressed_sessions(self):
+        expected = IntrospectSession.from_jsonl(self.path, main_is="toy.app").filter_by(bool)
+        self.assertEqual(expected[0]["metadata"]["location"], "toy.app.square")
+        for codec in (GzipCodec(), ZstdCodec()):
+            with self.subTest(codec.name):
+                path = self.write(
+                    "session.jsonl" + codec.extension, codec.compress(b"".join(self.lines()))
+                )
+                session = IntrospectSession.from_jsonl(path, main_is="toy.app")
+                self.assertEqual(session.filter_by(bool), expected)
+
+    def test_reads_zstd_frames_written_as_stream(self):
+        path = os.path.join(self.directory, "session.jsonl.zst")
+        with open(path, "wb") as fobj, ZstdCodec().open_writer(fobj) as writer:
+            for line in self.lines():
+                writer.write(line)
+        self.assertEqual(len(list(iter_jsonl(path))), len(RECORDS))
+
+    def test_streamed_session_reads_file_on_every_lookup(self):
+        session = IntrospectSession.stream_jsonl(self.path, main_is="toy.app")
+        cases = DecoratedCase.load(session, "square", within=TimeRange(2, 4))
+        self.assertEqual([case.args for case in cases], [[2], [3]])
+        self.assertEqual(cases[0].qualname, "toy.app.square")
+        self.write("session.jsonl", b"".join(self.lines()) * 2)
+        self.assertEqual(len(DecoratedCase.load(session, "log")), 12)
+
+    def test_streamed_session_patches_functions(self):
+        session = IntrospectSession.stream_jsonl(self.path, main_is="math")
+        with DecoratedPatch.activate(session, "missing") as patches:
+            self.assertEqual(patches, [])
+        with DecoratedPatch.activate(session, "log") as patches:
+            self.assertEqual([math.log(0), math.log(1)], [0, 1])
+            self.assertEqual(patches[0].qualname, "math.log")
+
+
+class TestSessionQuery(unittest.TestCase):
+    RECORDS = [
+        {"metadata": {"location": location, "start_ts": ts, "finish_ts": ts + 1, "context": ctx}}
+        for ts, (location, ctx) in enumerate(
+            [
+                ("app.square", "a"),
+                ("app.log", "a"),
+                ("app.square", "b"),
+                ("lib.square", "b"),
+                ("app.square", "c"),
+                ("flask", "c"),
+            ]
+        )
+    ]
+    QUERIES = [
+        SessionQuery(),
+        SessionQuery("*square"),
+        SessionQuery("app.square"),
+        SessionQuery("app.missing"),
+        SessionQuery("*square", context="b"),
+        SessionQuery("app.*", context="a"),
+        SessionQuery("lib.square", context="b"),
+        SessionQuery(context="c"),
+        SessionQuery("*square", within=TimeRange(1, 4)),
+        SessionQuery("*", within=TimeRange(2, 6)),
+        SessionQuery("*square", context="b", within=TimeRange(3, 4)),
+    ]
+
+    def test_indexed_lookups_match_scan(self):
+        session = IntrospectSession(list(reversed(self.RECORDS)))
+        streamed = IntrospectSession.stream_jsonl("unused")
+        for query in self.QUERIES:
+            with self.subTest(query=query), mock.patch.object(
+                streamed, "iter_records", return_value=iter(reversed(self.RECORDS))
+            ):
+                self.assertEqual(session.select(query), session.filter_by(query))
+                self.assertEqual(streamed.select(query), session.filter_by(query))
+
+    def test_time_range_uses_start_times(self):
+        session = IntrospectSession(self.RECORDS)
+        selected = session.select(SessionQuery("*square", within=TimeRange(1, 4)))
+        self.assertEqual([record["metadata"]["start_ts"] for record in selected], [2, 3])
@@ -0,0 +1,158 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from i8t.adapters.decorator_adapter.loader import DecoratedCase
+from i8t.adapters.decorator_adapter.serde import DecoratorSerde
+from i8t.cli import cli
+from i8t.encoders import PickledPayload
+
+from .session import IntrospectSession
+from .session_cache import CACHE_ENV, SessionCache, with_pickled_payloads
+from .test_session import decorated_record
+
+
+class Point:
+    def __init__(self, x: int) -> None:
+        self.x = x
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Point) and other.x == self.x
+
+
+def dill_record(value, start_ts: int = 1) -> dict:
+    serialized = DecoratorSerde().serialize("__main__.move", {"args": (value,), "kwargs": {}}, 1, 1)
+    return {
+        "input": serialized["input_data"],
+        "output": serialized["output_data"],
+        "metadata": {
+            "location": "__main__.move",
+            "start_ts": start_ts,
+            "finish_ts": start_ts + 1,
+            "input_hint": serialized["input_hint"],
+            "output_hint": serialized["output_hint"],
+        },
+    }
+
+
+class TestSessionCache(unittest.TestCase):
+    def setUp(self) -> None:
+        tmpdir = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.addCleanup(tmpdir.cleanup)
+        self.directory = tmpdir.name
+        self.cache_dir = os.path.join(tmpdir.name, "cache")
+        self.cache = SessionCache(self.cache_dir)
+        self.path = self.write("session.jsonl", [dill_record([Point(1)])])
+
+    def write(self, name: str, records) -> str:
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as fobj:
+            for record in records:
+                fobj.write(json.dumps(record) + "\n")
+        return path
+
+    def load(self, path: str, cache=None) -> IntrospectSession:
+        return IntrospectSession.from_jsonl(path, main_is="toy", cache=cache or self.cache)
+
+    def cases(self, session: IntrospectSession):
+        return DecoratedCase.load(session, "")
+
+    def test_cached_records_equal_loaded(self):
+        uncached = IntrospectSession.from_jsonl(self.path, main_is="toy")
+        expected = uncached.filter_by(bool)
+        self.assertEqual(self.load(self.path).filter_by(bool), expected)
+        with mock.patch("i8t.testing.session.iter_jsonl") as iter_jsonl:
+            session = self.load(self.path)
+        iter_jsonl.assert_not_called()
+        (record,) = session.filter_by(bool)
+        self.assertEqual(record, expected[0])
+        self.assertIsInstance(record["input"], PickledPayload)
+        self.assertEqual(record["metadata"]["input_hint"], "dill")
+        self.assertEqual(record["metadata"]["location"], "toy.move")
+        self.assertEqual(self.cases(session), self.cases(uncached))
+
+    def test_cases_do_not_share_decoded_objects(self):
+        self.load(self.path)
+        session = self.load(self.path)
+        self.cases(session)[0].args[0].append(Point(2))
+        self.assertEqual(self.cases(session)[0].args[0], [Point(1)])
+
+    def test_pickles_dill_payloads_with_dill(self):
+        path = self.write("dill.jsonl", [dill_record(Point(1)), dill_record(lambda: 1)])
+        self.load(path)
+        cases = self.cases(self.load(path))
+        self.assertEqual(list(cases[0].args), [Point(1)])
+        self.assertEqual(cases[1].args[0](), 1)
+
+    def test_skips_sessions_without_dill_payloads(self):
+        path = self.write("json.jsonl", [decorated_record("__main__.square", 2)])
+        self.assertEqual(self.cases(self.load(path))[0].args, [2])
+        (marker,) = os.listdir(self.cache_dir)
+        self.assertTrue(marker.endswith(".skip"))
+        # Marked sessions are loaded without hashing their contents
+        with mock.patch("i8t.testing.session_cache.fingerprint") as fingerprint:
+            self.assertEqual(self.cases(self.load(path))[0].args, [2])
+        fingerprint.assert_not_called()
+        self.assertEqual(os.listdir(self.cache_dir), [marker])
+
+    def test_keeps_undecodable_payloads(self):
+        record = dict(dill_record({1}), input="not base85")
+        self.assertIs(with_pickled_payloads(record), record)
+        flask_record = {"metadata": {"location": "flask"}, "input": {}, "output": {}}
+        self.assertIs(with_pickled_payloads(flask_record), flask_record)
+
+    def test_reloads_changed_session(self):
+        self.load(self.path)
+        path = self.write("session.jsonl", [dill_record(Point(3))] * 2)
+        self.assertEqual(len(self.load(path).filter_by(bool)), 2)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_reloads_broken_entry(self):
+        self.load(self.path)
+        (entry,) = os.listdir(self.cache_dir)
+        with open(os.path.join(self.cache_dir, entry), "wb") as fobj:
+            fobj.write(b"broken")
+        with self.assertLogs("i8t.testing.session_cache", "WARNING"):
+            self.assertEqual(len(self.load(self.path).filter_by(bool)), 1)
+
+    def test_evicts_least_recently_used(self):
+        paths = [self.write(f"{i}.jsonl", [dill_record(Point(i), i)]) for i in range(3)]
+        self.load(paths[0])
+        entry_size = os.path.getsize(os.path.join(self.cache_dir, os.listdir(self.cache_dir)[0]))
+        cache = SessionCache(self.cache_dir, max_bytes=2 * entry_size)
+        self.load(paths[1], cache)
+        for i, entry in enumerate(sorted(os.listdir(self.cache_dir))):
+            os.utime(os.path.join(self.cache_dir, entry), (i, i))
+        self.load(paths[0], cache)
+        self.load(paths[2], cache)
+        with mock.patch("i8t.testing.session.iter_jsonl") as iter_jsonl:
+            self.load(paths[0], cache)
+            self.load(paths[2], cache)
+        iter_jsonl.assert_not_called()
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_cache_from_environment(self):
+        with mock.patch.dict(os.environ, {CACHE_ENV: self.cache_dir}):
+            IntrospectSession.from_jsonl(self.path)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_main_warms_and_clears_cache(self):
+        json_path = self.write("json.jsonl", [decorated_record("__main__.square", 2)])
+        argv = ["i8t", "session-cache", "warm", self.path, json_path, "--cache-dir", self.cache_dir]
+        with mock.patch("sys.argv", argv), mock.patch("builtins.print") as print_:
+            cli()
+        self.assertEqual(
+            print_.call_args_list,
+            [
+                mock.call(f"Cached 1 records of {self.path}"),
+                mock.call(f"Skipped {json_path} without dill payloads"),
+            ],
+        )
+        argv = ["i8t", "session-cache", "clear", "--cache-dir", self.cache_dir]
+        with mock.patch("sys.argv", argv), mock.patch("builtins.print") as print_:
+            cli()
+        print_.assert_called_once_with(f"Removed 1 cached sessions from {self.cache_dir}")
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        self.assertEqual(SessionCache(os.path.join(self.directory, "missing")).clear(), 0)